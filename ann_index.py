@@ -0,0 +1,239 @@
+import math
+
+import faiss
+import numpy as np
+
+
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+
+# how vectors are held in the in-memory index:
+#   none   - float32 (4 bytes per dimension)
+#   fp16   - half precision (2)
+#   sq8    - 8-bit scalar quantization (1)
+#   pq     - product quantization (pq_m bytes per vector, flat/ivf only)
+#   binary - sign bits, Hamming distance (dim / 8 bytes per vector, flat only)
+# Compressed scores are approximate: searches re-rank a shortlist with the
+# full-precision vectors kept on disk (see VectorStore).
+COMPRESSIONS = ("none", "fp16", "sq8", "pq", "binary")
+
+_SQ_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "sq8": faiss.ScalarQuantizer.QT_8bit}
+
+DEFAULT_PARAMS = {
+    # HNSW graph degree / build-time and default query-time beam width
+    "M": 32,
+    "ef_construction": 80,
+    "ef_search": 64,
+    # IVF: train once this many vectors exist (exact flat search until then),
+    # lists probed per query by default
+    "ivf_train_min": 20000,
+    "nprobe": 16,
+    # sq8 / pq need training: float32 until this many vectors exist
+    "compress_train_min": 10000,
+    # PQ sub-quantizers (must divide dim) and bits per code
+    "pq_m": 48,
+    "pq_nbits": 8,
+    # compressed indexes return top_k * rerank candidates, re-scored exactly
+    # (0 = keep the approximate scores; binary always re-ranks)
+    "rerank": 4,
+    # filtered searches over at most this many rows score them exactly from the
+    # stored vectors; larger subsets search the index with a bitmap selector
+    "filter_scan_max": 20000,
+}
+
+
+def ivf_nlist(n: int) -> int:
+    # ~4 * sqrt(N) lists, while keeping >= 39 training points per list (faiss' minimum)
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def index_kind(index) -> str:
+    """
+    "flat" / "hnsw" / "ivf" for the inner-product indexes built here, None otherwise
+    (e.g. the IndexFlatL2 of older stores).
+    """
+    if isinstance(index, faiss.IndexBinary):
+        return "flat" if isinstance(faiss.downcast_IndexBinary(index), faiss.IndexBinaryFlat) else None
+    index = faiss.downcast_index(index)
+    if index.metric_type != faiss.METRIC_INNER_PRODUCT:
+        return None
+    if isinstance(index, (faiss.IndexFlat, faiss.IndexScalarQuantizer)):
+        return "flat"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        # a single list: the exhaustive scan of a flat pq index
+        return "flat" if index.nlist == 1 else "ivf"
+    return None
+
+
+def index_compression(index) -> str:
+    """
+    How `index` stores its vectors (one of COMPRESSIONS).
+    """
+    if isinstance(index, faiss.IndexBinary):
+        return "binary"
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "pq"
+    return "none"
+
+
+def target_kind(index_type: str, n: int, params: dict) -> str:
+    """
+    Kind the index should have for `n` vectors (IVF needs enough data to train).
+    """
+    if index_type == "ivf" and n < params["ivf_train_min"]:
+        return "flat"
+    return index_type
+
+
+def target_compression(compression: str, n: int, params: dict) -> str:
+    """
+    Compression the index should have for `n` vectors (sq8/pq need enough data to train).
+    """
+    if compression in ("sq8", "pq") and n < params["compress_train_min"]:
+        return "none"
+    return compression
+
+
+def matches(index, index_type: str, compression: str, params: dict) -> bool:
+    n = index.ntotal
+    return (index_kind(index) == target_kind(index_type, n, params)
+            and index_compression(index) == target_compression(compression, n, params))
+
+
+def needs_reindex(index, index_type: str, params: dict, compression="none") -> bool:
+    if not matches(index, index_type, compression, params):
+        return True
+    # IVF trained on a much smaller corpus: lists have grown too long, retrain
+    if index_kind(index) == "ivf":
+        return ivf_nlist(index.ntotal) >= 2 * faiss.downcast_index(index).nlist
+    return False
+
+
+def check_config(index_type: str, compression: str, dim: int, params: dict):
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}. Use one of {INDEX_TYPES}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}. Use one of {COMPRESSIONS}")
+    if compression == "pq" and (index_type == "hnsw" or dim % params["pq_m"]):
+        raise ValueError(f"pq needs a flat or ivf index and pq_m dividing {dim}")
+    if compression == "binary" and (index_type != "flat" or dim % 8):
+        raise ValueError("binary needs a flat index and a dimension divisible by 8")
+
+
+def build_index(index_type: str, dim: int, vectors, params: dict, compression="none"):
+    """
+    Fresh inner-product index of `index_type` holding `vectors` (row order kept).
+    Embeddings are normalized, so inner product == cosine similarity.
+    """
+    check_config(index_type, compression, dim, params)
+
+    kind = target_kind(index_type, len(vectors), params)
+    compression = target_compression(compression, len(vectors), params)
+    metric = faiss.METRIC_INNER_PRODUCT
+    if compression == "binary":
+        index = faiss.IndexBinaryFlat(dim)
+    elif kind == "hnsw":
+        if compression == "none":
+            index = faiss.IndexHNSWFlat(dim, params["M"], metric)
+        else:
+            index = faiss.IndexHNSWSQ(dim, _SQ_TYPES[compression], params["M"], metric)
+        index.hnsw.efConstruction = params["ef_construction"]
+    elif kind == "ivf":
+        quantizer = faiss.IndexFlatIP(dim)
+        nlist = ivf_nlist(len(vectors))
+        if compression == "none":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        elif compression == "pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, params["pq_m"], params["pq_nbits"], metric)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, _SQ_TYPES[compression], metric)
+    elif compression == "pq":
+        # IndexPQ can't take an IDSelector (tombstones): scan one IVF list instead
+        index = faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, 1, params["pq_m"], params["pq_nbits"], metric)
+    elif compression != "none":
+        index = faiss.IndexScalarQuantizer(dim, _SQ_TYPES[compression], metric)
+    else:
+        index = faiss.IndexFlatIP(dim)
+
+    if not index.is_trained:
+        index.train(vectors)
+    if len(vectors):
+        add_vectors(index, vectors)
+    return index
+
+
+def _binary_codes(vectors):
+    # one bit per dimension: its sign
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+def add_vectors(index, vectors):
+    if isinstance(index, faiss.IndexBinary):
+        index.add(_binary_codes(vectors))
+    else:
+        index.add(vectors)
+
+
+def search(index, queries, k: int, params=None):
+    """
+    index.search, for float or binary indexes (binary: Hamming distances, smaller is closer).
+    """
+    if isinstance(index, faiss.IndexBinary):
+        return index.search(_binary_codes(queries), k, params=params)
+    return index.search(queries, k, params=params)
+
+
+def rerank_depth(index, top_k: int, params: dict) -> int:
+    """
+    Candidates to fetch for `top_k` results before exact re-ranking
+    (0: the index scores are used as they are).
+    """
+    compression = index_compression(index)
+    if compression == "none":
+        return 0
+    if compression == "binary":
+        return top_k * max(1, params["rerank"])
+    return top_k * params["rerank"]
+
+
+def bitmap_selector(mask):
+    """
+    faiss.IDSelectorBitmap matching the rows where the boolean `mask` is set,
+    returned with the packed bitmap it reads (keep both referenced).
+    """
+    bits = np.packbits(np.asarray(mask, dtype=bool), bitorder="little")
+    return faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits)), bits
+
+
+def serialize_index(index) -> bytes:
+    if isinstance(index, faiss.IndexBinary):
+        return faiss.serialize_index_binary(index).tobytes()
+    return faiss.serialize_index(index).tobytes()
+
+
+def read_index(path: str):
+    try:
+        return faiss.read_index(path)
+    except RuntimeError:
+        return faiss.read_index_binary(path)
+
+
+def search_params(index, params: dict, ef_search=None, nprobe=None, sel=None):
+    """
+    Per-query search parameters (None for exact flat search without a
+    selector). `sel` is a faiss.IDSelector restricting which rows can match.
+    """
+    kind = index_kind(index)
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=ef_search or params["ef_search"], sel=sel)
+    if kind == "ivf" or index_compression(index) == "pq":
+        return faiss.SearchParametersIVF(nprobe=nprobe or params["nprobe"], sel=sel)
+    if sel is not None:
+        return faiss.SearchParameters(sel=sel)
+    return None
@@ -0,0 +1,181 @@
+import atexit
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from fsutil import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    Semantic cache of answered questions.
+
+    A new question hits when its (normalized) embedding has cosine
+    similarity >= `threshold` with a cached question that was answered
+    against the same VectorStore version and in the same `scope` (the
+    metadata filters of the question). Entries from other versions are
+    dropped, so any add/delete/reset invalidates the cache. Bounded by
+    `max_entries` (LRU) and `ttl` seconds, and persisted to `path`.
+
+    Inserts only mark the cache dirty: a background thread writes it out
+    every `flush_interval` seconds, and flush() at shutdown, so answering
+    never waits on pickling/fsyncing the whole cache.
+    """
+
+    def __init__(self, path="data/cache/answers.pkl", threshold=0.95, max_entries=1000, ttl=24 * 3600,
+                 flush_interval=5.0):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()   # one writer of the file at a time
+        self._dirty = False
+        self._stop = threading.Event()
+        self._entries = OrderedDict()   # key -> entry dict, least recently used first
+        self._matrix = None             # stacked embeddings of _matrix_keys (rebuilt lazily)
+        self._matrix_keys = []
+        self._matrix_scopes = None
+        self._next_key = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+        if path and os.path.exists(path):
+            self._load()
+        if path:
+            threading.Thread(target=self._flush_loop, daemon=True, name="answer-cache-flush").start()
+            atexit.register(self.close)
+
+    # ---------------- lookup / store ---------------- #
+    def _drop_stale(self, version: str):
+        now = time.time()
+        stale = [k for k, e in self._entries.items()
+                 if e["version"] != version or now - e["created"] > self.ttl]
+        for k in stale:
+            del self._entries[k]
+        if stale:
+            self._matrix = None
+
+    def lookup(self, embedding, version: str, scope: str = ""):
+        """
+        Cached answer dict for a semantically equal question, or None.
+        """
+        with self._lock:
+            self._drop_stale(version)
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries)
+                self._matrix = np.stack([self._entries[k]["embedding"] for k in self._matrix_keys])
+                self._matrix_scopes = np.array([self._entries[k].get("scope", "") for k in self._matrix_keys],
+                                               dtype=object)
+            sims = self._matrix @ np.asarray(embedding, dtype="float32")
+            sims[self._matrix_scopes != scope] = -np.inf
+            best = int(np.argmax(sims))
+
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            key = self._matrix_keys[best]
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.latency_saved += entry["latency"]
+            return entry["answer"]
+
+    def store(self, embedding, version: str, answer: dict, latency: float, scope: str = ""):
+        """
+        Remember `answer` (took `latency` seconds to produce) for this question.
+        """
+        with self._lock:
+            self._entries[self._next_key] = {
+                "embedding": np.asarray(embedding, dtype="float32"),
+                "version": version,
+                "scope": scope,
+                "answer": answer,
+                "latency": latency,
+                "created": time.time(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+            self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._dirty = True
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "latency_saved_s": round(self.latency_saved, 3),
+            }
+
+    # ---------------- persistence ---------------- #
+    def flush(self):
+        """
+        Write the cache to `path` if it changed since the last write.
+        """
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                # entries are never mutated once stored: a shallow copy is a consistent snapshot
+                state = {"entries": OrderedDict(self._entries), "next_key": self._next_key}
+                self._dirty = False
+            try:
+                data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                atomic_write(self.path, lambda f: f.write(data))
+            except Exception:
+                with self._lock:
+                    self._dirty = True
+                raise
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("answer cache flush failed: %s", e)
+
+    def close(self):
+        """
+        Stop the background writer and write pending changes.
+        """
+        self._stop.set()
+        self.flush()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except Exception:
+            # a broken cache file is not worth failing startup for
+            return
+        self._entries = state["entries"]
+        self._next_key = state["next_key"]
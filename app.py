@@ -1,84 +1,262 @@
+import json
 import os
-from typing import List
-from fastapi import FastAPI, UploadFile, File
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
-from vectordb import VectorStore
-from rag_pipeline import build_index, answer_multiple_questions
+import lazy
+import metrics
+from context_builder import context_stats
+from sharding import open_store
+from ingest import IngestEngine
+from jobs import JobQueue, QueueFull
+from llm_router import client_names, provider_stats
+from rag_pipeline import aanswer_multiple_questions, astream_multiple_questions, answer_cache, sync_documents
 
-app = FastAPI()
+
+# what /ready waits for (WARM_UP=0: nothing, models and clients load on first use)
+WARM_UP_NAMES = ["embedding_model", "tokenizer", *client_names()] if os.getenv("WARM_UP", "1") != "0" else []
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # models and clients are lazy: load them in the background right away so
+    # the server accepts connections immediately; failed loads are retried
+    if WARM_UP_NAMES:
+        threading.Thread(target=lazy.warm_up, args=(WARM_UP_NAMES,), kwargs={"retry": True},
+                         daemon=True, name="warm-up").start()
+    yield
+    if answer_cache is not None:
+        answer_cache.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 UPLOAD_DIR = "data/uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # embedding dimension for BGE-Small = 384
-vectordb = VectorStore(dim=384)
+# index type: flat (exact) / hnsw / ivf
+# compression of the in-memory vectors: none / fp16 / sq8 / pq / binary
+# VECTOR_SHARDS: N in-process shards, or host:port,... of shard servers (unset: one store)
+vectordb = open_store(dim=384, shards=os.getenv("VECTOR_SHARDS", ""),
+                      index_type=os.getenv("VECTOR_INDEX_TYPE", "flat"),
+                      compression=os.getenv("VECTOR_COMPRESSION", "none"))
+
+# uploads are indexed in the background: JOB_WORKERS jobs at a time,
+# at most JOB_QUEUE_SIZE waiting (429 beyond that)
+ingest_engine = IngestEngine(vectordb)
+jobs = JobQueue(ingest_engine,
+                workers=int(os.getenv("JOB_WORKERS", "2")),
+                max_queued=int(os.getenv("JOB_QUEUE_SIZE", "100")))
+
+# read at scrape time (in a worker thread, see /metrics: with remote shards this is one call per shard)
+metrics.Gauge("rag_index_documents", "Documents in the vector store", fn=lambda: len(vectordb.documents))
+metrics.Gauge("rag_index_chunks", "Live chunks in the vector store",
+              fn=lambda: sum(d.get("chunks", 0) for d in vectordb.documents.values()))
+metrics.Gauge("rag_jobs_queued", "Ingest jobs waiting to run", fn=lambda: jobs.stats()["queued"])
+metrics.Gauge("rag_answer_cache_entries", "Entries of the semantic answer cache",
+              fn=lambda: answer_cache.stats()["entries"] if answer_cache else 0)
+
+
+def _epoch(value: datetime) -> float:
+    # .timestamp() would read a naive datetime in the server's local time zone
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class SearchFilters(BaseModel):
+    """
+    Scope of a question: documents by name, by tag (any of them) and by
+    indexing time (datetimes without a time zone are UTC). Omitted fields
+    don't filter.
+    """
+    sources: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+    def to_dict(self):
+        filters = {"sources": self.sources, "tags": self.tags,
+                   "since": _epoch(self.since) if self.since else None,
+                   "until": _epoch(self.until) if self.until else None}
+        return {k: v for k, v in filters.items() if v is not None} or None
 
 
 class QuestionRequest(BaseModel):
     question: str
+    filters: Optional[SearchFilters] = None
 
+    def filter_dict(self):
+        return self.filters.to_dict() if self.filters else None
 
-@app.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
-    """Upload and index a single document"""
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
 
+def _parse_tags(tags: str):
+    return [t.strip() for t in tags.split(",") if t.strip()]
+
+
+async def _save_upload(file: UploadFile) -> str:
+    file_path = os.path.join(UPLOAD_DIR, os.path.basename(file.filename))
     with open(file_path, "wb") as f:
-        f.write(await file.read())
+        while block := await file.read(1 << 20):
+            await run_in_threadpool(f.write, block)
+    return file_path
 
-    result = build_index(file_path, vectordb)
-    return {"status": "success", "result": result}
+
+async def _queue_upload(files: List[UploadFile], tags=None):
+    # refuse before writing anything when the queue is already full
+    if jobs.full():
+        raise HTTPException(status_code=429, detail="Ingestion queue is full, retry later",
+                            headers={"Retry-After": "30"})
+
+    saved = [(file.filename, await _save_upload(file)) for file in files]
+    try:
+        job = jobs.submit(saved, tags=tags)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    return JSONResponse(status_code=202, content={"status": "queued", "job_id": job["id"], "job": job})
+
+
+@app.post("/upload")
+async def upload_document(file: UploadFile = File(...), tags: str = Form("")):
+    """
+    Upload a document and queue it for indexing.
+    Returns a job id right away; poll /jobs/{job_id} for progress.
+    `tags` (comma-separated) can later scope questions to this document.
+    """
+    return await _queue_upload([file], _parse_tags(tags))
 
 
 @app.post("/upload-multiple")
-async def upload_multiple_documents(files: List[UploadFile] = File(...)):
+async def upload_multiple_documents(files: List[UploadFile] = File(...), tags: str = Form("")):
     """
-    Upload and index multiple documents sequentially (no parallel processing).
-    Processes files one by one in the order they were uploaded.
+    Upload several documents as one indexing job (files are processed in
+    parallel by the ingest workers). Poll /jobs/{job_id} for progress.
     """
-    results = []
-    successful = 0
-    failed = 0
-    
-    for file in files:
-        try:
-            # Save file
-            file_path = os.path.join(UPLOAD_DIR, file.filename)
-            with open(file_path, "wb") as f:
-                f.write(await file.read())
-            
-            # Index file
-            index_result = build_index(file_path, vectordb)
-            
-            results.append({
-                "filename": file.filename,
-                "status": "success",
-                "chunks_added": index_result.get("chunks_added", 0),
-                "source": index_result.get("source", file.filename)
-            })
-            successful += 1
-            
-        except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "status": "error",
-                "error": str(e)
-            })
-            failed += 1
-    
-    return {
-        "status": "success",
-        "total_files": len(files),
-        "successful": successful,
-        "failed": failed,
-        "results": results
-    }
+    return await _queue_upload(files, _parse_tags(tags))
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Per-file status, page/chunk counts and timings of an indexing job"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+@app.get("/jobs")
+async def job_queue_stats():
+    """Queue depth and job counts by status"""
+    return jobs.stats()
+
+
+@app.get("/documents")
+async def list_documents():
+    """Indexed documents with their content hash, chunk count, tags and indexing time"""
+    # one call per shard when the store is sharded: off the event loop
+    return {"documents": await run_in_threadpool(lambda: vectordb.documents)}
+
+
+@app.post("/documents/sync")
+async def sync_upload_folder(delete_missing: bool = True):
+    """
+    Bring the index in line with the upload folder: new and changed files
+    are (re)indexed, unchanged ones skipped, and documents whose file is
+    gone are deleted (unless delete_missing=false)
+    """
+    result = await run_in_threadpool(sync_documents, UPLOAD_DIR, vectordb, delete_missing)
+    return {"status": "success", **result}
+
+
+@app.delete("/documents/{source}")
+async def delete_document(source: str):
+    """Delete every chunk of one document"""
+    removed = await run_in_threadpool(vectordb.delete_source, source)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Unknown document: {source}")
+    path = os.path.join(UPLOAD_DIR, os.path.basename(source))
+    if os.path.exists(path):
+        os.remove(path)
+    return {"status": "success", "source": source, "chunks_removed": removed}
 
 
 @app.post("/ask")
 async def ask_question(req: QuestionRequest):
-    """Ask a question and get answers from indexed documents"""
-    result = answer_multiple_questions(req.question, vectordb)
+    """
+    Ask a question and get answers from indexed documents
+    (only from the documents matching `filters`, when given)
+    """
+    result = await aanswer_multiple_questions(req.question, vectordb, filters=req.filter_dict())
     return {"status": "success", "result": result}
 
+
+@app.post("/ask/stream")
+async def ask_question_stream(req: QuestionRequest):
+    """
+    Same as /ask, streamed as Server-Sent Events while the answer is generated.
+    Events: question, token, reset (provider fallback: discard the partial
+    answer), answer, done, error.
+    """
+    async def events():
+        try:
+            async for event in astream_multiple_questions(req.question, vectordb, filters=req.filter_dict()):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/ready")
+async def readiness():
+    """
+    503 until the embedding model, tokenizer and LLM clients are loaded
+    (by the warm-up, its retries or first use), 200 after. Reports what is
+    loaded, how long each load took and the last error of failed loads.
+    """
+    status = lazy.status()
+    if not lazy.ready(WARM_UP_NAMES):
+        return JSONResponse(status_code=503, content={"ready": False, **status})
+    return {"ready": True, **status}
+
+
+@app.get("/context/stats")
+async def prompt_context_stats():
+    """Prompt tokens sent, saved by merging overlapping chunks, and cut by the token budget"""
+    return context_stats()
+
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """Per-provider latency (p50/p95), error rate and circuit breaker state of the LLM router"""
+    return provider_stats()
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit rate and latency saved by the semantic answer cache"""
+    if answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **answer_cache.stats()}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage latencies, LLM calls and fallbacks, cache hits, tokens and index size (Prometheus format)"""
+    # the gauges may ask remote shards: off the event loop
+    body = await run_in_threadpool(metrics.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/slow")
+async def slow_queries():
+    """Latest requests slower than SLOW_QUERY_SECONDS, with their per-stage breakdown"""
+    return {"threshold_s": metrics.SLOW_QUERY_SECONDS, "queries": metrics.recent_slow_queries()}
@@ -0,0 +1,105 @@
+"""
+Recall vs latency of the ANN index types against the exact flat baseline.
+
+Builds each index type from ann_index.py over a synthetic clustered corpus of
+normalized vectors, then sweeps the per-query knobs (efSearch for HNSW, nprobe
+for IVF) and reports recall@k against IndexFlatIP plus query latency.
+
+    python benchmarks/bench_ann.py --n 200000 --queries 500
+    python benchmarks/bench_ann.py --n 1000000 --json ann_report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ann_index  # noqa: E402
+
+
+def synthetic_corpus(n, dim, clusters, rng):
+    # embeddings of real chunks are clustered by topic, uniform noise would flatter IVF/HNSW
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, size=n)
+    x = centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+def timed_search(index, queries, k, params):
+    latencies = []
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(q[None, :], k, params=params)
+        latencies.append(time.perf_counter() - start)
+        ids[i] = found[0]
+    return ids, np.array(latencies) * 1000
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = synthetic_corpus(args.n, args.dim, args.clusters, rng)
+    queries = synthetic_corpus(args.queries, args.dim, args.clusters, rng)
+
+    params = dict(ann_index.DEFAULT_PARAMS, ivf_train_min=0)
+    report = {"n": args.n, "dim": args.dim, "k": args.k, "results": []}
+
+    flat = ann_index.build_index("flat", args.dim, corpus, params)
+    truth, flat_ms = timed_search(flat, queries, args.k, None)
+    report["results"].append({"index": "flat", "knob": None, "recall": 1.0,
+                              "p50_ms": float(np.percentile(flat_ms, 50)),
+                              "p95_ms": float(np.percentile(flat_ms, 95)), "build_s": None})
+
+    sweeps = {
+        "hnsw": ("ef_search", [16, 32, 64, 128, 256]),
+        "ivf": ("nprobe", [1, 4, 16, 64, 128]),
+    }
+    for index_type, (knob, values) in sweeps.items():
+        start = time.perf_counter()
+        index = ann_index.build_index(index_type, args.dim, corpus, params)
+        build_s = time.perf_counter() - start
+
+        for value in values:
+            sp = ann_index.search_params(index, params, **{knob: value})
+            found, ms = timed_search(index, queries, args.k, sp)
+            report["results"].append({
+                "index": index_type, "knob": f"{knob}={value}",
+                "recall": recall_at_k(found, truth),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+                "build_s": build_s,
+            })
+
+    print(f"n={args.n} dim={args.dim} recall@{args.k} vs exact IndexFlatIP")
+    print(f"{'index':<6} {'knob':<14} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}")
+    for r in report["results"]:
+        build = f"{r['build_s']:.1f}" if r["build_s"] is not None else "-"
+        print(f"{r['index']:<6} {r['knob'] or '-':<14} {r['recall']:>7.3f} "
+              f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {build:>8}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Memory vs recall of the compressed vector modes.
+
+Builds each index type / compression pair from ann_index.py over a synthetic
+clustered corpus and reports the in-memory index size, bytes per vector and
+recall@k against exact float32 search, with the approximate scores as they
+are and after re-ranking top_k * rerank candidates with the full-precision
+vectors read from a memory-mapped .npy file (as VectorStore does).
+
+    python benchmarks/bench_compression.py --n 200000
+    python benchmarks/bench_compression.py --n 1000000 --rerank 0 2 4 8 --json compression_report.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ann_index  # noqa: E402
+from bench_ann import recall_at_k, synthetic_corpus  # noqa: E402
+
+
+CONFIGS = [
+    ("flat", "none"), ("flat", "fp16"), ("flat", "sq8"), ("flat", "pq"), ("flat", "binary"),
+    ("hnsw", "none"), ("hnsw", "sq8"),
+    ("ivf", "none"), ("ivf", "sq8"), ("ivf", "pq"),
+]
+
+
+def search_reranked(index, vectors, queries, k, rerank, params):
+    """
+    (ids, ms per query): index search for top_k * rerank candidates, re-scored
+    with `vectors` (memory-mapped). rerank 0 = index scores as they are.
+    """
+    depth = k * rerank if rerank else k
+    sp = ann_index.search_params(index, params)
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = []
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        _, found = ann_index.search(index, q[None, :], depth, params=sp)
+        found = found[0][found[0] >= 0]
+        if rerank:
+            rows = np.sort(found)
+            scores = np.asarray(vectors[rows], dtype=np.float32) @ q
+            found = rows[np.argsort(-scores)]
+        latencies.append(time.perf_counter() - start)
+        ids[i] = np.pad(found[:k], (0, max(0, k - len(found[:k]))), constant_values=-1)
+    return ids, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 4],
+                        help="shortlist multipliers to try (0 = no re-ranking)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = synthetic_corpus(args.n, args.dim, args.clusters, rng)
+    queries = synthetic_corpus(args.queries, args.dim, args.clusters, rng)
+    params = dict(ann_index.DEFAULT_PARAMS, ivf_train_min=0, compress_train_min=0)
+
+    tmp = tempfile.mkdtemp(prefix="bench_compression_")
+    try:
+        np.save(os.path.join(tmp, "vectors.npy"), corpus)
+        vectors = np.load(os.path.join(tmp, "vectors.npy"), mmap_mode="r")
+
+        truth = ann_index.search(ann_index.build_index("flat", args.dim, corpus, params),
+                                 queries, args.k)[1]
+        float32_bytes = args.n * args.dim * 4
+
+        report = {"n": args.n, "dim": args.dim, "k": args.k, "results": []}
+        print(f"n={args.n} dim={args.dim} recall@{args.k} vs exact float32 search "
+              f"(float32 vectors: {float32_bytes / 2 ** 20:.0f} MiB)")
+        print(f"{'index':<6} {'compression':<12} {'MiB':>8} {'B/vec':>7} {'saved':>6} "
+              f"{'rerank':>6} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8}")
+        for index_type, compression in CONFIGS:
+            try:
+                ann_index.check_config(index_type, compression, args.dim, params)
+            except ValueError:
+                continue
+            start = time.perf_counter()
+            index = ann_index.build_index(index_type, args.dim, corpus, params, compression)
+            build_s = time.perf_counter() - start
+            size = len(ann_index.serialize_index(index))
+
+            for rerank in args.rerank:
+                if compression == "none" and rerank:
+                    continue
+                if compression == "binary" and not rerank:
+                    continue
+                found, ms = search_reranked(index, vectors, queries, args.k, rerank, params)
+                row = {"index": index_type, "compression": compression, "index_bytes": size,
+                       "bytes_per_vector": size / args.n, "saved": 1 - size / float32_bytes,
+                       "rerank": rerank, "recall": recall_at_k(found, truth),
+                       "p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+                       "build_s": build_s}
+                report["results"].append(row)
+                print(f"{index_type:<6} {compression:<12} {size / 2 ** 20:>8.1f} {row['bytes_per_vector']:>7.1f} "
+                      f"{max(row['saved'], 0):>6.0%} {rerank or '-':>6} {row['recall']:>7.3f} "
+                      f"{row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Embedding backend throughput and agreement.
+
+Embeds the same corpus with the reference PyTorch backend and the int8 ONNX
+backend (with and without length sorting) and reports texts/s, plus how
+closely the ONNX vectors match the reference: cosine per text and overlap
+of the top-k neighbours each backend retrieves for the same queries.
+
+The corpus is synthetic chunks of mixed lengths (like a real ingest, where
+most chunks are full and page/document tails are short), or the text of
+--files chunked as at ingest time.
+
+    python benchmarks/bench_embed.py --n 2000
+    python benchmarks/bench_embed.py --files data/uploads/*.pdf --json embed_report.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_backends import make_backend  # noqa: E402
+from embeddings import MODEL_NAME  # noqa: E402
+
+
+WORDS = ("the of and to in is that for it as with was on by be this are from at or an which "
+         "document section report revenue policy system model data result table figure value "
+         "customer contract payment period amount service product risk management analysis").split()
+
+
+def synthetic_chunks(n, rng):
+    texts = []
+    for _ in range(n):
+        # ~70% full chunks, the rest short tails
+        words = rng.randint(250, 380) if rng.random() < 0.7 else rng.randint(5, 120)
+        texts.append(" ".join(rng.choices(WORDS, k=words)))
+    return texts
+
+
+def file_chunks(paths):
+    from chunker import chunk_pages
+    from document_loader import iter_document
+
+    return [ch["text"] for path in paths for ch in chunk_pages(iter_document(path))]
+
+
+def timed_encode(backend, texts, repeat):
+    backend.encode(texts[:8])
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        vectors = backend.encode(texts)
+        best = min(best, time.perf_counter() - start)
+    return vectors, best
+
+
+def agreement(reference, vectors, queries, k):
+    cosine = np.sum(reference * vectors, axis=1)
+    q = np.arange(min(queries, len(reference)))
+    ref_top = np.argsort(-(reference[q] @ reference.T), axis=1)[:, 1:k + 1]
+    top = np.argsort(-(vectors[q] @ vectors.T), axis=1)[:, 1:k + 1]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, top)])
+    return {"cosine_mean": float(cosine.mean()), "cosine_p1": float(np.percentile(cosine, 1)),
+            "cosine_min": float(cosine.min()), f"top{k}_overlap": float(overlap)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=1000, help="synthetic chunks (ignored with --files)")
+    parser.add_argument("--files", nargs="*", default=None)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--onnx-path", default="data/models/bge-small-onnx")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    texts = file_chunks(args.files) if args.files else synthetic_chunks(args.n, random.Random(0))
+    print(f"{len(texts)} texts, {sum(len(t) for t in texts) / len(texts):.0f} chars on average")
+
+    runs = [
+        ("torch", "torch", {}),
+        ("onnx-int8", "onnx", {"path": args.onnx_path}),
+        ("onnx-int8 unsorted", "onnx", {"path": args.onnx_path, "sort_by_length": False}),
+    ]
+
+    results = []
+    reference = None
+    print(f"{'backend':<20} {'texts/s':>9} {'cos mean':>9} {'cos p1':>8} {'cos min':>8} {f'top{args.k}':>7}")
+    for label, name, options in runs:
+        backend = make_backend(name, MODEL_NAME, batch_size=args.batch_size, threads=args.threads, **options)
+        vectors, seconds = timed_encode(backend, texts, args.repeat)
+        row = {"backend": label, "texts_per_s": len(texts) / seconds, "seconds": seconds}
+        if reference is None:
+            reference = vectors
+        else:
+            row.update(agreement(reference, vectors, args.queries, args.k))
+        results.append(row)
+
+        print(f"{label:<20} {row['texts_per_s']:>9.1f} {row.get('cosine_mean', 1.0):>9.4f} "
+              f"{row.get('cosine_p1', 1.0):>8.4f} {row.get('cosine_min', 1.0):>8.4f} "
+              f"{row.get(f'top{args.k}_overlap', 1.0):>7.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"texts": len(texts), "batch_size": args.batch_size, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Sustained-ingest benchmark for VectorStore persistence.
+
+Adds many small batches of random vectors + synthetic chunk text to a fresh
+store and prints the write cost per document as the corpus grows. With the
+segmented store the cost should stay flat instead of growing with corpus size.
+
+    python benchmarks/bench_ingest.py --batches 200 --batch-size 50
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vectordb import VectorStore  # noqa: E402
+
+
+WORDS = [f"term{i}" for i in range(5000)]
+
+
+def make_batch(rng, batch_no, batch_size, dim):
+    vectors = rng.standard_normal((batch_size, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    metadatas = [{
+        "chunk_id": f"bench_{batch_no}_{i}",
+        "source": f"bench_{batch_no}.txt",
+        "text": " ".join(random.choices(WORDS, k=350)),
+    } for i in range(batch_size)]
+    return vectors, metadatas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--report-every", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    random.seed(0)
+    root = tempfile.mkdtemp(prefix="bench_ingest_")
+
+    try:
+        store = VectorStore(args.dim, index_path=os.path.join(root, "faiss.index"),
+                            meta_path=os.path.join(root, "meta.pkl"))
+
+        print(f"{'docs':>10} {'ms/doc (window)':>16} {'segments':>9}")
+        window = 0.0
+        for b in range(1, args.batches + 1):
+            vectors, metadatas = make_batch(rng, b, args.batch_size, args.dim)
+            start = time.perf_counter()
+            store.add(vectors, metadatas)
+            window += time.perf_counter() - start
+
+            if b % args.report_every == 0:
+                per_doc = window * 1000 / (args.report_every * args.batch_size)
+                print(f"{b * args.batch_size:>10} {per_doc:>16.3f} {len(store.store.segments):>9}")
+                window = 0.0
+
+        start = time.perf_counter()
+        store.save()
+        print(f"final compaction: {time.perf_counter() - start:.2f}s")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
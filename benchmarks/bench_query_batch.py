@@ -0,0 +1,117 @@
+"""
+Latency vs throughput of the query embedding micro-batcher under load.
+
+`--clients` threads each embed one query at a time, back to back, for
+`--seconds`; this is repeated without batching and for each batching window.
+Reports queries/s, latency percentiles per query and the mean batch size.
+
+By default the encoder is a cost model of a CPU forward pass (a fixed
+per-call overhead plus a per-text cost, GIL released like real inference);
+--backend torch / onnx uses the real model instead.
+
+    python benchmarks/bench_query_batch.py --clients 32
+    python benchmarks/bench_query_batch.py --backend onnx --windows 0 2 5 10 --max-batch 64
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from microbatch import MicroBatcher  # noqa: E402
+
+
+def cost_model_encoder(overhead_ms, per_text_ms, dim=384):
+    def encode(texts):
+        time.sleep((overhead_ms + per_text_ms * len(texts)) / 1000)
+        return np.zeros((len(texts), dim), dtype=np.float32)
+    return encode
+
+
+def run_load(embed, clients, seconds, rng_seed=0):
+    latencies = []
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def client(i):
+        rng = random.Random(rng_seed + i)
+        mine = []
+        while time.perf_counter() < stop:
+            question = f"question {rng.random()} about the quarterly report"
+            start = time.perf_counter()
+            embed([question])
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    return {"queries": len(latencies), "qps": len(latencies) / elapsed,
+            "p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 1, 2, 5, 10],
+                        help="batching windows in ms (0 = no batching)")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--backend", default="model", help="model (cost model), torch or onnx")
+    parser.add_argument("--overhead-ms", type=float, default=8.0, help="cost model: per forward pass")
+    parser.add_argument("--per-text-ms", type=float, default=0.5, help="cost model: per query in the batch")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.backend == "model":
+        encode = cost_model_encoder(args.overhead_ms, args.per_text_ms)
+    else:
+        from embedding_backends import make_backend
+        from embeddings import MODEL_NAME
+        encode = make_backend(args.backend, MODEL_NAME).encode
+        encode(["warm up"])
+
+    print(f"{args.clients} clients, {args.seconds:g} s per run, encoder: {args.backend}")
+    print(f"{'window ms':>9} {'q/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'batch':>6}")
+    results = []
+    for window in args.windows:
+        if window <= 0:
+            lock = threading.Lock()
+
+            # one forward pass at a time, like the shared model without batching
+            def embed(texts):
+                with lock:
+                    return encode(texts)
+            batcher = None
+        else:
+            batcher = MicroBatcher(encode, max_batch=args.max_batch, max_wait=window / 1000)
+            embed = batcher
+
+        row = {"window_ms": window, **run_load(embed, args.clients, args.seconds)}
+        row["avg_batch"] = batcher.stats()["avg_batch_items"] if batcher else 1.0
+        results.append(row)
+        print(f"{window:>9g} {row['qps']:>8.1f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+              f"{row['p99_ms']:>8.2f} {row['avg_batch']:>6.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"clients": args.clients, "max_batch": args.max_batch, "backend": args.backend,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+Component micro-benchmarks of the ingest and query hot paths, offline.
+
+Builds a synthetic corpus (text with a Zipfian vocabulary + clustered
+normalized vectors) and times each component on its own:
+
+    load_document, chunk_text, embed_texts,
+    add, save, load, search_dense, search_bm25, hybrid_search,
+    answer (retrieval + context + fake LLM, end to end)
+
+Models are stand-ins so nothing is downloaded or called: EMBED_BACKEND=fake
+(hashed bag-of-words) and LLM_PROVIDERS=fake with no token delay. Only
+chunk_text / answer need the tiktoken cl100k_base file (cached after its
+first download). The corpus is added in batches, so sizes from 10k to
+millions of chunks only need the memory of the index itself.
+
+Every component reports throughput, p50/p95/p99 latency and peak RSS
+while it ran. Results are written as JSON (with the git commit) so two
+runs can be compared:
+
+    python benchmarks/bench_suite.py --chunks 10000
+    python benchmarks/bench_suite.py --chunks 1000000 --index-type hnsw --only add search_dense hybrid_search
+    python benchmarks/bench_suite.py --chunks 100000 --compare benchmarks/results/suite_<commit>.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# stand-in models; set before the repo modules read them
+os.environ.setdefault("EMBED_BACKEND", "fake")
+os.environ.setdefault("EMBED_CACHE", "0")
+os.environ.setdefault("LLM_PROVIDERS", "fake")
+os.environ.setdefault("FAKE_LLM_TOKEN_DELAY", "0")
+os.environ.setdefault("ANSWER_CACHE", "0")
+os.environ.setdefault("QUERY_BATCH_WAIT_MS", "0")
+
+COMPONENTS = ("load_document", "chunk_text", "embed_texts", "add", "save", "load",
+              "search_dense", "search_bm25", "hybrid_search", "answer")
+
+# metrics compared by --compare (lower is better, except throughput)
+COMPARED = ("throughput_per_s", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+
+
+# ---------------- measurement ---------------- #
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        # no procfs: the process high-water mark (never goes down)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PeakRSS:
+    """
+    Samples the resident set size while the block runs; `peak_mb` is the
+    highest value seen, `delta_mb` how far above the starting RSS it went.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __enter__(self):
+        self.start = self.peak = _rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+    @property
+    def peak_mb(self):
+        return self.peak / 2 ** 20
+
+    @property
+    def delta_mb(self):
+        return (self.peak - self.start) / 2 ** 20
+
+
+def summarize(latencies, items, elapsed, mem):
+    """
+    `latencies` (seconds per call) over `elapsed` seconds that processed
+    `items` (rows, texts, queries...) to the reported metrics.
+    """
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "calls": len(ms),
+        "items": items,
+        "seconds": round(elapsed, 4),
+        "throughput_per_s": items / elapsed if elapsed else 0.0,
+        "mean_ms": float(ms.mean()) if len(ms) else 0.0,
+        "p50_ms": float(np.percentile(ms, 50)) if len(ms) else 0.0,
+        "p95_ms": float(np.percentile(ms, 95)) if len(ms) else 0.0,
+        "p99_ms": float(np.percentile(ms, 99)) if len(ms) else 0.0,
+        "peak_rss_mb": round(mem.peak_mb, 1),
+        "peak_delta_mb": round(mem.delta_mb, 1),
+    }
+
+
+def measure(calls):
+    """
+    Run `calls` (an iterable of (callable, items)) one after another, timing each.
+    """
+    latencies, items = [], 0
+    with PeakRSS() as mem:
+        start = time.perf_counter()
+        for fn, n in calls:
+            t = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - t)
+            items += n
+        elapsed = time.perf_counter() - start
+    return summarize(latencies, items, elapsed, mem)
+
+
+# ---------------- synthetic corpus ---------------- #
+class Corpus:
+    """
+    Deterministic synthetic chunks: text drawn from a Zipfian vocabulary
+    (so BM25 sees realistic term frequencies) and vectors around topic
+    centers (so ANN indexes see realistic clusters).
+    """
+
+    def __init__(self, dim, vocab=50000, clusters=256, words_per_chunk=120, chunks_per_doc=50, seed=0):
+        self.dim = dim
+        self.words_per_chunk = words_per_chunk
+        self.chunks_per_doc = chunks_per_doc
+        self.rng = np.random.default_rng(seed)
+        self.words = np.array([f"w{i}" for i in range(vocab)])
+        weights = 1.0 / np.arange(1, vocab + 1) ** 1.07
+        self.word_p = weights / weights.sum()
+        self.centers = self.rng.standard_normal((clusters, dim)).astype("float32")
+
+    def texts(self, n, words=None):
+        words = words or self.words_per_chunk
+        ids = self.rng.choice(len(self.words), size=(n, words), p=self.word_p)
+        return [" ".join(row) for row in self.words[ids]]
+
+    def vectors(self, n):
+        labels = self.rng.integers(0, len(self.centers), size=n)
+        x = self.centers[labels] + 0.6 * self.rng.standard_normal((n, self.dim)).astype("float32")
+        x /= np.linalg.norm(x, axis=1, keepdims=True)
+        return x
+
+    def batches(self, total, batch_rows):
+        """
+        (vectors, metadatas) batches covering `total` chunks.
+        """
+        for first in range(0, total, batch_rows):
+            n = min(batch_rows, total - first)
+            metadatas = [{
+                "chunk_id": f"bench_{first + i}",
+                "source": f"doc_{(first + i) // self.chunks_per_doc}.txt",
+                "text": text,
+            } for i, text in enumerate(self.texts(n))]
+            yield self.vectors(n), metadatas
+
+    def queries(self, n):
+        # mid-frequency words: neither stop-word-like nor absent
+        ids = self.rng.integers(20, 5000, size=(n, 3))
+        return self.vectors(n), [" ".join(row) for row in self.words[ids]]
+
+
+# ---------------- components ---------------- #
+def bench_ingest_side(corpus, args, tmp, results):
+    from chunker import chunk_text
+    from document_loader import load_document
+    from embeddings import embed_texts
+
+    paths = []
+    for i in range(args.docs):
+        path = os.path.join(tmp, f"doc_{i}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(corpus.texts(args.doc_kb * 1024 // (corpus.words_per_chunk * 6) + 1)))
+        paths.append(path)
+
+    texts = {}
+
+    def load(path):
+        texts[path] = load_document(path)
+
+    run("load_document", results, args,
+        lambda: measure([(lambda p=p: load(p), 1) for p in paths]),
+        unit="documents")
+
+    def chunk_calls():
+        calls = []
+        for path in paths:
+            if path not in texts:
+                texts[path] = load_document(path)
+            calls.append((lambda t=texts[path]: chunk_text(t), 1))
+        return measure(calls)
+
+    run("chunk_text", results, args, chunk_calls, unit="documents")
+
+    sample = corpus.texts(args.embed_texts)
+    batches = [sample[i:i + 64] for i in range(0, len(sample), 64)]
+    embed_texts(["warm up"])
+    run("embed_texts", results, args,
+        lambda: measure([(lambda b=b: embed_texts(b), len(b)) for b in batches]),
+        unit="texts")
+
+
+def bench_store(corpus, args, tmp, results):
+    from vectordb import VectorStore
+
+    path = os.path.join(tmp, "index")
+    options = {"index_type": args.index_type, "compression": args.compression}
+
+    def open_store():
+        return VectorStore(args.dim, index_path=os.path.join(path, "faiss.index"),
+                           meta_path=os.path.join(path, "meta.pkl"), **options)
+
+    store = open_store()
+    # batches are generated outside the timed calls
+    latencies, rows = [], 0
+    with PeakRSS() as mem:
+        start = time.perf_counter()
+        for vectors, metadatas in corpus.batches(args.chunks, args.batch_rows):
+            t = time.perf_counter()
+            store.add(vectors, metadatas)
+            latencies.append(time.perf_counter() - t)
+            rows += len(metadatas)
+        elapsed = sum(latencies)
+    if "add" in args.only:
+        results["add"] = {"unit": "chunks", **summarize(latencies, rows, elapsed, mem)}
+        report("add", results["add"])
+
+    run("save", results, args, lambda: measure([(store.save, rows)]), unit="chunks")
+    if "save" not in args.only:
+        # searches must not race a background compaction started by the adds
+        store.save()
+
+    loaded = {}
+    run("load", results, args, lambda: measure([(lambda: loaded.setdefault("store", open_store()), rows)]),
+        unit="chunks")
+    store = loaded.get("store", store)
+
+    q_vectors, q_texts = corpus.queries(args.queries)
+    store.hybrid_search(q_vectors[0], q_texts[0], args.k)
+    run("search_dense", results, args,
+        lambda: measure([(lambda v=v: store.search_dense(v, args.k), 1) for v in q_vectors]), unit="queries")
+    run("search_bm25", results, args,
+        lambda: measure([(lambda t=t: store.search_bm25(t, args.k), 1) for t in q_texts]), unit="queries")
+    run("hybrid_search", results, args,
+        lambda: measure([(lambda v=v, t=t: store.hybrid_search(v, t, args.k), 1)
+                         for v, t in zip(q_vectors, q_texts)]), unit="queries")
+
+    def answer_calls():
+        from rag_pipeline import answer_question
+        return measure([(lambda t=t: answer_question(t, store), 1) for t in q_texts[:args.answer_queries]])
+
+    run("answer", results, args, answer_calls, unit="queries")
+
+
+def run(name, results, args, fn, unit):
+    if name not in args.only:
+        return
+    try:
+        results[name] = {"unit": unit, **fn()}
+    except Exception as e:
+        # e.g. chunk_text without the tiktoken file offline: report it, keep going
+        results[name] = {"unit": unit, "error": f"{type(e).__name__}: {e}"}
+    report(name, results[name])
+
+
+def report(name, row):
+    if "error" in row:
+        print(f"{name:<14} error: {row['error']}")
+        return
+    print(f"{name:<14} {row['throughput_per_s']:>12.1f} {row['unit'] + '/s':<12} {row['p50_ms']:>9.3f} "
+          f"{row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f} {row['peak_rss_mb']:>9.1f} {row['peak_delta_mb']:>+9.1f}")
+
+
+# ---------------- results ---------------- #
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base, current):
+    """
+    Print the relative change of each compared metric vs a previous run.
+    """
+    print(f"\nvs {base['meta'].get('commit')} ({base['meta'].get('chunks')} chunks)")
+    print(f"{'component':<14} " + " ".join(f"{m:>16}" for m in COMPARED))
+    for name, row in current["results"].items():
+        old = base["results"].get(name)
+        if not old or "error" in old or "error" in row:
+            continue
+        cells = []
+        for metric in COMPARED:
+            a, b = old.get(metric), row.get(metric)
+            cells.append(f"{(b - a) / a:>+16.1%}" if a else f"{'-':>16}")
+        print(f"{name:<14} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=10000, help="corpus size in chunks")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--batch-rows", type=int, default=5000, help="chunks per add() call")
+    parser.add_argument("--words-per-chunk", type=int, default=120)
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--compression", default="none")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--answer-queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--docs", type=int, default=20, help="documents for load_document / chunk_text")
+    parser.add_argument("--doc-kb", type=int, default=200)
+    parser.add_argument("--embed-texts", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", default=list(COMPONENTS), choices=COMPONENTS)
+    parser.add_argument("--json", help="results file (default: benchmarks/results/suite_<commit>_<chunks>.json)")
+    parser.add_argument("--compare", help="previous results file to diff against")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    corpus = Corpus(args.dim, words_per_chunk=args.words_per_chunk, seed=args.seed)
+    commit = git_commit()
+    results = {}
+
+    print(f"{args.chunks} chunks, dim {args.dim}, {args.index_type}/{args.compression}, commit {commit}")
+    print(f"{'component':<14} {'throughput':>12} {'':<12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'peak MB':>9} {'+MB':>9}")
+    tmp = tempfile.mkdtemp(prefix="bench_suite_")
+    try:
+        if {"load_document", "chunk_text", "embed_texts"} & set(args.only):
+            bench_ingest_side(corpus, args, tmp, results)
+        if set(COMPONENTS[3:]) & set(args.only):
+            bench_store(corpus, args, tmp, results)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report_data = {
+        "meta": {"commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "platform": platform.platform(), "cpus": os.cpu_count(), **vars(args)},
+        "results": results,
+    }
+    path = args.json or os.path.join(ROOT, "benchmarks", "results", f"suite_{commit or 'nogit'}_{args.chunks}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report_data, f, indent=2)
+    print(f"\nresults: {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report_data)
+
+
+if __name__ == "__main__":
+    main()
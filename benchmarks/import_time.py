@@ -0,0 +1,74 @@
+"""
+Import-time report: what it costs to start the server process.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+prints the total plus the slowest imports by cumulative time. With
+--warm-up it then also times lazy.warm_up() (embedding model, tokenizer,
+LLM clients), i.e. what the first request would pay without it.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module rag_pipeline --top 30 --warm-up
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WARM_UP = "import json, lazy; print(json.dumps(lazy.warm_up()))"
+
+
+def import_times(module):
+    """
+    [(package, self_us, cumulative_us)] as reported by -X importtime.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # one space after the bar, then two more per nesting level
+        rows.append((name.rstrip()[1:], int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--warm-up", action="store_true", help="also time lazy.warm_up() after the import")
+    args = parser.parse_args()
+
+    rows = import_times(args.module)
+    # top-level imports (no leading indentation) add up to the total
+    total = sum(cum for name, _, cum in rows if not name.startswith(" "))
+    print(f"import {args.module}: {total / 1e6:.3f} s")
+    print()
+    print(f"{'cumulative s':>12} {'self s':>8}  package")
+    for name, self_us, cum_us in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"{cum_us / 1e6:>12.3f} {self_us / 1e6:>8.3f}  {name.strip()}")
+
+    if args.warm_up:
+        proc = subprocess.run([sys.executable, "-c", f"import {args.module}; {WARM_UP}"],
+                              cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise SystemExit(proc.stderr.strip().splitlines()[-1])
+        status = json.loads(proc.stdout.strip().splitlines()[-1])
+        print()
+        print("warm-up (lazy loads):")
+        for name, seconds in sorted(status["load_times"].items(), key=lambda kv: -kv[1]):
+            print(f"{seconds:>12.3f}  {name}")
+        for name, error in status["errors"].items():
+            print(f"{'failed':>12}  {name}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import math
+import pickle
+from array import array
+
+import numpy as np
+
+
+def tokenize(text: str):
+    """
+    Same whitespace tokenization the hybrid search has always used.
+    """
+    return text.split()
+
+
+def term_counts(tokens):
+    counts = {}
+    for tok in tokens:
+        counts[tok] = counts.get(tok, 0) + 1
+    return counts
+
+
+class BM25Index:
+    """
+    Incremental Okapi BM25 inverted index.
+
+    Terms get integer ids, and every term keeps a postings list of
+    (doc id, term frequency) pairs in compact arrays. Adding N documents
+    only touches the postings of their own terms, so ingest is O(N)
+    instead of rebuilding the whole model over the corpus.
+
+    The postings arrays are the rows of a term-major CSR matrix: scoring
+    a query slices the rows of its terms and never looks at documents
+    that contain none of them.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+
+        self.vocab = {}        # term -> term id
+        self.postings = []     # term id -> array of doc ids
+        self.freqs = []        # term id -> array of term frequencies
+        self.doc_lens = array("I")
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_lens)
+
+    @property
+    def avgdl(self):
+        return self.total_len / len(self.doc_lens) if self.doc_lens else 0.0
+
+    def add(self, token_lists):
+        """
+        Append documents (already tokenized) to the index.
+        Doc ids continue from the current document count.
+        """
+        self.add_counts(term_counts(tokens) for tokens in token_lists)
+
+    def add_counts(self, counts_list):
+        """
+        Append documents given as {term: frequency} dicts, e.g. replayed
+        from a persisted segment without tokenizing the text again.
+        """
+        for counts in counts_list:
+            doc_id = len(self.doc_lens)
+
+            for tok, tf in counts.items():
+                term_id = self.vocab.get(tok)
+                if term_id is None:
+                    term_id = len(self.postings)
+                    self.vocab[tok] = term_id
+                    self.postings.append(array("I"))
+                    self.freqs.append(array("I"))
+                self.postings[term_id].append(doc_id)
+                self.freqs[term_id].append(tf)
+
+            doc_len = sum(counts.values())
+            self.doc_lens.append(doc_len)
+            self.total_len += doc_len
+
+    def idf(self, df: int, n=None) -> float:
+        # non-negative BM25 idf, so very common terms never subtract score
+        n = len(self.doc_lens) if n is None else n
+        return math.log((n - df + 0.5) / (df + 0.5) + 1.0)
+
+    def term_stats(self, terms) -> dict:
+        """
+        Corpus statistics the scores of `terms` depend on:
+        {"n", "total_len", "df": {term: document frequency}}.
+        """
+        df = {}
+        for tok in set(terms):
+            term_id = self.vocab.get(tok)
+            if term_id is not None:
+                df[tok] = len(self.postings[term_id])
+        return {"n": len(self.doc_lens), "total_len": self.total_len, "df": df}
+
+    @staticmethod
+    def merge_stats(stats_list) -> dict:
+        """
+        term_stats of several indexes summed: scoring each of them with the
+        result ranks like one index over all their documents.
+        """
+        merged = {"n": 0, "total_len": 0, "df": {}}
+        for stats in stats_list:
+            merged["n"] += stats["n"]
+            merged["total_len"] += stats["total_len"]
+            for tok, df in stats["df"].items():
+                merged["df"][tok] = merged["df"].get(tok, 0) + df
+        return merged
+
+    def get_scores(self, query_tokens):
+        """
+        BM25 score of every document for the query (0 where no term matches).
+        Only the postings of the query terms are visited.
+        """
+        scores = np.zeros(len(self.doc_lens), dtype="float32")
+        docs, contrib = self._query_rows(query_tokens)
+        np.add.at(scores, docs, contrib)
+        return scores
+
+    @staticmethod
+    def _runs(doc_ids):
+        """
+        (starts, ends) of the runs of consecutive ids in sorted `doc_ids`
+        (a document's chunks are mostly contiguous rows).
+        """
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        breaks = np.flatnonzero(np.diff(doc_ids) != 1) + 1
+        starts = doc_ids[np.concatenate([[0], breaks])]
+        ends = doc_ids[np.concatenate([breaks - 1, [len(doc_ids) - 1]])] + 1
+        return starts, ends
+
+    def _query_rows(self, query_tokens, only=None, stats=None):
+        """
+        Doc ids and BM25 contributions from the postings rows of the query terms.
+        With `only` (sorted doc ids), just the slices of each postings row that
+        fall into those ids are read; idf stays corpus-wide. `stats` (see
+        term_stats) replaces this index's own corpus statistics.
+        """
+        n = stats["n"] if stats else len(self.doc_lens)
+        avgdl = stats["total_len"] / n if stats and n else self.avgdl
+        runs = self._runs(only) if only is not None and len(only) else None
+        doc_parts, tf_parts, idf_parts = [], [], []
+        for tok in set(query_tokens):
+            term_id = self.vocab.get(tok)
+            if term_id is None:
+                continue
+            docs = np.frombuffer(self.postings[term_id], dtype=np.uint32)
+            tfs = np.frombuffer(self.freqs[term_id], dtype=np.uint32)
+            idf = self.idf(stats["df"].get(tok, len(docs)) if stats else len(docs), n)
+            if runs is not None:
+                # postings are sorted by doc id: binary search each run
+                lo = np.searchsorted(docs, runs[0])
+                hi = np.searchsorted(docs, runs[1])
+                hit = hi > lo
+                if not hit.any():
+                    continue
+                docs = np.concatenate([docs[a:b] for a, b in zip(lo[hit], hi[hit])])
+                tfs = np.concatenate([tfs[a:b] for a, b in zip(lo[hit], hi[hit])])
+            doc_parts.append(docs)
+            tf_parts.append(tfs)
+            idf_parts.append(np.full(len(docs), idf, dtype="float32"))
+
+        if not doc_parts:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype="float32")
+
+        docs = np.concatenate(doc_parts)
+        tf = np.concatenate(tf_parts).astype("float32")
+        idf = np.concatenate(idf_parts)
+
+        doc_lens = np.frombuffer(self.doc_lens, dtype=np.uint32)[docs]
+        norm = self.k1 * (1 - self.b + self.b * doc_lens / avgdl)
+        return docs, idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def top_k(self, query_tokens, k=10, exclude=None, only=None, stats=None):
+        """
+        Best `k` documents for the query as (doc_ids, scores), best first.
+        Only documents sharing a term with the query are scored, and the
+        top-k is selected with argpartition instead of a full sort.
+        Doc ids in `exclude` (e.g. deleted rows) never match; when `only`
+        (sorted doc ids) is given, nothing else does. `stats` are corpus-wide
+        statistics when this index is one shard of a larger corpus.
+        """
+        if not self.doc_lens or k <= 0 or (only is not None and not len(only)):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype="float32")
+
+        docs, contrib = self._query_rows(query_tokens, only, stats)
+        if not len(docs):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype="float32")
+
+        if exclude is not None and len(exclude):
+            alive = ~np.isin(docs, exclude)
+            docs, contrib = docs[alive], contrib[alive]
+            if not len(docs):
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype="float32")
+
+        cand, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=contrib).astype("float32")
+
+        if len(cand) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+        else:
+            part = np.arange(len(cand))
+        order = part[np.argsort(-scores[part], kind="stable")]
+        return cand[order].astype(np.int64), scores[order]
+
+    def compacted(self, keep):
+        """
+        New index holding only the documents where the boolean mask `keep`
+        is set, renumbered in order (doc i -> number of kept docs before it).
+        """
+        keep = np.asarray(keep, dtype=bool)
+        new_ids = (np.cumsum(keep) - 1).astype(np.uint32)
+
+        index = BM25Index(k1=self.k1, b=self.b)
+        index.vocab = dict(self.vocab)
+        for docs, freqs in zip(self.postings, self.freqs):
+            docs = np.frombuffer(docs, dtype=np.uint32)
+            mask = keep[docs]
+            index.postings.append(array("I", new_ids[docs[mask]].tobytes()))
+            index.freqs.append(array("I", np.frombuffer(freqs, dtype=np.uint32)[mask].tobytes()))
+
+        doc_lens = np.frombuffer(self.doc_lens, dtype=np.uint32)[keep]
+        index.doc_lens = array("I", doc_lens.tobytes())
+        index.total_len = int(doc_lens.sum())
+        return index
+
+    def to_bytes(self) -> bytes:
+        return pickle.dumps({
+            "k1": self.k1,
+            "b": self.b,
+            "vocab": self.vocab,
+            "postings": self.postings,
+            "freqs": self.freqs,
+            "doc_lens": self.doc_lens,
+            "total_len": self.total_len,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        state = pickle.loads(data)
+        index = cls(k1=state["k1"], b=state["b"])
+        index.vocab = state["vocab"]
+        index.postings = state["postings"]
+        index.freqs = state["freqs"]
+        index.doc_lens = state["doc_lens"]
+        index.total_len = state["total_len"]
+        return index
@@ -0,0 +1,279 @@
+import bisect
+import json
+import mmap
+import os
+import zlib
+
+import numpy as np
+
+from fsutil import write_file
+
+
+# columns with a dedicated layout; any other metadata key goes to the "extra" JSON column
+CORE_FIELDS = ("chunk_id", "source", "text")
+
+
+def _write_blob(path: str, name: str, items):
+    """
+    One variable-length column: `<name>.bin` holds the records back to back,
+    `<name>_off.npy` holds n + 1 offsets into it.
+    """
+    offsets = np.zeros(len(items) + 1, dtype=np.uint64)
+    if items:
+        np.cumsum([len(it) for it in items], out=offsets[1:])
+
+    def write(f):
+        for it in items:
+            f.write(it)
+
+    write_file(os.path.join(path, f"{name}.bin"), write)
+    write_file(os.path.join(path, f"{name}_off.npy"), lambda f: np.save(f, offsets))
+
+
+def _write_sources(path: str, sources, source_ids):
+    data = json.dumps(sources).encode("utf-8")
+    write_file(os.path.join(path, "sources.json"), lambda f: f.write(data))
+    write_file(os.path.join(path, "source.npy"), lambda f: np.save(f, np.asarray(source_ids, dtype=np.uint32)))
+
+
+def write_chunk_store(path: str, metadatas):
+    """
+    Write chunk metadata dicts as a columnar store into directory `path`:
+    zlib-compressed text per chunk, raw chunk ids, interned source names
+    and a JSON column for any remaining keys.
+    """
+    sources, source_index, source_ids = [], {}, []
+    texts, ids, extras = [], [], []
+
+    for md in metadatas:
+        texts.append(zlib.compress(md["text"].encode("utf-8")))
+        ids.append(md["chunk_id"].encode("utf-8"))
+
+        src = md["source"]
+        if src not in source_index:
+            source_index[src] = len(sources)
+            sources.append(src)
+        source_ids.append(source_index[src])
+
+        extra = {k: v for k, v in md.items() if k not in CORE_FIELDS}
+        extras.append(json.dumps(extra).encode("utf-8") if extra else b"")
+
+    _write_blob(path, "text", texts)
+    _write_blob(path, "ids", ids)
+    _write_blob(path, "extra", extras)
+    _write_sources(path, sources, source_ids)
+
+
+def merge_chunk_stores(path: str, stores, keeps=None):
+    """
+    Concatenate existing chunk stores into a new one at `path`.
+    Compressed records are copied byte for byte, only offsets and
+    source ids are rewritten. `keeps` optionally gives a boolean row
+    mask per store (None = keep every row); dropped rows are left out.
+    """
+    keeps = keeps or [None] * len(stores)
+
+    for name in ("text", "ids", "extra"):
+        offsets = [np.zeros(1, dtype=np.uint64)]
+        shift = 0
+
+        def write(f):
+            nonlocal shift
+            for store, keep in zip(stores, keeps):
+                blob = store.blobs[name]
+                if keep is None:
+                    for start in range(0, blob.size, 1 << 24):
+                        f.write(blob.data[start:min(start + (1 << 24), blob.size)])
+                    offsets.append(blob.offsets[1:] + np.uint64(shift))
+                    shift += blob.size
+                else:
+                    lens = np.diff(blob.offsets)[keep]
+                    for i in np.flatnonzero(keep):
+                        f.write(blob[i])
+                    offsets.append(np.cumsum(lens, dtype=np.uint64) + np.uint64(shift))
+                    shift += int(lens.sum())
+
+        write_file(os.path.join(path, f"{name}.bin"), write)
+        merged = np.concatenate(offsets)
+        write_file(os.path.join(path, f"{name}_off.npy"), lambda f: np.save(f, merged))
+
+    sources, source_index, source_ids = [], {}, []
+    for store, keep in zip(stores, keeps):
+        ids = np.asarray(store.source_ids)
+        if keep is not None:
+            ids = ids[keep]
+        # only sources that still have rows are carried over
+        remap = np.zeros(len(store.sources), dtype=np.uint32)
+        for sid in np.unique(ids):
+            src = store.sources[sid]
+            if src not in source_index:
+                source_index[src] = len(sources)
+                sources.append(src)
+            remap[sid] = source_index[src]
+        source_ids.append(remap[ids])
+    _write_sources(path, sources, np.concatenate(source_ids) if source_ids else [])
+
+
+class _Blob:
+    def __init__(self, path: str, name: str):
+        self.offsets = np.load(os.path.join(path, f"{name}_off.npy"), mmap_mode="r")
+        self.size = int(self.offsets[-1])
+
+        self.data = b""
+        if self.size:
+            with open(os.path.join(path, f"{name}.bin"), "rb") as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.data[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped view of one columnar chunk store.
+    Only the rows that are actually accessed get paged in and decompressed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.blobs = {name: _Blob(path, name) for name in ("text", "ids", "extra")}
+        with open(os.path.join(path, "sources.json"), "r", encoding="utf-8") as f:
+            self.sources = json.load(f)
+        self.source_ids = np.load(os.path.join(path, "source.npy"), mmap_mode="r")
+        # full-precision embeddings (vectors.npy of a base/segment, None for a
+        # bare chunk store), mapped now rather than on first use: compaction
+        # deletes the files of the parts it merged, an open mapping stays readable
+        vectors_path = os.path.join(path, "vectors.npy")
+        self.vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+
+    def __len__(self):
+        return len(self.source_ids)
+
+    def source(self, i: int) -> str:
+        return self.sources[self.source_ids[i]]
+
+    def rows_of(self, source: str):
+        """
+        Row numbers of the chunks of `source` (empty if it has none here).
+        """
+        if source not in self.sources:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.source_ids == self.sources.index(source))
+
+    def rows_of_sources(self, sources):
+        """
+        Row numbers of the chunks of any of `sources` (a set).
+        """
+        wanted = np.array([src in sources for src in self.sources], dtype=bool)
+        if not wanted.any():
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(wanted[self.source_ids])
+
+    def __getitem__(self, i: int) -> dict:
+        md = {
+            "chunk_id": self.blobs["ids"][i].decode("utf-8"),
+            "source": self.source(i),
+            "text": zlib.decompress(self.blobs["text"][i]).decode("utf-8"),
+        }
+        extra = self.blobs["extra"][i]
+        if extra:
+            md.update(json.loads(extra))
+        return md
+
+
+class ChunkTable:
+    """
+    Row-addressable concatenation of chunk stores (base + segments), in
+    the same order as the rows of the FAISS index.
+
+    The (parts, starts, length) view is replaced as a whole on every
+    change, so readers never see a half-updated table.
+    """
+
+    def __init__(self, parts=()):
+        self._view = self._build(list(parts))
+
+    @staticmethod
+    def _build(parts):
+        starts, total = [], 0
+        for part in parts:
+            starts.append(total)
+            total += len(part)
+        return parts, starts, total
+
+    @property
+    def parts(self):
+        return list(self._view[0])
+
+    def append(self, part: ChunkStore):
+        self._view = self._build(self._view[0] + [part])
+
+    def replace_prefix(self, n_parts: int, part: ChunkStore):
+        """
+        Swap the first `n_parts` stores for one compacted store holding the same rows.
+        """
+        self._view = self._build([part] + self._view[0][n_parts:])
+
+    def _locate(self, i: int):
+        parts, starts, total = self._view
+        if i < 0:
+            i += total
+        if not 0 <= i < total:
+            raise IndexError(i)
+        p = bisect.bisect_right(starts, i) - 1
+        return parts[p], i - starts[p]
+
+    def __len__(self):
+        return self._view[2]
+
+    def spans(self):
+        """
+        (part, first row) of every store, in row order.
+        """
+        parts, starts, _ = self._view
+        return list(zip(parts, starts))
+
+    def rows_of(self, source: str):
+        """
+        Table row numbers of the chunks of `source`.
+        """
+        rows = [part.rows_of(source) + start for part, start in self.spans()]
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+    def rows_of_sources(self, sources):
+        """
+        Sorted table row numbers of the chunks of any of `sources`.
+        """
+        sources = set(sources)
+        rows = [part.rows_of_sources(sources) + start for part, start in self.spans()]
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+    def vectors(self, rows):
+        """
+        Full-precision embeddings of table `rows` (float32, one per row),
+        read from the memory-mapped vector files of the parts.
+        """
+        parts, starts, _ = self._view
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return np.empty((0, parts[0].vectors.shape[1] if parts else 0), dtype=np.float32)
+
+        which = np.searchsorted(starts, rows, side="right") - 1
+        out = np.empty((len(rows), parts[0].vectors.shape[1]), dtype=np.float32)
+        for p in np.unique(which):
+            mask = which == p
+            out[mask] = parts[p].vectors[rows[mask] - starts[p]]
+        return out
+
+    def __getitem__(self, i: int) -> dict:
+        part, row = self._locate(int(i))
+        return part[row]
+
+    def source(self, i: int) -> str:
+        part, row = self._locate(int(i))
+        return part.source(row)
+
+    def __iter__(self):
+        for part in self._view[0]:
+            for row in range(len(part)):
+                yield part[row]
@@ -1,21 +1,169 @@
-import tiktoken
+import itertools
 
+import numpy as np
 
-def chunk_text(text: str, chunk_size=500, overlap=80):
+from lazy import Lazy
+
+# characters that end a sentence when a token ends with them (trailing blanks ignored)
+SENTENCE_ENDS = (b".", b"!", b"?", b"\n")
+
+
+def _load_tokenizer():
     """
-    Token based chunking = best for accuracy because models work on tokens.
+    The cl100k_base encoding plus, per token id, its length in UTF-8 bytes
+    and whether it ends a sentence. The tables let chunk offsets be
+    computed with numpy instead of decoding tokens.
     """
+    import tiktoken
     encoding = tiktoken.get_encoding("cl100k_base")
-    tokens = encoding.encode(text)
 
-    chunks = []
+    byte_lens = np.zeros(encoding.n_vocab, dtype=np.int64)
+    sentence_end = np.zeros(encoding.n_vocab, dtype=bool)
+    for token in range(encoding.n_vocab):
+        try:
+            data = encoding.decode_single_token_bytes(token)
+        except KeyError:
+            # unused ids between the mergeable ranks and the special tokens
+            continue
+        byte_lens[token] = len(data)
+        sentence_end[token] = data.rstrip(b" \t").endswith(SENTENCE_ENDS)
+    return encoding, byte_lens, sentence_end
+
+
+# loaded once per process, on the first chunking call
+tokenizer = Lazy("tokenizer", _load_tokenizer)
+
+
+def _char_ends(text: str, tokens):
+    """
+    Offset in `text` of the character where each token ends.
+    """
+    _, byte_lens, _ = tokenizer.get()
+    byte_ends = np.cumsum(byte_lens[tokens])
+    data = text.encode("utf-8")
+    if len(data) == len(text):
+        # ASCII: bytes == characters
+        return byte_ends
+    # characters starting in the first k bytes (a token ending inside a
+    # multi-byte character keeps that character)
+    starts = (np.frombuffer(data, dtype=np.uint8) & 0xC0) != 0x80
+    chars_before = np.concatenate([[0], np.cumsum(starts)])
+    return chars_before[byte_ends]
+
+
+def _windows(tokens, chunk_size, overlap, sentence_aware, final):
+    """
+    (start, end) token windows over `tokens` and the position the next
+    window starts at. Unless `final`, stops at the first window that could
+    still grow with more text.
+
+    Without sentence_aware this is the classic slicing: a window at every
+    `chunk_size - overlap` tokens. With it, a full window is cut back to
+    the last sentence end in its second half, and the next one starts
+    `overlap` tokens before that cut.
+    """
+    _, _, sentence_end = tokenizer.get()
+    step = chunk_size - overlap
+    min_len = max(chunk_size // 2, overlap + 1)
+    n = len(tokens)
+
+    bounds = []
     start = 0
-    while start < len(tokens):
+    while start < n:
         end = start + chunk_size
-        chunk_tokens = tokens[start:end]
-        chunk_text = encoding.decode(chunk_tokens)
-        chunks.append(chunk_text)
+        # a sentence-aware cut at the buffer end could move once more text arrives
+        if not final and (end > n or (end == n and sentence_aware)):
+            break
+        if end > n:
+            bounds.append((start, n))
+            start += step
+            continue
+
+        if sentence_aware and end < n:
+            cuts = np.flatnonzero(sentence_end[tokens[start + min_len:end]])
+            if len(cuts):
+                end = start + min_len + int(cuts[-1]) + 1
+                bounds.append((start, end))
+                start = end - overlap
+                continue
+
+        bounds.append((start, end))
+        start += step
+    return bounds, start
 
-        start += (chunk_size - overlap)
 
-    return chunks
+def _chunk(text, text_start, tokens, char_ends, bounds, token_offset):
+    # `text` begins at document char `text_start`, which is where tokens[0] begins
+    for s, e in bounds:
+        c0 = int(char_ends[s - 1]) if s else text_start
+        c1 = int(char_ends[e - 1])
+        yield {
+            "text": text[c0 - text_start:c1 - text_start],
+            "start_token": token_offset + s,
+            "end_token": token_offset + e,
+            "start_char": c0,
+            "end_char": c1,
+        }
+
+
+def chunk_text(text: str, chunk_size=500, overlap=80, sentence_aware=False):
+    """
+    Token based chunking = best for accuracy because models work on tokens.
+
+    Returns one dict per chunk: "text", plus "start_token"/"end_token" and
+    "start_char"/"end_char" offsets into the document (end exclusive).
+    Chunk text is sliced from `text`, not decoded back from tokens.
+    """
+    return list(chunk_pages([text], chunk_size, overlap, sentence_aware))
+
+
+def chunk_pages(pages, chunk_size=500, overlap=80, sentence_aware=False):
+    """
+    Streaming chunk_text over an iterable of text pieces (e.g. pages).
+    Windows span page boundaries, and only the tokens of the current
+    window plus one page are held at a time. Offsets are relative to the
+    concatenation of all pages.
+    """
+    encoding, _, _ = tokenizer.get()
+    tokens = np.empty(0, dtype=np.int64)
+    char_ends = np.empty(0, dtype=np.int64)
+    text, text_start, token_offset = "", 0, 0
+
+    # a trailing None flushes the last windows
+    for page in itertools.chain(pages, [None]):
+        final = page is None
+        if page:
+            page_tokens = np.asarray(encoding.encode_ordinary(page), dtype=np.int64)
+            page_ends = text_start + len(text) + _char_ends(page, page_tokens)
+            tokens = np.concatenate([tokens, page_tokens])
+            char_ends = np.concatenate([char_ends, page_ends])
+            text += page
+
+        bounds, next_start = _windows(tokens, chunk_size, overlap, sentence_aware, final)
+        yield from _chunk(text, text_start, tokens, char_ends, bounds, token_offset)
+
+        # drop what no later window can reach
+        next_start = min(next_start, len(tokens))
+        if next_start:
+            new_start = int(char_ends[next_start - 1])
+            text = text[new_start - text_start:]
+            text_start = new_start
+            tokens, char_ends = tokens[next_start:], char_ends[next_start:]
+            token_offset += next_start
+
+
+def chunk_texts(texts, chunk_size=500, overlap=80, sentence_aware=False, num_threads=8):
+    """
+    chunk_text for many documents at once: all texts are tokenized by
+    tiktoken's batch encoder on `num_threads` threads. One list of chunks
+    per text, in order.
+    """
+    encoding, _, _ = tokenizer.get()
+    token_lists = encoding.encode_ordinary_batch(list(texts), num_threads=num_threads)
+
+    results = []
+    for text, tokens in zip(texts, token_lists):
+        tokens = np.asarray(tokens, dtype=np.int64)
+        bounds, _ = _windows(tokens, chunk_size, overlap, sentence_aware, final=True)
+        results.append(list(_chunk(text, 0, tokens, _char_ends(text, tokens), bounds, 0)))
+    return results
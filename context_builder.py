@@ -0,0 +1,110 @@
+import os
+import threading
+
+from chunker import tokenizer
+
+# prompt budget for retrieved text, in cl100k_base tokens (source headers included)
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+
+# a span cut to fit the budget must keep at least this many tokens to be worth sending
+MIN_SPAN_TOKENS = 32
+
+# running totals over every context built in this process
+_totals_lock = threading.Lock()
+totals = {"contexts": 0, "chunks": 0, "tokens": 0, "tokens_saved": 0, "tokens_dropped": 0}
+
+
+def _header(source: str) -> str:
+    return f"[Source: {source}] "
+
+
+def _spans(retrieved):
+    """
+    Hits merged into spans of text. Hits of the same source whose
+    [start_char, end_char) ranges overlap or touch become one span (the
+    overlap is kept once); hits without usable offsets stay on their own,
+    exact duplicates dropped. A span ranks as its best hit.
+    """
+    spans, seen = [], set()
+    by_source = {}
+    for rank, hit in enumerate(retrieved):
+        start, end = hit.get("start_char"), hit.get("end_char")
+        if start is None or end is None or end - start != len(hit["text"]):
+            key = (hit["source"], hit["text"])
+            if key not in seen:
+                seen.add(key)
+                spans.append({"source": hit["source"], "text": hit["text"], "rank": rank, "chunks": 1})
+            continue
+        by_source.setdefault(hit["source"], []).append((start, end, rank, hit["text"]))
+
+    for source, hits in by_source.items():
+        hits.sort()
+        current = None
+        for start, end, rank, text in hits:
+            if current is not None and start <= current["end"]:
+                if end > current["end"]:
+                    current["text"] += text[current["end"] - start:]
+                    current["end"] = end
+                current["rank"] = min(current["rank"], rank)
+                current["chunks"] += 1
+                continue
+            current = {"source": source, "text": text, "start": start, "end": end, "rank": rank, "chunks": 1}
+            spans.append(current)
+
+    return sorted(spans, key=lambda s: s["rank"])
+
+
+def build_context(retrieved, max_tokens=None):
+    """
+    Prompt context for retrieved hits (best first) as (text, stats).
+
+    Overlapping/adjacent chunks of a source are merged so shared text is
+    sent once, then spans are added in rank order while they fit in
+    `max_tokens`; the first span that doesn't fit is cut at a token
+    boundary if enough of it fits, smaller later spans may still go in.
+
+    stats: chunks / spans used, tokens sent, tokens_saved by merging
+    compared to concatenating every retrieved chunk as it is, and
+    tokens_dropped to stay within the budget.
+    """
+    max_tokens = CONTEXT_MAX_TOKENS if max_tokens is None else max_tokens
+    encoding, _, _ = tokenizer.get()
+
+    naive = sum(len(encoding.encode_ordinary(_header(r["source"]) + r["text"])) for r in retrieved)
+    naive += max(0, len(retrieved) - 1)  # "\n\n" separators
+
+    spans = [(span, encoding.encode_ordinary(_header(span["source"]) + span["text"]))
+             for span in _spans(retrieved)]
+    merged = sum(len(tokens) for _, tokens in spans) + max(0, len(spans) - 1)
+
+    parts, used, chunks, truncated = [], 0, 0, 0
+    for span, tokens in spans:
+        sep = 1 if parts else 0
+        header = _header(span["source"])
+        room = max_tokens - used - sep
+        if len(tokens) <= room:
+            parts.append(header + span["text"])
+        elif room >= MIN_SPAN_TOKENS + len(encoding.encode_ordinary(header)):
+            tokens = tokens[:room]
+            parts.append(encoding.decode(tokens))
+            truncated += 1
+        else:
+            continue
+        used += len(tokens) + sep
+        chunks += span["chunks"]
+
+    stats = {"chunks": chunks, "spans": len(parts), "truncated": truncated,
+             "tokens": used, "tokens_saved": max(0, naive - merged), "tokens_dropped": max(0, merged - used)}
+    with _totals_lock:
+        totals["contexts"] += 1
+        totals["chunks"] += chunks
+        totals["tokens"] += used
+        totals["tokens_saved"] += stats["tokens_saved"]
+        totals["tokens_dropped"] += stats["tokens_dropped"]
+    return "\n\n".join(parts), stats
+
+
+def context_stats() -> dict:
+    with _totals_lock:
+        return {**totals, "max_tokens": CONTEXT_MAX_TOKENS,
+                "avg_tokens_saved": totals["tokens_saved"] / totals["contexts"] if totals["contexts"] else 0.0}
@@ -1,12 +1,12 @@
 import os
-import fitz  # PyMuPDF
-from docx import Document
-from pptx import Presentation
-from PIL import Image
-import pytesseract
 
-# ✅ Unstructured fallback
-from unstructured.partition.auto import partition
+# parser libraries (PyMuPDF, python-docx, python-pptx, PIL/pytesseract and
+# above all unstructured) are imported by the loader that needs them, so
+# importing this module stays cheap
+
+
+# text files are streamed in blocks of about this many characters
+TXT_BLOCK_CHARS = 1 << 20
 
 
 def load_txt(file_path: str) -> str:
@@ -14,36 +14,61 @@ def load_txt(file_path: str) -> str:
         return f.read()
 
 
+def iter_txt(file_path: str):
+    # whole lines, about TXT_BLOCK_CHARS at a time
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        block, size = [], 0
+        for line in f:
+            block.append(line)
+            size += len(line)
+            if size >= TXT_BLOCK_CHARS:
+                yield "".join(block)
+                block, size = [], 0
+        if block:
+            yield "".join(block)
+
+
+def iter_pdf(file_path: str):
+    import fitz  # PyMuPDF
+    with fitz.open(file_path) as doc:
+        for page in doc:
+            yield page.get_text("text") + "\n"
+
+
 def load_pdf(file_path: str) -> str:
-    text = ""
-    doc = fitz.open(file_path)
-    for page in doc:
-        text += page.get_text("text") + "\n"
-    return text.strip()
+    return "".join(iter_pdf(file_path)).strip()
 
 
 def load_docx(file_path: str) -> str:
+    from docx import Document
     doc = Document(file_path)
     return "\n".join([p.text for p in doc.paragraphs]).strip()
 
 
-def load_pptx(file_path: str) -> str:
+def iter_pptx(file_path: str):
+    # one page per slide
+    from pptx import Presentation
     prs = Presentation(file_path)
-    text_runs = []
     for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                text_runs.append(shape.text)
-    return "\n".join(text_runs).strip()
+        text_runs = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
+        if text_runs:
+            yield "\n".join(text_runs) + "\n"
+
+
+def load_pptx(file_path: str) -> str:
+    return "".join(iter_pptx(file_path)).strip()
 
 
 def load_image_ocr(file_path: str) -> str:
+    import pytesseract
+    from PIL import Image
     img = Image.open(file_path)
     return pytesseract.image_to_string(img)
 
 
 # ✅ Unstructured fallback loader
 def load_with_unstructured(file_path: str) -> str:
+    from unstructured.partition.auto import partition
     elements = partition(filename=file_path)
     text = "\n".join([el.text for el in elements if el.text])
     return text.strip()
@@ -83,3 +108,39 @@ def load_document(file_path: str) -> str:
         except Exception:
             raise ValueError(f"Failed to load document: {file_path}. Error: {str(e)}")
 
+
+def iter_document(file_path: str):
+    """
+    Streaming load_document: yields the text a page (PDF), slide (PPTX) or
+    block of lines (TXT) at a time, so large files never sit in memory as
+    one string. Formats without pages are yielded whole.
+
+    Falls back to unstructured like load_document, as long as nothing has
+    been yielded yet.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    pages = {".txt": iter_txt, ".pdf": iter_pdf, ".pptx": iter_pptx}.get(ext)
+    if pages is None:
+        yield load_document(file_path)
+        return
+
+    started = False
+    error = None
+    try:
+        for page in pages(file_path):
+            if page.strip():
+                started = True
+            if started:
+                yield page
+    except Exception as e:
+        if started:
+            raise ValueError(f"Failed to load document: {file_path}. Error: {str(e)}")
+        error = e
+
+    if not started and (error or ext != ".txt"):
+        # unreadable, or blank (e.g. scanned PDF): fallback
+        try:
+            text = load_with_unstructured(file_path)
+        except Exception as e:
+            raise ValueError(f"Failed to load document: {file_path}. Error: {str(error or e)}")
+        yield text
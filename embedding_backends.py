@@ -0,0 +1,161 @@
+import os
+import shutil
+import zlib
+
+import numpy as np
+
+# An embedding backend turns a list of texts into an (n, dim) float32 array
+# of L2-normalized vectors: backend.encode(texts). Pick one by name with
+# make_backend(); embeddings.py holds the process-wide instance.
+
+
+class TorchBackend:
+    """
+    The reference backend: PyTorch sentence-transformers. It sorts each
+    call by length and pads per batch already.
+    """
+
+    def __init__(self, model_name: str, batch_size=32, threads=0):
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.batch_size = batch_size
+
+    def encode(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=self.batch_size, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def export_onnx(model_name: str, path: str):
+    """
+    One-off export of `model_name` to `path`: tokenizer.json, model.onnx and
+    its int8 dynamically quantized copy model_int8.onnx. Needs torch and
+    transformers; serving only needs onnxruntime and tokenizers.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    # export into a private directory and rename it into place, so
+    # concurrent workers exporting at once never see half-written files
+    tmp = f"{path}.tmp{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        tokenizer.save_pretrained(tmp)
+        model = AutoModel.from_pretrained(model_name).eval()
+
+        names = ["input_ids", "attention_mask", "token_type_ids"]
+        dummy = tokenizer(["warm up"], return_tensors="pt")
+        axes = {name: {0: "batch", 1: "tokens"} for name in names + ["last_hidden_state"]}
+        with torch.no_grad():
+            torch.onnx.export(model, tuple(dummy[name] for name in names), os.path.join(tmp, "model.onnx"),
+                              input_names=names, output_names=["last_hidden_state"],
+                              dynamic_axes=axes, opset_version=17)
+        quantize_dynamic(os.path.join(tmp, "model.onnx"), os.path.join(tmp, "model_int8.onnx"),
+                         weight_type=QuantType.QInt8)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # another process finished first
+            if not os.path.exists(os.path.join(path, "model_int8.onnx")):
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+class OnnxBackend:
+    """
+    bge-small on ONNX Runtime (CPU) with int8-quantized weights, exported
+    to `path` on first use (see export_onnx).
+
+    Texts are tokenized without padding, sorted by token length and cut
+    into batches of `batch_size`; each batch is padded only to its own
+    longest text, so short chunks never pay for a long one. Embeddings are
+    the normalized [CLS] vectors, as for the sentence-transformers model.
+    """
+
+    def __init__(self, model_name: str, path="data/models/bge-small-onnx", batch_size=32, threads=0,
+                 max_length=512, sort_by_length=True):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(path, "model_int8.onnx")
+        if not os.path.exists(model_path):
+            export_onnx(model_name, path)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_length)
+        self.batch_size = batch_size
+        self.sort_by_length = sort_by_length
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts):
+        encodings = self.tokenizer.encode_batch(list(texts))
+        lengths = np.array([len(e.ids) for e in encodings], dtype=np.int64)
+        order = np.argsort(lengths, kind="stable") if self.sort_by_length else np.arange(len(encodings))
+
+        out = None
+        for i in range(0, len(order), self.batch_size):
+            rows = order[i:i + self.batch_size]
+            ids = np.zeros((len(rows), int(lengths[rows].max())), dtype=np.int64)
+            mask = np.zeros_like(ids)
+            for r, j in enumerate(rows):
+                ids[r, :lengths[j]] = encodings[j].ids
+                mask[r, :lengths[j]] = 1
+
+            feeds = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(ids)
+            cls = self.session.run(None, feeds)[0][:, 0]
+
+            if out is None:
+                out = np.empty((len(encodings), cls.shape[1]), dtype=np.float32)
+            out[rows] = cls / np.linalg.norm(cls, axis=1, keepdims=True)
+
+        return out if out is not None else np.empty((0, 0), dtype=np.float32)
+
+
+class FakeBackend:
+    """
+    Deterministic offline stand-in (EMBED_BACKEND=fake) for benchmarks and
+    local runs: hashed bag-of-words vectors, so texts sharing words are
+    similar. No model download, no runtime beyond numpy.
+    """
+
+    def __init__(self, model_name: str, dim=384, **_):
+        self.dim = dim
+
+    def encode(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for tok in text.lower().split():
+                h = zlib.crc32(tok.encode("utf-8"))
+                out[i, h % self.dim] += 1.0 if h & 0x10000 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+BACKENDS = {
+    "torch": TorchBackend,
+    "onnx": OnnxBackend,
+    "fake": FakeBackend,
+}
+
+
+def make_backend(name: str, model_name: str, **options):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name} (expected one of {', '.join(BACKENDS)})")
+    return BACKENDS[name](model_name, **options)
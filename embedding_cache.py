@@ -0,0 +1,92 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache: text hash -> vector, for one model.
+
+    An in-memory LRU of `max_entries` vectors sits in front of a SQLite
+    table at `path`; rows are keyed by (model, hash), so switching models
+    never returns vectors from another embedding space.
+    """
+
+    def __init__(self, model_name: str, path="data/cache/embeddings.sqlite", max_entries=50000):
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()   # key -> float32 vector, least recently used first
+
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, key BLOB NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, key)) WITHOUT ROWID"
+            )
+            self._db.commit()
+
+    def _remember(self, key: bytes, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys) -> dict:
+        """
+        {key: vector} for the keys that are cached (memory first, then disk).
+        """
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+            if self._db is not None:
+                # stay below SQLite's bound-parameter limit
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(batch))})",
+                        [self.model_name, *batch],
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, vector)
+                        found[key] = vector
+        return found
+
+    def put_many(self, items):
+        """
+        Cache (key, vector) pairs.
+        """
+        items = [(key, np.asarray(vector, dtype=np.float32)) for key, vector in items]
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            if self._db is not None and items:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)",
+                    [(self.model_name, key, vector.tobytes()) for key, vector in items],
+                )
+                self._db.commit()
@@ -1,7 +1,105 @@
-from sentence_transformers import SentenceTransformer
+import os
+
+from embedding_backends import make_backend
+from embedding_cache import EmbeddingCache, text_key
+from lazy import Lazy
+from microbatch import MicroBatcher
+
+MODEL_NAME = "BAAI/bge-small-en-v1.5"
+
+# torch (sentence-transformers), onnx (int8-quantized, CPU only) or fake (offline, hashed words)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+
+
+def _load_model():
+    # backends import their runtime (seconds for torch) on first use only;
+    # EMBED_THREADS is read here, after ingest workers have set it
+    options = {"batch_size": int(os.getenv("EMBED_MODEL_BATCH", "32")),
+               "threads": int(os.getenv("EMBED_THREADS", "0"))}
+    if EMBED_BACKEND == "onnx":
+        options["path"] = os.getenv("EMBED_ONNX_PATH", "data/models/bge-small-onnx")
+    model = make_backend(EMBED_BACKEND, MODEL_NAME, **options)
+    # first encode allocates buffers; pay it here rather than on a request
+    model.encode(["warm up"])
+    return model
+
 
 # good accuracy + manageable speed
-model = SentenceTransformer("BAAI/bge-small-en-v1.5")
+model = Lazy("embedding_model", _load_model)
+
+def _open_cache():
+    # EMBED_CACHE=0 disables the cache
+    if os.getenv("EMBED_CACHE", "1") == "0":
+        return None
+    # quantized vectors differ slightly: cached per backend
+    return EmbeddingCache(
+        MODEL_NAME if EMBED_BACKEND == "torch" else f"{MODEL_NAME}@{EMBED_BACKEND}",
+        path=os.getenv("EMBED_CACHE_PATH", "data/cache/embeddings.sqlite"),
+        max_entries=int(os.getenv("EMBED_CACHE_SIZE", "50000")),
+    )
+
+
+# the SQLite file (and data/cache/) is opened on first embed, not at import
+cache = Lazy("embedding_cache", _open_cache)
+
+
+def _encode(store, texts):
+    # texts found in `store` are not encoded again; new ones are encoded once each
+    if store is None:
+        return model.get().encode(texts).tolist()
+
+    keys = [text_key(t) for t in texts]
+    found = store.get_many(list(dict.fromkeys(keys)))
+
+    todo = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in todo:
+            todo[key] = text
+
+    if todo:
+        vectors = model.get().encode(list(todo.values()))
+        new = dict(zip(todo, vectors))
+        store.put_many(new.items())
+        found.update(new)
+
+    return [found[key].tolist() for key in keys]
+
 
 def embed_texts(texts):
-    return model.encode(texts, normalize_embeddings=True).tolist()
+    """
+    Normalized embeddings of `texts`. Texts seen before (same model, same
+    content) come from the cache; only new texts are encoded, once each.
+    """
+    return _encode(cache.get(), texts)
+
+
+# questions are mostly new text: the query path skips the SQLite cache (a
+# disk lookup and a WAL write per /ask) and only keeps recent questions in
+# memory (QUERY_CACHE_SIZE=0 disables it)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+query_cache = EmbeddingCache(MODEL_NAME, path=None, max_entries=QUERY_CACHE_SIZE) if QUERY_CACHE_SIZE > 0 else None
+
+
+def _encode_queries(texts):
+    return _encode(query_cache, texts)
+
+
+# concurrent queries (e.g. parallel /ask requests) are embedded together:
+# one encode per QUERY_BATCH_WAIT_MS window or QUERY_BATCH_SIZE texts
+# (QUERY_BATCH_WAIT_MS=0 disables it)
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+query_batcher = None
+if QUERY_BATCH_WAIT_MS > 0:
+    query_batcher = MicroBatcher(_encode_queries, max_batch=int(os.getenv("QUERY_BATCH_SIZE", "32")),
+                                 max_wait=QUERY_BATCH_WAIT_MS / 1000, name="query-embedder")
+
+
+def embed_queries(texts):
+    """
+    Embeddings of questions, like embed_texts but without the disk cache:
+    calls from concurrent requests are merged into one batched encode by
+    the query micro-batcher.
+    """
+    if query_batcher is None:
+        return _encode_queries(texts)
+    return query_batcher(texts)
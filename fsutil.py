@@ -0,0 +1,33 @@
+import os
+
+
+def fsync_dir(path: str):
+    # make a rename durable (no-op where directories can't be opened)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_file(path: str, write):
+    with open(path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def atomic_write(path: str, write):
+    """
+    Write a file through `write(f)` into a temp file and rename it over `path`,
+    so readers see either the old or the new content, never a torn one.
+    """
+    tmp_path = path + ".tmp"
+    write_file(tmp_path, write)
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(path) or ".")
@@ -0,0 +1,259 @@
+import hashlib
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+import metrics
+from chunker import chunk_pages
+from document_loader import iter_document
+from embeddings import embed_texts
+
+# cut chunks at sentence ends where possible (CHUNK_SENTENCE_AWARE=1)
+CHUNK_SENTENCE_AWARE = os.getenv("CHUNK_SENTENCE_AWARE", "0") == "1"
+
+# chunks embedded (and written to the store) per ingest batch
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# worker processes of IngestEngine (default: all cores but one)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0")) or max(1, (os.cpu_count() or 2) - 1)
+
+
+def file_hash(file_path: str) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def iter_chunk_batches(file_path: str, source: str, counts: dict, timings=None):
+    """
+    Pages from the loader feed the chunker, chunks are embedded
+    EMBED_BATCH_SIZE at a time: yields (embeddings, metadatas) per batch.
+    `counts` ("pages", "chunks") is kept up to date as batches are consumed,
+    and so are the seconds spent per stage ("load", "chunk", "embed") in
+    `timings`, if given.
+    """
+    timings = {} if timings is None else timings
+    for stage in ("load", "chunk", "embed"):
+        timings.setdefault(stage, 0.0)
+
+    def pages():
+        document = iter_document(file_path)
+        while True:
+            start = time.perf_counter()
+            page = next(document, None)
+            timings["load"] += time.perf_counter() - start
+            if page is None:
+                return
+            counts["pages"] += 1
+            yield page
+
+    chunks = chunk_pages(pages(), chunk_size=500, overlap=80, sentence_aware=CHUNK_SENTENCE_AWARE)
+    while True:
+        # the loader runs inside the chunker: its share is taken out
+        start, loaded = time.perf_counter(), timings["load"]
+        batch = list(itertools.islice(chunks, EMBED_BATCH_SIZE))
+        timings["chunk"] += time.perf_counter() - start - (timings["load"] - loaded)
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        embeddings = embed_texts([ch["text"] for ch in batch])
+        timings["embed"] += time.perf_counter() - start
+        metadatas = [{
+            "chunk_id": f"{source}_{counts['chunks'] + i}",
+            "source": source,
+            "text": ch["text"],
+            # position in the document, e.g. to merge overlapping hits
+            "start_char": ch["start_char"],
+            "end_char": ch["end_char"],
+        } for i, ch in enumerate(batch)]
+
+        counts["chunks"] += len(batch)
+        yield embeddings, metadatas
+
+
+# ---------------- worker processes ---------------- #
+_results = None
+
+
+def _init_worker(results, embed_threads: int):
+    global _results
+    _results = results
+    # every worker embeds: split the cores instead of oversubscribing them
+    # (read by the embedding backend when it loads)
+    os.environ["EMBED_THREADS"] = str(embed_threads)
+
+
+def _ingest_file(job_id: int, file_path: str, source: str):
+    counts, timings = {"pages": 0, "chunks": 0}, {}
+    for embeddings, metadatas in iter_chunk_batches(file_path, source, counts, timings):
+        # blocks while the writer is behind: bounded memory across all workers
+        _results.put(("batch", job_id, counts["pages"], np.asarray(embeddings, dtype="float32"), metadatas))
+    # stage timings travel with the last message: metrics live in the server process
+    _results.put(("end", job_id, counts["pages"], timings))
+
+
+# ---------------- engine ---------------- #
+class IngestEngine:
+    """
+    Parses, chunks and embeds files in a pool of worker processes (so it
+    scales with cores despite the GIL), while one writer thread applies
+    their batches to the VectorStore. The writer coalesces batches of
+    concurrent files into one append of up to `batch_rows` chunks, so the
+    store only ever sees a single writer.
+
+    Documents follow VectorStore.add_document_batches semantics: old
+    chunks are replaced with the first batch, the content hash is recorded
+    after the last.
+    """
+
+    def __init__(self, vectordb, workers=None, batch_rows=512, queue_size=32):
+        self.vectordb = vectordb
+        self.workers = workers or INGEST_WORKERS
+        self.batch_rows = batch_rows
+
+        # spawn: forking a process that already runs torch/server threads is unsafe
+        self._ctx = multiprocessing.get_context("spawn")
+        self._results = self._ctx.Queue(maxsize=queue_size)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._job_ids = itertools.count()
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name="ingest-writer")
+        self._writer.start()
+
+    def _get_pool(self):
+        # worker processes (and their models) are only started on first use
+        with self._lock:
+            if self._pool is None:
+                embed_threads = max(1, (os.cpu_count() or 1) // self.workers)
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=self._ctx, initializer=_init_worker,
+                                                 initargs=(self._results, embed_threads))
+            return self._pool
+
+    def submit(self, file_path: str, progress=None, tags=None) -> Future:
+        """
+        Queue one file. The future resolves to the same dict as build_index
+        once the file is fully written; `progress(pages, chunks)` is called
+        by the writer after each of its batches. `tags` are recorded on the
+        document (see VectorStore.filter_sources).
+        """
+        source = os.path.basename(file_path)
+        content_hash = file_hash(file_path)
+        future = Future()
+        if self.vectordb.document_hash(source) == content_hash:
+            future.set_result({"chunks_added": 0, "source": source, "skipped": True})
+            return future
+
+        job_id = next(self._job_ids)
+        self._jobs[job_id] = {"source": source, "hash": content_hash, "future": future, "progress": progress,
+                              "tags": list(tags or []), "pages": 0, "chunks": 0, "started": False, "error": None,
+                              "trace": metrics.Trace("ingest", slow_log=False), "rows": 0}
+
+        def on_done(task):
+            error = task.exception()
+            if error is not None:
+                # routed through the queue so it lands after the batches already sent
+                self._jobs[job_id]["error"] = error
+                self._results.put(("error", job_id))
+
+        self._get_pool().submit(_ingest_file, job_id, file_path, source).add_done_callback(on_done)
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+    # ---------------- writer ---------------- #
+    def _write_loop(self):
+        while True:
+            items = [self._results.get()]
+            rows = len(items[0][4]) if items[0][0] == "batch" else 0
+            # coalesce whatever else is ready, up to batch_rows chunks
+            while rows < self.batch_rows:
+                try:
+                    item = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+                rows += len(item[4]) if item[0] == "batch" else 0
+
+            try:
+                self._apply(items)
+            except Exception as e:
+                for _, job_id, *_ in items:
+                    job = self._jobs.pop(job_id, None)
+                    if job and not job["future"].done():
+                        job["future"].set_exception(e)
+
+    def _apply(self, items):
+        embeddings, metadatas, replace, documents = [], [], [], {}
+        touched, finished = {}, []
+
+        for kind, job_id, *rest in items:
+            job = self._jobs.get(job_id)
+            if job is None:
+                # failed earlier: drop its late batches
+                continue
+            if kind == "error":
+                finished.append(job_id)
+                continue
+
+            source = job["source"]
+            job["pages"] = rest[0]
+            if not job["started"]:
+                replace.append(source)
+                job["started"] = True
+
+            if kind == "batch":
+                vectors, mds = rest[1], rest[2]
+                job["chunks"] += len(mds)
+                job["rows"] += len(mds)
+                embeddings.append(vectors)
+                metadatas.extend(mds)
+                documents[source] = {"hash": None, "chunks": job["chunks"], "tags": job["tags"]}
+                touched[job_id] = job
+            else:
+                for stage, seconds in rest[1].items():
+                    job["trace"].add(stage, seconds)
+                documents[source] = {"hash": job["hash"], "chunks": job["chunks"], "tags": job["tags"]}
+                finished.append(job_id)
+
+        if replace or documents:
+            vectors = np.concatenate(embeddings) if embeddings else []
+            start = time.perf_counter()
+            self.vectordb.write(vectors, metadatas, replace=replace, documents=documents)
+            self._record_write(time.perf_counter() - start, len(metadatas), items)
+
+        for job in touched.values():
+            if job["progress"]:
+                job["progress"](job["pages"], job["chunks"])
+
+        for job_id in finished:
+            job = self._jobs.pop(job_id)
+            job["trace"].finish()
+            if job["error"] is not None:
+                job["future"].set_exception(job["error"])
+            else:
+                job["future"].set_result({"chunks_added": job["chunks"], "source": job["source"],
+                                          "pages": job["pages"]})
+
+    def _record_write(self, seconds: float, rows: int, items):
+        # one write serves every job of the batch: each is charged its share of the rows
+        jobs = {job_id: self._jobs[job_id] for _, job_id, *_ in items if job_id in self._jobs}
+        for job in jobs.values():
+            share = job["rows"] / rows if rows else 1 / len(jobs)
+            job["trace"].add("index", seconds * share)
+            job["rows"] = 0
+        metrics.INGESTED_CHUNKS.inc(rows)
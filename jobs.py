@@ -0,0 +1,195 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from fsutil import atomic_write
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Bounded queue of ingestion jobs (one job = the files of one upload)
+    run in the background on an IngestEngine.
+
+    Job records carry per-file status, page/chunk counts and timings, and
+    are persisted to `path` so queued or interrupted jobs are resumed
+    after a restart. At most `max_queued` jobs wait at a time; submit()
+    raises QueueFull beyond that. `workers` jobs run concurrently (their
+    files share the engine's worker processes).
+    """
+
+    def __init__(self, engine, path="data/jobs/jobs.json", workers=2, max_queued=100, keep_finished=500):
+        self.engine = engine
+        self.path = path
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._queued = 0
+        self._last_save = 0.0
+
+        self._load()
+        for _ in range(workers):
+            threading.Thread(target=self._run, daemon=True, name="ingest-job").start()
+
+    # ---------------- public ---------------- #
+    def submit(self, files, tags=None) -> dict:
+        """
+        Queue a job for `files` ([(filename, saved path)]) and return its
+        record. `tags` are attached to every document of the job.
+        """
+        with self._lock:
+            if self._queued >= self.max_queued:
+                raise QueueFull(f"{self._queued} jobs already queued")
+
+            job = {
+                "id": uuid.uuid4().hex,
+                "status": "queued",
+                "created": time.time(),
+                "started": None,
+                "finished": None,
+                "tags": list(tags or []),
+                "files": [self._new_file(name, path) for name, path in files],
+            }
+            self._jobs[job["id"]] = job
+            self._queued += 1
+            self._save()
+
+        self._queue.put(job["id"])
+        return self._view(job)
+
+    def full(self) -> bool:
+        with self._lock:
+            return self._queued >= self.max_queued
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._view(job) if job else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {"queued": self._queued, "max_queued": self.max_queued, "jobs": counts}
+
+    # ---------------- running ---------------- #
+    @staticmethod
+    def _new_file(name, path):
+        return {"filename": name, "path": path, "status": "queued", "pages": 0, "chunks": 0,
+                "skipped": False, "started": None, "finished": None, "seconds": None, "error": None}
+
+    @staticmethod
+    def _view(job):
+        # copy without the server-side paths
+        view = {k: v for k, v in job.items() if k != "files"}
+        view["files"] = [{k: v for k, v in f.items() if k != "path"} for f in job["files"]]
+        return view
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs[job_id]
+                self._queued -= 1
+                job["status"] = "running"
+                job["started"] = job["started"] or time.time()
+                self._save()
+
+            # released by each file once its outcome is recorded
+            files = [f for f in job["files"] if f["status"] != "done"]
+            finished = threading.Semaphore(0)
+            for file in files:
+                self._submit_file(file, finished.release, job.get("tags"))
+            for _ in files:
+                finished.acquire()
+
+            with self._lock:
+                ok = sum(f["status"] == "done" for f in job["files"])
+                job["status"] = "completed" if ok or not job["files"] else "failed"
+                job["finished"] = time.time()
+                self._save()
+
+    def _submit_file(self, file, on_finished, tags=None):
+        with self._lock:
+            file["status"] = "running"
+            file["started"] = time.time()
+            file["error"] = None
+
+        def progress(pages, chunks):
+            with self._lock:
+                file["pages"], file["chunks"] = pages, chunks
+                self._save(throttle=True)
+
+        def done(future):
+            with self._lock:
+                file["finished"] = time.time()
+                file["seconds"] = round(file["finished"] - file["started"], 3)
+                error = future.exception()
+                if error is not None:
+                    file["status"], file["error"] = "failed", str(error)
+                else:
+                    result = future.result()
+                    file["status"] = "done"
+                    file["chunks"] = result["chunks_added"]
+                    file["pages"] = result.get("pages", file["pages"])
+                    file["skipped"] = result.get("skipped", False)
+                self._save()
+            on_finished()
+
+        try:
+            future = self.engine.submit(file["path"], progress=progress, tags=tags)
+        except Exception as e:
+            with self._lock:
+                file["status"], file["error"] = "failed", str(e)
+                file["finished"] = time.time()
+                self._save()
+            on_finished()
+            return
+        future.add_done_callback(done)
+
+    # ---------------- persistence ---------------- #
+    def _save(self, throttle=False):
+        # called with self._lock held; progress updates are saved at most once a second
+        now = time.time()
+        if throttle and now - self._last_save < 1.0:
+            return
+        self._last_save = now
+
+        finished = [j for j in self._jobs.values() if j["status"] in ("completed", "failed")]
+        for job in sorted(finished, key=lambda j: j["finished"])[:-self.keep_finished or None]:
+            del self._jobs[job["id"]]
+
+        data = json.dumps(list(self._jobs.values())).encode("utf-8")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        atomic_write(self.path, lambda f: f.write(data))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            jobs = json.load(f)
+
+        resume = []
+        for job in sorted(jobs, key=lambda j: j["created"]):
+            self._jobs[job["id"]] = job
+            if job["status"] in ("queued", "running"):
+                # interrupted by a restart: run the files that didn't finish again
+                job["status"] = "queued"
+                for file in job["files"]:
+                    if file["status"] == "running":
+                        file["status"] = "queued"
+                resume.append(job["id"])
+
+        self._queued = len(resume)
+        for job_id in resume:
+            self._queue.put(job_id)
@@ -0,0 +1,88 @@
+import threading
+import time
+
+# every Lazy created so far, by name
+registry = {}
+
+# name -> seconds its first load took
+load_times = {}
+
+# name -> error of its last failed load (cleared once it loads)
+errors = {}
+
+
+class Lazy:
+    """
+    A heavy object (model, client, tokenizer) built by `factory` on first
+    get() instead of at import time. Thread-safe: concurrent first callers
+    wait for a single load.
+    """
+
+    def __init__(self, name: str, factory):
+        self.name = name
+        self._factory = factory
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        registry[name] = self
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    start = time.perf_counter()
+                    try:
+                        self._value = self._factory()
+                    except Exception as e:
+                        errors[self.name] = f"{type(e).__name__}: {e}"
+                        raise
+                    load_times[self.name] = round(time.perf_counter() - start, 3)
+                    self._loaded = True
+                    errors.pop(self.name, None)
+        return self._value
+
+
+def _selected(names):
+    return [lazy for name, lazy in list(registry.items()) if names is None or name in names]
+
+
+def ready(names=None) -> bool:
+    """
+    Whether the registered objects (all, or just `names`) are loaded now,
+    however they got loaded (warm-up, retry or first use).
+    """
+    return all(lazy.loaded for lazy in _selected(names))
+
+
+def warm_up(names=None, retry=False, max_delay=60.0) -> dict:
+    """
+    Load the registered objects (all, or just `names`) now, e.g. right after
+    the server starts, so the first request doesn't pay for them.
+    A failed load is recorded in `errors` and retried on first use; with
+    `retry`, failed loads are also retried here with exponential backoff
+    (up to `max_delay` seconds apart) until everything is loaded.
+    """
+    delay = 1.0
+    while True:
+        for lazy in _selected(names):
+            try:
+                lazy.get()
+            except Exception:
+                pass
+        if not retry or ready(names):
+            return status()
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def status() -> dict:
+    return {
+        "loaded": sorted(name for name, lazy in registry.items() if lazy.loaded),
+        "pending": sorted(name for name, lazy in registry.items() if not lazy.loaded),
+        "load_times": dict(load_times),
+        "errors": dict(errors),
+    }
@@ -1,34 +1,71 @@
 import os
 from dotenv import load_dotenv
-from google import genai
+
+from lazy import Lazy
+from prompts import build_prompt
 
 load_dotenv()
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+def _make_client():
+    # the google-genai SDK is slow to import: only when Gemini is first used
+    from google import genai
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+# one client per process: its sync and async (client.aio) transports keep
+# pooled connections that every request reuses
+client = Lazy("gemini_client", _make_client)
 
 MODEL_NAME = "gemini-2.5-flash"
 
-def generate_answer(question: str, context: str) -> str:
-    prompt = f"""
-You are a highly accurate document-based assistant.
 
-RULES:
-- Answer ONLY using the provided CONTEXT.
-- Do NOT use outside knowledge.
-- If answer not found, say: Not found in the document.
+def _config(timeout=None):
+    # per-request deadline (seconds), so a call the router gave up on doesn't hold a thread much longer
+    if timeout is None:
+        return None
+    from google.genai import types
+    return types.GenerateContentConfig(http_options=types.HttpOptions(timeout=int(timeout * 1000)))
 
-CONTEXT:
-{context}
 
-QUESTION:
-{question}
+def generate_answer(question: str, context: str, timeout=None) -> str:
+    response = client.get().models.generate_content(
+        model=MODEL_NAME,
+        contents=build_prompt(question, context),
+        config=_config(timeout),
+    )
+
+    return response.text.strip()
 
-Answer:
-"""
 
-    response = client.models.generate_content(
+async def agenerate_answer(question: str, context: str, timeout=None) -> str:
+    response = await client.get().aio.models.generate_content(
         model=MODEL_NAME,
-        contents=prompt
+        contents=build_prompt(question, context),
+        config=_config(timeout),
     )
 
     return response.text.strip()
+
+
+def stream_answer(question: str, context: str, timeout=None):
+    """
+    Yield answer text pieces as Gemini produces them.
+    """
+    for chunk in client.get().models.generate_content_stream(
+        model=MODEL_NAME,
+        contents=build_prompt(question, context),
+        config=_config(timeout),
+    ):
+        if chunk.text:
+            yield chunk.text
+
+
+async def astream_answer(question: str, context: str, timeout=None):
+    async for chunk in await client.get().aio.models.generate_content_stream(
+        model=MODEL_NAME,
+        contents=build_prompt(question, context),
+        config=_config(timeout),
+    ):
+        if chunk.text:
+            yield chunk.text
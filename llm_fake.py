@@ -0,0 +1,89 @@
+import asyncio
+import os
+import random
+import re
+import time
+
+# Offline stand-in for Gemini/Groq (LLM_PROVIDERS=fake): answers are built from
+# the retrieved context, so the whole pipeline runs without API keys or network.
+# The "fake-flaky" provider fails after FLAKY_FAIL_AFTER streamed tokens, e.g.
+# LLM_PROVIDERS=fake-flaky,fake exercises a fallback in the middle of a stream.
+# The "fake-slow" provider stalls SLOW_DELAY seconds before answering on a
+# SLOW_RATE share of its calls, e.g. to exercise the router's deadlines and hedging.
+
+# seconds between streamed tokens
+TOKEN_DELAY = float(os.getenv("FAKE_LLM_TOKEN_DELAY", "0.02"))
+FLAKY_FAIL_AFTER = int(os.getenv("FAKE_LLM_FAIL_AFTER", "5"))
+SLOW_DELAY = float(os.getenv("FAKE_LLM_SLOW_DELAY", "2"))
+SLOW_RATE = float(os.getenv("FAKE_LLM_SLOW_RATE", "1"))
+
+
+def _answer_text(question: str, context: str) -> str:
+    passages = [p.strip() for p in context.split("\n\n") if p.strip()]
+    if not passages:
+        return "Not found in the document."
+
+    lines = [f"Based on the documents, here is what answers: {question}"]
+    for p in passages[:3]:
+        lines.append(f"- {p[:160]}")
+    return "\n".join(lines)
+
+
+def _tokens(text: str):
+    return re.findall(r"\S+\s*", text)
+
+
+def _check_failure(i: int, fail_after: int):
+    if 0 <= fail_after <= i:
+        raise RuntimeError(f"fake provider failed after {i} tokens")
+
+
+def _stall(delay: float) -> float:
+    # seconds this call waits before answering
+    return delay if delay and random.random() < SLOW_RATE else 0.0
+
+
+def _waited(stall: float, timeout) -> float:
+    # like a real client, a stall is cut short by the request timeout
+    return stall if timeout is None else min(stall, timeout)
+
+
+def _check_timeout(stall: float, timeout):
+    if timeout is not None and stall > timeout:
+        raise TimeoutError(f"fake provider timed out after {timeout:g}s")
+
+
+def generate_answer_fake(question: str, context: str, fail_after=-1, delay=0.0, timeout=None) -> str:
+    stall = _stall(delay)
+    time.sleep(_waited(stall, timeout))
+    _check_timeout(stall, timeout)
+    text = _answer_text(question, context)
+    _check_failure(len(_tokens(text)), fail_after)
+    return text
+
+
+async def agenerate_answer_fake(question: str, context: str, fail_after=-1, delay=0.0, timeout=None) -> str:
+    stall = _stall(delay)
+    await asyncio.sleep(TOKEN_DELAY + _waited(stall, timeout))
+    _check_timeout(stall, timeout)
+    return generate_answer_fake(question, context, fail_after=fail_after)
+
+
+def stream_answer_fake(question: str, context: str, fail_after=-1, delay=0.0, timeout=None):
+    stall = _stall(delay)
+    time.sleep(_waited(stall, timeout))
+    _check_timeout(stall, timeout)
+    for i, tok in enumerate(_tokens(_answer_text(question, context))):
+        _check_failure(i, fail_after)
+        time.sleep(TOKEN_DELAY)
+        yield tok
+
+
+async def astream_answer_fake(question: str, context: str, fail_after=-1, delay=0.0, timeout=None):
+    stall = _stall(delay)
+    await asyncio.sleep(_waited(stall, timeout))
+    _check_timeout(stall, timeout)
+    for i, tok in enumerate(_tokens(_answer_text(question, context))):
+        _check_failure(i, fail_after)
+        await asyncio.sleep(TOKEN_DELAY)
+        yield tok
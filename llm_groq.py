@@ -1,10 +1,39 @@
 import os
 from dotenv import load_dotenv
-from groq import Groq
+
+from lazy import Lazy
+from prompts import build_prompt
 
 load_dotenv()
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+
+def _make_client():
+    from groq import Groq
+    return Groq(api_key=os.getenv("GROQ_API_KEY"))
+
+
+def _make_async_client():
+    import httpx
+    from groq import AsyncGroq, DefaultAsyncHttpxClient
+
+    # async client with one shared keep-alive pool for all in-flight requests
+    return AsyncGroq(
+        api_key=os.getenv("GROQ_API_KEY"),
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        ),
+    )
+
+
+# created on first use, not at import
+client = Lazy("groq_client", _make_client)
+async_client = Lazy("groq_async_client", _make_async_client)
+
+
+def _deadline(timeout=None) -> dict:
+    # per-request deadline (seconds); None keeps the client default (the SDK reads None as "no timeout")
+    return {} if timeout is None else {"timeout": timeout}
+
 
 # Best fast + strong model
 MODEL_NAME = "llama-3.1-8b-instant"
@@ -12,30 +41,62 @@ MODEL_NAME = "llama-3.1-8b-instant"
 # MODEL_NAME = "llama-3.1-70b-versatile"
 
 
-def generate_answer_groq(question: str, context: str) -> str:
-    prompt = f"""
-You are a highly accurate document-based assistant.
+def generate_answer_groq(question: str, context: str, timeout=None) -> str:
+    response = client.get().chat.completions.create(
+        model=MODEL_NAME,
+        messages=[
+            {"role": "user", "content": build_prompt(question, context)}
+        ],
+        temperature=0.2,
+        **_deadline(timeout),
+    )
+
+    return response.choices[0].message.content.strip()
 
-RULES:
-- Answer ONLY using the provided CONTEXT.
-- Do NOT use outside knowledge.
-- If answer not found, say: Not found in the document.
 
-CONTEXT:
-{context}
+async def agenerate_answer_groq(question: str, context: str, timeout=None) -> str:
+    response = await async_client.get().chat.completions.create(
+        model=MODEL_NAME,
+        messages=[
+            {"role": "user", "content": build_prompt(question, context)}
+        ],
+        temperature=0.2,
+        **_deadline(timeout),
+    )
 
-QUESTION:
-{question}
+    return response.choices[0].message.content.strip()
 
-Answer:
-"""
 
-    response = client.chat.completions.create(
+def stream_answer_groq(question: str, context: str, timeout=None):
+    """
+    Yield answer text pieces as Groq produces them.
+    """
+    stream = client.get().chat.completions.create(
         model=MODEL_NAME,
         messages=[
-            {"role": "user", "content": prompt}
+            {"role": "user", "content": build_prompt(question, context)}
         ],
-        temperature=0.2
+        temperature=0.2,
+        stream=True,
+        **_deadline(timeout),
     )
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
 
-    return response.choices[0].message.content.strip()
+
+async def astream_answer_groq(question: str, context: str, timeout=None):
+    stream = await async_client.get().chat.completions.create(
+        model=MODEL_NAME,
+        messages=[
+            {"role": "user", "content": build_prompt(question, context)}
+        ],
+        temperature=0.2,
+        stream=True,
+        **_deadline(timeout),
+    )
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
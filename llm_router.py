@@ -1,15 +1,529 @@
-from llm_api import generate_answer  # Gemini
-from llm_groq import generate_answer_groq
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
 
+import llm_api
+import metrics
+import llm_fake
+import llm_groq
+from llm_api import agenerate_answer, astream_answer, generate_answer, stream_answer  # Gemini
+from llm_groq import agenerate_answer_groq, astream_answer_groq, generate_answer_groq, stream_answer_groq
 
-def generate_answer_with_fallback(question: str, context: str) -> str:
+logger = logging.getLogger(__name__)
+
+PROVIDERS = {
+    "gemini": {
+        "generate": generate_answer,
+        "agenerate": agenerate_answer,
+        "stream": stream_answer,
+        "astream": astream_answer,
+    },
+    "groq": {
+        "generate": generate_answer_groq,
+        "agenerate": agenerate_answer_groq,
+        "stream": stream_answer_groq,
+        "astream": astream_answer_groq,
+    },
+    # offline providers for local runs and tests
+    "fake": {
+        "generate": llm_fake.generate_answer_fake,
+        "agenerate": llm_fake.agenerate_answer_fake,
+        "stream": llm_fake.stream_answer_fake,
+        "astream": llm_fake.astream_answer_fake,
+    },
+    "fake-flaky": {
+        "generate": partial(llm_fake.generate_answer_fake, fail_after=llm_fake.FLAKY_FAIL_AFTER),
+        "agenerate": partial(llm_fake.agenerate_answer_fake, fail_after=llm_fake.FLAKY_FAIL_AFTER),
+        "stream": partial(llm_fake.stream_answer_fake, fail_after=llm_fake.FLAKY_FAIL_AFTER),
+        "astream": partial(llm_fake.astream_answer_fake, fail_after=llm_fake.FLAKY_FAIL_AFTER),
+    },
+    "fake-slow": {
+        "generate": partial(llm_fake.generate_answer_fake, delay=llm_fake.SLOW_DELAY),
+        "agenerate": partial(llm_fake.agenerate_answer_fake, delay=llm_fake.SLOW_DELAY),
+        "stream": partial(llm_fake.stream_answer_fake, delay=llm_fake.SLOW_DELAY),
+        "astream": partial(llm_fake.astream_answer_fake, delay=llm_fake.SLOW_DELAY),
+    },
+}
+
+# primary provider first, then fallbacks in order
+PROVIDER_CHAIN = [p.strip() for p in os.getenv("LLM_PROVIDERS", "gemini,groq").split(",") if p.strip()]
+
+# deadline of one provider call in seconds (streams: until the first token);
+# a provider that misses it counts as failed and the next one takes over
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+
+# circuit breaker: a provider failing LLM_BREAKER_FAILURES times in a row is
+# skipped for LLM_BREAKER_COOLDOWN seconds, then a single trial call decides
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# LLM_HEDGE=1: a (non-streamed) call still running after the provider's p95
+# latency is hedged with the next provider, the first answer wins
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+# successful calls a provider needs before its p95 is trusted for hedging
+HEDGE_MIN_SAMPLES = 20
+
+# lazily created clients of each provider, loaded by the server warm-up
+CLIENTS = {
+    "gemini": [llm_api.client],
+    "groq": [llm_groq.client, llm_groq.async_client],
+}
+
+
+def client_names():
+    """
+    Names (see lazy.registry) of the clients the provider chain uses.
+    """
+    return [c.name for name in PROVIDER_CHAIN for c in CLIENTS.get(name, [])]
+
+
+# per-provider cap on in-flight calls (protects rate limits / connection pools)
+_limits = {
+    "gemini": int(os.getenv("GEMINI_MAX_CONCURRENCY", "16")),
+    "groq": int(os.getenv("GROQ_MAX_CONCURRENCY", "8")),
+}
+
+# asyncio primitives belong to one event loop: semaphores per running loop
+# (server loop, asyncio.run in scripts/tests, ...) and provider
+_slots = weakref.WeakKeyDictionary()
+_slots_lock = threading.Lock()
+
+# sync calls run in a pool per provider, so they can be abandoned at their
+# deadline and a hung provider only ever ties up its own threads (calls also
+# carry LLM_TIMEOUT as client timeout, which frees them soon after)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _limit(name: str) -> int:
+    return _limits.get(name, 16)
+
+
+def _slot(name: str):
+    loop = asyncio.get_running_loop()
+    with _slots_lock:
+        slots = _slots.setdefault(loop, {})
+        if name not in slots:
+            slots[name] = asyncio.Semaphore(_limit(name))
+        return slots[name]
+
+
+def _pool(name: str) -> ThreadPoolExecutor:
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = ThreadPoolExecutor(max_workers=_limit(name), thread_name_prefix=f"llm-{name}")
+        return _pools[name]
+
+_END = object()
+
+
+# ---------------- provider health ---------------- #
+_STATES = {"closed": 0, "half-open": 1, "open": 2}
+
+
+def _percentile(ordered, q: float):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+
+
+class ProviderHealth:
+    """
+    Recent latencies and outcomes of one provider, and its circuit breaker:
+    closed (calls go through) -> open after `failures` failures in a row
+    (the provider is skipped) -> half-open once `cooldown` has passed (one
+    trial call at a time) -> closed on its success, open again on failure.
+    Only non-streamed calls feed the latency window used for hedging.
+    """
+
+    def __init__(self, name: str, failures=LLM_BREAKER_FAILURES, cooldown=LLM_BREAKER_COOLDOWN, window=200):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self._failed_in_row = 0
+        self._opened_at = 0.0
+        self._trial = False
+        metrics.LLM_CIRCUIT.set(0, provider=name)
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.LLM_CIRCUIT.set(_STATES[state], provider=self.name)
+
+    def allow(self) -> bool:
+        """
+        Whether a call may be sent now (when half-open, claims the trial call).
+        """
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self._set_state("half-open")
+            if self.state == "closed":
+                return True
+            if self.state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, outcome: str, seconds=None):
+        """
+        Outcome of a call: ok / error / timeout, or cancelled (lost a hedge
+        race, which says nothing about the provider). `seconds` of a
+        successful call join the latency window.
+        """
+        with self._lock:
+            self._trial = False
+            if outcome == "cancelled":
+                return
+            self._outcomes.append(outcome == "ok")
+            if outcome == "ok":
+                if seconds is not None:
+                    self._latencies.append(seconds)
+                self._failed_in_row = 0
+                if self.state != "closed":
+                    self._set_state("closed")
+                return
+            self._failed_in_row += 1
+            if self.state != "closed" or self._failed_in_row >= self.failures:
+                reason = "trial call failed" if self.state != "closed" else f"{self._failed_in_row} failures in a row"
+                logger.warning("%s circuit open for %gs (%s)", self.name, self.cooldown, reason)
+                self._opened_at = time.monotonic()
+                self._set_state("open")
+
+    def p95(self):
+        """
+        p95 latency of recent successful calls, None until there are HEDGE_MIN_SAMPLES.
+        """
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            return _percentile(sorted(self._latencies), 0.95)
+
+    def stats(self) -> dict:
+        with self._lock:
+            ordered = sorted(self._latencies)
+            outcomes = list(self._outcomes)
+            state = self.state
+        p50, p95 = _percentile(ordered, 0.5), _percentile(ordered, 0.95)
+        return {
+            "state": state,
+            "recent_calls": len(outcomes),
+            "error_rate": 1 - sum(outcomes) / len(outcomes) if outcomes else 0.0,
+            "p50_s": round(p50, 4) if p50 is not None else None,
+            "p95_s": round(p95, 4) if p95 is not None else None,
+        }
+
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def health(name: str) -> ProviderHealth:
+    with _health_lock:
+        if name not in _health:
+            _health[name] = ProviderHealth(name)
+        return _health[name]
+
+
+def provider_stats() -> dict:
+    """
+    Router settings and the health of every provider of the chain.
+    """
+    return {"chain": PROVIDER_CHAIN, "timeout_s": LLM_TIMEOUT, "hedge": LLM_HEDGE,
+            "providers": {name: health(name).stats() for name in PROVIDER_CHAIN}}
+
+
+# ---------------- routing ---------------- #
+def _new_route(route):
+    """
+    The routing decisions of one answer, filled into `route`: the provider
+    that answered, every attempt with its outcome and duration, providers
+    skipped for an open circuit, and the hedge provider if one was sent.
+    """
+    route = {} if route is None else route
+    route.update(provider=None, attempts=[], skipped=[], hedged=None)
+    return route
+
+
+def _record(route, name: str, outcome: str, seconds: float, error=None, latency=True):
+    attempt = {"provider": name, "outcome": outcome, "seconds": round(seconds, 4)}
+    if error is not None:
+        attempt["error"] = str(error)
+        logger.warning("%s %s: %s", name, outcome, error)
+    route["attempts"].append(attempt)
+    metrics.LLM_SECONDS.observe(seconds, provider=name, outcome=outcome)
+    health(name).record(outcome, seconds if latency else None)
+
+
+def _candidates(route):
+    """
+    Providers of the chain in order, minus those with an open circuit (all
+    of them if every circuit is open). Lazy, so a half-open provider only
+    claims its trial call once it is actually reached.
+    """
+    tried = False
+    for name in PROVIDER_CHAIN:
+        if health(name).allow():
+            tried = True
+            yield name
+        else:
+            route["skipped"].append(name)
+            metrics.LLM_SKIPS.inc(provider=name)
+    if not tried:
+        # better a call to a failing provider than no answer at all
+        route["skipped"].clear()
+        yield from PROVIDER_CHAIN
+
+
+def _switch(route, name: str):
+    # `name` takes over after the provider of the last attempt failed
+    failed = route["attempts"][-1]["provider"]
+    metrics.LLM_FALLBACKS.inc(provider=failed, to=name)
+    logger.warning("%s failed, switching to %s fallback", failed, name)
+
+
+def _answered(route, name: str):
+    route["provider"] = name
+    metrics.LLM_ANSWERS.inc(provider=name)
+
+
+def _no_provider():
+    return RuntimeError("No LLM provider configured (LLM_PROVIDERS)")
+
+
+class _Race:
+    """
+    One provider call, plus its hedge if one is sent, under the deadline.
+    Shared by the sync (futures) and async (tasks) paths, which only differ
+    in how a call is started (`start_call(name)`) and waited on.
+    """
+
+    def __init__(self, name: str, candidates, route, start_call):
+        self.candidates = candidates
+        self.route = route
+        self.start_call = start_call
+        self.start = time.perf_counter()
+        self.hedge_at = health(name).p95() if LLM_HEDGE else None
+        self.hedge = None
+        self.error = None
+        self.calls = {start_call(name): (name, self.start)}
+
+    def timeout(self) -> float:
+        # until the next deadline or the hedge, whichever comes first
+        wake = min(started + LLM_TIMEOUT for _, started in self.calls.values())
+        if self.hedge_at is not None:
+            wake = min(wake, self.start + self.hedge_at)
+        return max(0.0, wake - time.perf_counter())
+
+    def settle(self, done):
+        """
+        (provider, answer) of the first successful call in `done`, else None.
+        """
+        for call in done:
+            name, started = self.calls.pop(call)
+            try:
+                answer, seconds = call.result()
+            except Exception as e:
+                self.error = e
+                # the client's own timeout (same deadline) may fire just before ours
+                outcome = "timeout" if isinstance(e, TimeoutError) else "error"
+                _record(self.route, name, outcome, time.perf_counter() - started, e)
+                continue
+            _record(self.route, name, "ok", seconds)
+            self.close(name)
+            return name, answer
+        return None
+
+    def tick(self):
+        """
+        Drop calls past their deadline, send the hedge once it is due.
+        """
+        now = time.perf_counter()
+        for call, (name, started) in list(self.calls.items()):
+            if now - started >= LLM_TIMEOUT:
+                del self.calls[call]
+                call.cancel()
+                self.error = TimeoutError(f"{name} did not answer within {LLM_TIMEOUT:g}s")
+                _record(self.route, name, "timeout", now - started, self.error)
+
+        if self.hedge_at is not None and self.calls and now - self.start >= self.hedge_at:
+            self.hedge_at = None
+            self.hedge = next(self.candidates, None)
+            if self.hedge is not None:
+                self.route["hedged"] = self.hedge
+                self.calls[self.start_call(self.hedge)] = (self.hedge, now)
+
+    def close(self, winner=None):
+        # losers are cancelled (a running sync call finishes in the background, its answer dropped)
+        for call, (name, started) in self.calls.items():
+            call.cancel()
+            _record(self.route, name, "cancelled", time.perf_counter() - started)
+        self.calls = {}
+        if self.hedge is not None:
+            metrics.LLM_HEDGES.inc(provider=self.hedge, result="won" if winner == self.hedge else "lost")
+            self.hedge = None
+
+
+def _generate_call(name: str, question: str, context: str):
+    start = time.perf_counter()
+    return PROVIDERS[name]["generate"](question, context, timeout=LLM_TIMEOUT), time.perf_counter() - start
+
+
+async def _agenerate_call(name: str, question: str, context: str):
+    async with _slot(name):
+        start = time.perf_counter()
+        answer = await PROVIDERS[name]["agenerate"](question, context, timeout=LLM_TIMEOUT)
+        return answer, time.perf_counter() - start
+
+
+def generate_answer_with_fallback(question: str, context: str, route=None) -> str:
     """
     Try Gemini first, if it fails -> fallback to Groq Llama
+    (order comes from LLM_PROVIDERS)
+
+    Every call has LLM_TIMEOUT seconds to answer, providers with an open
+    circuit are skipped, and with LLM_HEDGE=1 a call slower than the
+    provider's p95 is hedged with the next provider. `route` (a dict)
+    receives the routing decisions.
+    """
+    route = _new_route(route)
+    candidates = _candidates(route)
+    error = _no_provider()
+    for name in candidates:
+        if route["attempts"]:
+            _switch(route, name)
+        race = _Race(name, candidates, route,
+                     lambda n: _pool(n).submit(_generate_call, n, question, context))
+        try:
+            while race.calls:
+                done, _ = wait(list(race.calls), timeout=race.timeout(), return_when=FIRST_COMPLETED)
+                won = race.settle(done)
+                if won:
+                    _answered(route, won[0])
+                    return won[1]
+                race.tick()
+        finally:
+            race.close()
+        error = race.error
+    raise error
+
+
+async def agenerate_answer_with_fallback(question: str, context: str, route=None) -> str:
+    """
+    Async version: waits on the network without blocking the event loop.
+    """
+    route = _new_route(route)
+    candidates = _candidates(route)
+    error = _no_provider()
+    for name in candidates:
+        if route["attempts"]:
+            _switch(route, name)
+        race = _Race(name, candidates, route,
+                     lambda n: asyncio.ensure_future(_agenerate_call(n, question, context)))
+        try:
+            while race.calls:
+                done, _ = await asyncio.wait(list(race.calls), timeout=race.timeout(),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                won = race.settle(done)
+                if won:
+                    _answered(route, won[0])
+                    return won[1]
+                race.tick()
+        finally:
+            race.close()
+        error = race.error
+    raise error
+
+
+def stream_answer_with_fallback(question: str, context: str, route=None):
     """
-    try:
-        return generate_answer(question, context)  # ✅ Gemini
-    except Exception as e:
-        print("⚠️ Gemini failed, switching to Groq fallback...")
-        print("Gemini Error:", str(e))
+    Yield ("token", text) pieces as the answer is generated.
 
-        return generate_answer_groq(question, context)  # ✅ Groq
+    If a provider fails before producing anything, the next one takes over
+    transparently. If it fails mid-answer, ("reset", next_provider) is
+    yielded first: the caller drops the partial text and the fallback
+    streams the answer again from the start.
+    Each provider has LLM_TIMEOUT seconds to send its first token; open
+    circuits are skipped as in generate_answer_with_fallback (streams are
+    not hedged).
+    """
+    route = _new_route(route)
+    error, emitted = _no_provider(), False
+    for name in _candidates(route):
+        if route["attempts"]:
+            _switch(route, name)
+            if emitted:
+                yield ("reset", name)
+                emitted = False
+        start = time.perf_counter()
+        try:
+            stream = iter(PROVIDERS[name]["stream"](question, context, timeout=LLM_TIMEOUT))
+            # the first token is awaited in the pool, so a stalled provider can be left behind
+            first = _pool(name).submit(next, stream, _END).result(timeout=LLM_TIMEOUT)
+            if first is not _END:
+                emitted = True
+                yield ("token", first)
+                for piece in stream:
+                    yield ("token", piece)
+        except TimeoutError:
+            error = TimeoutError(f"{name} sent no token within {LLM_TIMEOUT:g}s")
+            _record(route, name, "timeout", time.perf_counter() - start, error, latency=False)
+            continue
+        except Exception as e:
+            error = e
+            _record(route, name, "error", time.perf_counter() - start, e, latency=False)
+            continue
+        _record(route, name, "ok", time.perf_counter() - start, latency=False)
+        _answered(route, name)
+        return
+    raise error
+
+
+async def astream_answer_with_fallback(question: str, context: str, route=None):
+    """
+    Async version of stream_answer_with_fallback (same events).
+    """
+    route = _new_route(route)
+    error, emitted = _no_provider(), False
+    for name in _candidates(route):
+        if route["attempts"]:
+            _switch(route, name)
+            if emitted:
+                yield ("reset", name)
+                emitted = False
+        start = time.perf_counter()
+        stream = None
+        try:
+            async with _slot(name):
+                stream = PROVIDERS[name]["astream"](question, context, timeout=LLM_TIMEOUT)
+                try:
+                    first = await asyncio.wait_for(stream.__anext__(), LLM_TIMEOUT)
+                except StopAsyncIteration:
+                    first = _END
+                if first is not _END:
+                    emitted = True
+                    yield ("token", first)
+                    async for piece in stream:
+                        yield ("token", piece)
+        except TimeoutError:
+            error = TimeoutError(f"{name} sent no token within {LLM_TIMEOUT:g}s")
+            _record(route, name, "timeout", time.perf_counter() - start, error, latency=False)
+            continue
+        except Exception as e:
+            error = e
+            _record(route, name, "error", time.perf_counter() - start, e, latency=False)
+            continue
+        finally:
+            if stream is not None:
+                await stream.aclose()
+        _record(route, name, "ok", time.perf_counter() - start, latency=False)
+        _answered(route, name)
+        return
+    raise error
@@ -0,0 +1,222 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# requests slower than this (seconds) are written to the slow-query log with their stage breakdown
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "5"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "data/logs/slow_queries.jsonl")
+
+# seconds; the upper ones are for LLM calls and large ingests
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger(__name__)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels) -> tuple:
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {_number(value)}" for name, labels, value in self._samples()]
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """
+    Monotonic total, one per combination of label values.
+    """
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _labels(self.label_names, k), v) for k, v in items]
+
+
+class Gauge(_Metric):
+    """
+    Current value, set explicitly or read from `fn()` at scrape time.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels=(), fn=None):
+        super().__init__(name, documentation, labels)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        if self.fn is not None:
+            try:
+                return [(self.name, "", self.fn())]
+            except Exception:
+                # a broken source (e.g. an unreachable shard) must not fail the whole scrape
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _labels(self.label_names, k), v) for k, v in items]
+
+
+class Histogram(_Metric):
+    """
+    Cumulative buckets + sum + count of observed values.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        samples = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                samples.append((f"{self.name}_bucket", _labels(self.label_names, key, [le]), cumulative))
+            samples.append((f"{self.name}_sum", _labels(self.label_names, key), total))
+            samples.append((f"{self.name}_count", _labels(self.label_names, key), cumulative))
+        return samples
+
+
+def render() -> str:
+    """
+    Every registered metric in the Prometheus text exposition format.
+    """
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+
+# ---------------- pipeline metrics ---------------- #
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent per pipeline stage", ["stage"])
+REQUEST_SECONDS = Histogram("rag_request_seconds", "End-to-end time of a pipeline request", ["kind"])
+CACHE_LOOKUPS = Counter("rag_answer_cache_lookups_total", "Semantic answer cache lookups", ["result"])
+CONTEXT_TOKENS = Counter("rag_context_tokens_total", "Retrieved-context tokens sent to the LLM")
+ANSWER_TOKENS = Counter("rag_answer_tokens_total", "Tokens of generated answers")
+INGESTED_CHUNKS = Counter("rag_ingested_chunks_total", "Chunks embedded and written to the store")
+SLOW_QUERIES = Counter("rag_slow_queries_total", "Requests slower than SLOW_QUERY_SECONDS", ["kind"])
+
+LLM_SECONDS = Histogram("llm_request_seconds", "LLM call time per provider (outcome: ok/error/timeout/cancelled)",
+                        ["provider", "outcome"])
+LLM_FALLBACKS = Counter("llm_fallbacks_total", "Switches from a failed provider to the next", ["provider", "to"])
+LLM_ANSWERS = Counter("llm_answers_total", "Answers served per provider", ["provider"])
+LLM_SKIPS = Counter("llm_circuit_skips_total", "Calls not sent because the provider's circuit was open", ["provider"])
+LLM_HEDGES = Counter("llm_hedges_total", "Hedged requests per provider (result: won/lost)",
+                     ["provider", "result"])
+LLM_CIRCUIT = Gauge("llm_circuit_state", "Circuit breaker per provider: 0 closed, 1 half-open, 2 open", ["provider"])
+
+
+# ---------------- request traces ---------------- #
+_slow_lock = threading.Lock()
+slow_queries = deque(maxlen=100)
+
+
+class Trace:
+    """
+    Stage timings of one request. Every stage is observed in
+    rag_stage_seconds as it ends; `finish()` observes the total and, for
+    queries over SLOW_QUERY_SECONDS, writes the breakdown to the slow-query
+    log. Stages repeated within a request add up.
+    """
+
+    def __init__(self, kind: str, slow_log=True, **info):
+        self.kind = kind
+        self.slow_log = slow_log
+        self.info = info
+        self.stages = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        STAGE_SECONDS.observe(seconds, stage=name)
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def finish(self, **info) -> float:
+        total = time.perf_counter() - self._start
+        REQUEST_SECONDS.observe(total, kind=self.kind)
+        if self.slow_log and total >= SLOW_QUERY_SECONDS:
+            _log_slow({"time": time.time(), "kind": self.kind, "total_s": round(total, 4),
+                       "stages": {k: round(v, 4) for k, v in self.stages.items()}, **self.info, **info})
+        return total
+
+
+def _log_slow(entry: dict):
+    SLOW_QUERIES.inc(kind=entry["kind"])
+    logger.warning("slow %s (%.2fs): %s", entry["kind"], entry["total_s"], entry["stages"])
+    with _slow_lock:
+        slow_queries.append(entry)
+        if SLOW_QUERY_LOG:
+            try:
+                os.makedirs(os.path.dirname(SLOW_QUERY_LOG) or ".", exist_ok=True)
+                with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, default=str) + "\n")
+            except OSError as e:
+                logger.warning("slow-query log write failed: %s", e)
+
+
+def recent_slow_queries() -> list:
+    with _slow_lock:
+        return list(slow_queries)
@@ -0,0 +1,91 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Merges concurrent calls of a batch function into one call.
+
+    `fn(items) -> results` (one result per item, in order) is run by a
+    single background thread. A call waits for the next batch: the first
+    pending call opens a window of `max_wait` seconds, and the batch is
+    run when the window closes or `max_batch` items are pending, whichever
+    comes first. Each caller gets back the results of its own items, or
+    the exception of its batch.
+    """
+
+    def __init__(self, fn, max_batch=32, max_wait=0.005, name="micro-batcher"):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._batches = 0
+        self._items = 0
+        self._calls = 0
+
+    def __call__(self, items):
+        items = list(items)
+        if not items:
+            return []
+        return self.submit(items).result()
+
+    def submit(self, items) -> Future:
+        future = Future()
+        self._start()
+        self._pending.put((list(items), future))
+        return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"batches": self._batches, "calls": self._calls, "items": self._items,
+                    "avg_batch_items": round(self._items / self._batches, 2) if self._batches else 0.0}
+
+    def _start(self):
+        # the thread is only started by the first call (not in processes that never use it)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+                self._thread.start()
+
+    def _collect(self):
+        calls = [self._pending.get()]
+        size = len(calls[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                call = self._pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            calls.append(call)
+            size += len(call[0])
+        return calls
+
+    def _run(self):
+        while True:
+            calls = self._collect()
+            items = [item for call_items, _ in calls for item in call_items]
+            try:
+                results = self.fn(items)
+            except Exception as e:
+                for _, future in calls:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self._batches += 1
+                self._calls += len(calls)
+                self._items += len(items)
+
+            start = 0
+            for call_items, future in calls:
+                future.set_result(results[start:start + len(call_items)])
+                start += len(call_items)
@@ -0,0 +1,20 @@
+# prompt shared by every LLM provider (llm_api, llm_groq)
+
+
+def build_prompt(question: str, context: str) -> str:
+    return f"""
+You are a highly accurate document-based assistant.
+
+RULES:
+- Answer ONLY using the provided CONTEXT.
+- Do NOT use outside knowledge.
+- If answer not found, say: Not found in the document.
+
+CONTEXT:
+{context}
+
+QUESTION:
+{question}
+
+Answer:
+"""
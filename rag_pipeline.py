@@ -1,43 +1,184 @@
+import asyncio
+import json
 import os
-from document_loader import load_document
-from chunker import chunk_text
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from answer_cache import AnswerCache
+from chunker import tokenizer
+from context_builder import build_context
+from ingest import file_hash, iter_chunk_batches
 from vectordb import VectorStore
-from embeddings import embed_texts
-from llm_router import generate_answer_with_fallback
+from embeddings import embed_queries
+from llm_router import (
+    agenerate_answer_with_fallback,
+    astream_answer_with_fallback,
+    generate_answer_with_fallback,
+    stream_answer_with_fallback,
+)
+
+# cap on concurrent LLM calls when one query holds several questions
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+# semantic answer cache (ANSWER_CACHE=0 disables it)
+answer_cache = None
+if os.getenv("ANSWER_CACHE", "1") != "0":
+    answer_cache = AnswerCache(
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+        max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+        ttl=float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600))),
+    )
 
 
 # bge-small dimension = 384
-def build_index(file_path: str, vectordb: VectorStore):
-    text = load_document(file_path)
-    chunks = chunk_text(text, chunk_size=500, overlap=80)
+def build_index(file_path: str, vectordb: VectorStore, progress=None, tags=None):
+    """
+    Index one file. Re-uploading an unchanged file is a no-op; a changed
+    file replaces the chunks of its previous version.
+
+    Runs as a pipeline (see ingest.iter_chunk_batches): every batch of
+    embedded chunks is written to the store right away, so memory stays
+    bounded by one batch whatever the document size.
+    `progress(pages, chunks)` is called after each batch; `tags` label
+    the document for filtered questions.
+    For many files, IngestEngine spreads this over worker processes.
+    """
+    source = os.path.basename(file_path)
+    content_hash = file_hash(file_path)
+    if vectordb.document_hash(source) == content_hash:
+        return {"chunks_added": 0, "source": source, "skipped": True}
 
-    embeddings = embed_texts(chunks)
+    counts, timings = {"pages": 0, "chunks": 0}, {}
+    trace = metrics.Trace("ingest", slow_log=False)
 
-    metadatas = []
-    for i, ch in enumerate(chunks):
-        metadatas.append({
-            "chunk_id": f"{os.path.basename(file_path)}_{i}",
-            "source": os.path.basename(file_path),
-            "text": ch
-        })
+    def batches():
+        for batch in iter_chunk_batches(file_path, source, counts, timings):
+            yield batch
+            if progress:
+                progress(counts["pages"], counts["chunks"])
 
-    vectordb.add(embeddings, metadatas)
+    start = time.perf_counter()
+    vectordb.add_document_batches(source, content_hash, batches(), tags=tags)
+    # the store pulls the batches: what isn't loading, chunking or embedding is indexing
+    indexing = time.perf_counter() - start - sum(timings.values())
+    for stage, seconds in timings.items():
+        trace.add(stage, seconds)
+    trace.add("index", indexing)
+    trace.finish()
+    metrics.INGESTED_CHUNKS.inc(counts["chunks"])
 
-    return {"chunks_added": len(chunks), "source": os.path.basename(file_path)}
+    return {"chunks_added": counts["chunks"], "source": source}
 
 
-def answer_question(question: str, vectordb: VectorStore, top_k=6):
-    q_embed = embed_texts([question])[0]
+def sync_documents(folder: str, vectordb: VectorStore, delete_missing=True):
+    """
+    Bring the store in line with the files in `folder`: new and changed
+    files are (re)indexed, unchanged ones skipped, and documents whose file
+    is gone are deleted.
+    """
+    results = []
+    present = set()
+    documents = vectordb.documents
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path):
+            present.add(name)
+            # a changed file keeps the tags it was uploaded with
+            results.append(build_index(path, vectordb, tags=documents.get(name, {}).get("tags")))
 
-    retrieved = vectordb.hybrid_search(q_embed, question, top_k=top_k)
+    deleted = []
+    if delete_missing:
+        for source in documents:
+            if source not in present:
+                vectordb.delete_source(source)
+                deleted.append(source)
+
+    return {"indexed": [r for r in results if not r.get("skipped")],
+            "unchanged": [r["source"] for r in results if r.get("skipped")],
+            "deleted": deleted}
+
+
+def _filter_scope(filters) -> str:
+    # answers retrieved under different filters must not be served from the cache for each other
+    return json.dumps(filters or {}, sort_keys=True, default=str)
+
+
+def _retrieve_all(questions, vectordb: VectorStore, top_k, filters=None, trace=None):
+    """
+    Embed all questions in one batch, answer what the semantic cache can,
+    and run one batched hybrid search for the rest. One plan per question,
+    with its prompt context already built (see context_builder).
+    `filters` (see VectorStore.filter_sources) scope retrieval to some documents.
+    Stage timings go to `trace` (see metrics.Trace).
+    """
+    trace = trace or metrics.Trace("retrieve", slow_log=False)
+    start = time.perf_counter()
+    with trace.stage("embed"):
+        q_embeds = embed_queries(questions)
+    version = vectordb.version
+    scope = _filter_scope(filters)
+
+    plans = []
+    with trace.stage("cache"):
+        for q, emb in zip(questions, q_embeds):
+            cached = answer_cache.lookup(emb, version, scope) if answer_cache else None
+            if answer_cache:
+                metrics.CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+            plans.append({"question": q, "embedding": emb, "version": version, "scope": scope,
+                          "cached": cached, "retrieved": [], "route": {}})
+
+    misses = [p for p in plans if p["cached"] is None]
+    if misses:
+        legs = {}
+        with trace.stage("search"):
+            retrieved_all = vectordb.hybrid_search_batch(
+                [p["embedding"] for p in misses], [p["question"] for p in misses], top_k=top_k, filters=filters,
+                timings=legs,
+            )
+        # the legs run side by side within "search"
+        for leg, seconds in legs.items():
+            trace.add(f"search_{leg}", seconds)
+
+        with trace.stage("context"):
+            for p, retrieved in zip(misses, retrieved_all):
+                p["retrieved"] = retrieved
+                p["context"], p["context_stats"] = build_context(retrieved)
+                metrics.CONTEXT_TOKENS.inc(p["context_stats"]["tokens"])
+
+    # retrieval cost is shared by the batch
+    for p in plans:
+        p["retrieval_s"] = (time.perf_counter() - start) / len(plans)
+    return plans
 
-    context = "\n\n".join(
-        [f"[Source: {r['source']}] {r['text']}" for r in retrieved]
-    )
 
-    answer = generate_answer_with_fallback(question, context)
+def _cached_answer(plan):
+    return {**plan["cached"], "question": plan["question"], "cached": True}
 
 
+def _finish(plan, answer: str, generation_s: float):
+    result = _format_answer(plan["question"], answer, plan["retrieved"])
+    metrics.ANSWER_TOKENS.inc(len(tokenizer.get()[0].encode_ordinary(answer)))
+    # prompt size and tokens saved by merging overlapping chunks
+    result["context"] = plan["context_stats"]
+    # which LLM answered, after which attempts (see llm_router)
+    result["route"] = plan["route"]
+    if answer_cache:
+        answer_cache.store(plan["embedding"], plan["version"], result, plan["retrieval_s"] + generation_s,
+                           plan["scope"])
+    return result
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    return fn(*args), time.perf_counter() - start
+
+
+async def _atimed(coro):
+    start = time.perf_counter()
+    return await coro, time.perf_counter() - start
+
+
+def _format_answer(question: str, answer: str, retrieved):
     # Convert lines into clean bullet list
     lines = [line.strip("- ").strip() for line in answer.split("\n") if line.strip()]
 
@@ -49,19 +190,180 @@ def answer_question(question: str, vectordb: VectorStore, top_k=6):
     "sources": list({r["source"] for r in retrieved})
 }
 
+
+def answer_question(question: str, vectordb: VectorStore, top_k=6, filters=None):
+    trace = metrics.Trace("ask", query=question[:200])
+    plan = _retrieve_all([question], vectordb, top_k, filters, trace)[0]
+    if plan["cached"]:
+        trace.finish(questions=1)
+        return _cached_answer(plan)
+
+    with trace.stage("generate"):
+        answer, took = _timed(generate_answer_with_fallback, question, plan["context"], plan["route"])
+
+    result = _finish(plan, answer, took)
+    trace.finish(questions=1)
+    return result
+
 from question_parser import split_questions
 
 
-def answer_multiple_questions(user_query: str, vectordb: VectorStore, top_k=6):
+def answer_multiple_questions(user_query: str, vectordb: VectorStore, top_k=6, max_concurrency=None,
+                              filters=None):
+    """
+    All sub-questions are embedded in one batch and retrieved with one
+    matrix search; the LLM calls then fan out concurrently (at most
+    `max_concurrency` in flight). Answers keep the original question order.
+    Questions found in the semantic answer cache skip retrieval and the LLM.
+    `filters` restrict retrieval to the matching documents.
+    """
+    trace = metrics.Trace("ask", query=user_query[:200])
     questions = split_questions(user_query)
+    max_concurrency = max_concurrency or LLM_MAX_CONCURRENCY
 
     results = []
-    for q in questions:
-        ans = answer_question(q, vectordb, top_k=top_k)
-        results.append(ans)
+    if questions:
+        plans = _retrieve_all(questions, vectordb, top_k, filters, trace)
+        misses = [p for p in plans if not p["cached"]]
+
+        with trace.stage("generate"), \
+                ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(misses)))) as executor:
+            generated = list(executor.map(
+                lambda p: _timed(generate_answer_with_fallback, p["question"], p["context"], p["route"]),
+                misses,
+            ))
+        answers = dict(zip(map(id, misses), generated))
+
+        for p in plans:
+            results.append(_cached_answer(p) if p["cached"] else _finish(p, *answers[id(p)]))
+    trace.finish(questions=len(questions))
 
     return {
         "original_query": user_query,
         "total_questions": len(questions),
         "answers": results
     }
+
+
+async def aanswer_multiple_questions(user_query: str, vectordb: VectorStore, top_k=6, max_concurrency=None,
+                                     filters=None):
+    """
+    Async answer_multiple_questions for the API server: embedding and
+    search (CPU-bound) run in the default executor, the LLM calls are
+    awaited concurrently, so the event loop is never blocked.
+    """
+    trace = metrics.Trace("ask", query=user_query[:200])
+    questions = split_questions(user_query)
+    slots = asyncio.Semaphore(max_concurrency or LLM_MAX_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+
+    async def generate(p):
+        if p["cached"]:
+            return _cached_answer(p)
+        async with slots:
+            answer, took = await _atimed(agenerate_answer_with_fallback(p["question"], p["context"], p["route"]))
+        # token counting and the cache insert stay off the event loop
+        return await loop.run_in_executor(None, _finish, p, answer, took)
+
+    results = []
+    if questions:
+        plans = await loop.run_in_executor(None, _retrieve_all, questions, vectordb, top_k, filters, trace)
+        with trace.stage("generate"):
+            results = list(await asyncio.gather(*(generate(p) for p in plans)))
+    trace.finish(questions=len(questions))
+
+    return {
+        "original_query": user_query,
+        "total_questions": len(questions),
+        "answers": results
+    }
+
+
+def _question_event(i, plan):
+    sources = plan["cached"]["sources"] if plan["cached"] else list({r["source"] for r in plan["retrieved"]})
+    return {"event": "question", "data": {"index": i, "question": plan["question"], "sources": sources}}
+
+
+def _cached_events(i, plan):
+    answer = _cached_answer(plan)
+    yield {"event": "token", "data": {"index": i, "text": answer["answer_raw"]}}
+    yield {"event": "answer", "data": {"index": i, **answer}}
+
+
+def stream_multiple_questions(user_query: str, vectordb: VectorStore, top_k=6, filters=None):
+    """
+    Streaming answer_multiple_questions. Yields event dicts:
+      question -> {"index", "question", "sources"}  (retrieval done, answer starting)
+      token    -> {"index", "text"}                 (next piece of the answer)
+      reset    -> {"index", "provider"}             (LLM fell back mid-answer: drop the partial text)
+      answer   -> formatted answer (same shape as answer_question) + "index"
+      done     -> {"total_questions"}
+    Questions are answered one after another so their tokens never interleave.
+    A cached answer arrives as a single token event.
+    """
+    trace = metrics.Trace("ask_stream", query=user_query[:200])
+    questions = split_questions(user_query)
+    plans = _retrieve_all(questions, vectordb, top_k, filters, trace) if questions else []
+
+    for i, plan in enumerate(plans):
+        yield _question_event(i, plan)
+        if plan["cached"]:
+            yield from _cached_events(i, plan)
+            continue
+
+        start = time.perf_counter()
+        pieces = []
+        for kind, value in stream_answer_with_fallback(plan["question"], plan["context"], plan["route"]):
+            if kind == "reset":
+                pieces = []
+                yield {"event": "reset", "data": {"index": i, "provider": value}}
+            else:
+                pieces.append(value)
+                yield {"event": "token", "data": {"index": i, "text": value}}
+
+        took = time.perf_counter() - start
+        # includes the time the client took to read the tokens
+        trace.add("generate", took)
+        answer = _finish(plan, "".join(pieces).strip(), took)
+        yield {"event": "answer", "data": {"index": i, **answer}}
+
+    trace.finish(questions=len(questions))
+    yield {"event": "done", "data": {"total_questions": len(questions)}}
+
+
+async def astream_multiple_questions(user_query: str, vectordb: VectorStore, top_k=6, filters=None):
+    """
+    Async stream_multiple_questions (same events) for the API server.
+    """
+    trace = metrics.Trace("ask_stream", query=user_query[:200])
+    questions = split_questions(user_query)
+    loop = asyncio.get_running_loop()
+    plans = []
+    if questions:
+        plans = await loop.run_in_executor(None, _retrieve_all, questions, vectordb, top_k, filters, trace)
+
+    for i, plan in enumerate(plans):
+        yield _question_event(i, plan)
+        if plan["cached"]:
+            for event in _cached_events(i, plan):
+                yield event
+            continue
+
+        start = time.perf_counter()
+        pieces = []
+        async for kind, value in astream_answer_with_fallback(plan["question"], plan["context"], plan["route"]):
+            if kind == "reset":
+                pieces = []
+                yield {"event": "reset", "data": {"index": i, "provider": value}}
+            else:
+                pieces.append(value)
+                yield {"event": "token", "data": {"index": i, "text": value}}
+
+        took = time.perf_counter() - start
+        # includes the time the client took to read the tokens
+        trace.add("generate", took)
+        answer = await loop.run_in_executor(None, _finish, plan, "".join(pieces).strip(), took)
+        yield {"event": "answer", "data": {"index": i, **answer}}
+
+    trace.finish(questions=len(questions))
+    yield {"event": "done", "data": {"total_questions": len(questions)}}
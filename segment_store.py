@@ -0,0 +1,280 @@
+import json
+import os
+import pickle
+import shutil
+import threading
+import uuid
+
+import numpy as np
+
+import ann_index
+from chunk_store import ChunkStore, merge_chunk_stores, write_chunk_store
+from fsutil import atomic_write, fsync_dir, write_file
+
+
+MANIFEST = "manifest.json"
+
+
+class SegmentStore:
+    """
+    Append-only on-disk layout of a VectorStore.
+
+    root/
+      manifest.json         -> {"base": "base_000007", "segments": [...], "next_id": 12,
+                                "store_id": "...", "version": 9,
+                                "documents": {source: {"hash", "chunks"}},
+                                "tombstones": {part name: [deleted rows]}}
+      base_000007/          -> compacted snapshot (faiss.index, vectors.npy, chunk columns, bm25.pkl)
+      segments/seg_000011/  -> one immutable segment per add (vectors.npy, chunk columns, terms.pkl)
+
+    Chunk metadata is stored in the columnar format of chunk_store.py.
+
+    A segment (or base) directory is fully written under a temp name and
+    renamed into place; it only becomes part of the store once the
+    manifest referencing it has been atomically replaced. Anything on disk
+    that the manifest doesn't reference is leftover from a crash.
+
+    `store_id` + `version` identify the store's contents: the version is
+    bumped by every change of content (not by compaction), and a reset
+    draws a new store id.
+
+    Deleted chunks are tombstoned per part (base or segment) and only
+    dropped from the files when a compaction rewrites that part.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.segments_dir = os.path.join(root, "segments")
+        self.manifest_path = os.path.join(root, MANIFEST)
+
+        os.makedirs(self.segments_dir, exist_ok=True)
+
+        # guards manifest read-modify-write (adds and compaction run concurrently)
+        self._lock = threading.Lock()
+        self.manifest = self._empty_manifest()
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = {**self._empty_manifest(), **json.load(f)}
+        self._remove_orphans()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    @staticmethod
+    def _empty_manifest():
+        return {"base": None, "segments": [], "next_id": 1, "store_id": uuid.uuid4().hex, "version": 0,
+                "documents": {}, "tombstones": {}}
+
+    @property
+    def content_version(self) -> str:
+        return f"{self.manifest['store_id']}:{self.manifest['version']}"
+
+    @property
+    def documents(self) -> dict:
+        return dict(self.manifest["documents"])
+
+    @property
+    def tombstones(self) -> dict:
+        return dict(self.manifest["tombstones"])
+
+    @property
+    def base(self):
+        return self.manifest["base"]
+
+    @property
+    def segments(self):
+        return list(self.manifest["segments"])
+
+    def base_path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def segment_path(self, name: str) -> str:
+        return os.path.join(self.segments_dir, name)
+
+    # ---------------- manifest ---------------- #
+    def _commit(self, update):
+        with self._lock:
+            manifest = update(dict(self.manifest))
+            data = json.dumps(manifest, indent=2).encode("utf-8")
+            atomic_write(self.manifest_path, lambda f: f.write(data))
+            self.manifest = manifest
+
+    def _reserve_name(self, prefix: str) -> str:
+        with self._lock:
+            next_id = self.manifest["next_id"]
+            self.manifest = {**self.manifest, "next_id": next_id + 1}
+        return f"{prefix}_{next_id:06d}"
+
+    def _remove_orphans(self):
+        live = set(self.manifest["segments"])
+        for name in os.listdir(self.segments_dir):
+            if name not in live:
+                shutil.rmtree(self.segment_path(name), ignore_errors=True)
+
+        for name in os.listdir(self.root):
+            if name.startswith("base_") and name != self.manifest["base"]:
+                shutil.rmtree(self.base_path(name), ignore_errors=True)
+            elif name.endswith(".tmp"):
+                os.remove(os.path.join(self.root, name))
+
+    def _publish_dir(self, final_path: str, fill):
+        tmp_path = final_path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        fill(tmp_path)
+        fsync_dir(tmp_path)
+        os.rename(tmp_path, final_path)
+        fsync_dir(os.path.dirname(final_path))
+
+    # ---------------- segments ---------------- #
+    def append(self, vectors, metadatas, term_counts, tombstones=None, documents=None) -> str:
+        """
+        Persist one add() as a new immutable segment. Cost is proportional
+        to the added rows only. `tombstones`/`documents`, when given,
+        replace those manifest entries in the same commit (a re-uploaded
+        document swaps its chunks atomically).
+        """
+        name = self._reserve_name("seg")
+
+        def fill(path):
+            write_file(os.path.join(path, "vectors.npy"), lambda f: np.save(f, vectors))
+            write_file(os.path.join(path, "terms.pkl"),
+                       lambda f: pickle.dump(term_counts, f, protocol=pickle.HIGHEST_PROTOCOL))
+            write_chunk_store(path, metadatas)
+
+        self._publish_dir(self.segment_path(name), fill)
+
+        def update(manifest):
+            manifest["segments"] = manifest["segments"] + [name]
+            manifest["version"] += 1
+            if tombstones is not None:
+                manifest["tombstones"] = tombstones
+            if documents is not None:
+                manifest["documents"] = documents
+            return manifest
+
+        self._commit(update)
+        return name
+
+    def update_documents(self, documents: dict):
+        """
+        Replace the document manifest (bookkeeping only, contents unchanged).
+        """
+        def update(manifest):
+            manifest["documents"] = documents
+            return manifest
+
+        self._commit(update)
+
+    def delete(self, tombstones: dict, documents: dict):
+        """
+        Record deleted rows (no files are touched until compaction).
+        """
+        def update(manifest):
+            manifest["tombstones"] = tombstones
+            manifest["documents"] = documents
+            manifest["version"] += 1
+            return manifest
+
+        self._commit(update)
+
+    def read_segment(self, name: str):
+        path = self.segment_path(name)
+        vectors = np.load(os.path.join(path, "vectors.npy"))
+        with open(os.path.join(path, "terms.pkl"), "rb") as f:
+            term_counts = pickle.load(f)
+        return vectors, ChunkStore(path), term_counts
+
+    # ---------------- base snapshot ---------------- #
+    def read_base(self):
+        path = self.base_path(self.base)
+        index = ann_index.read_index(os.path.join(path, "faiss.index"))
+        with open(os.path.join(path, "bm25.pkl"), "rb") as f:
+            bm25_state = f.read()
+        return index, ChunkStore(path), bm25_state
+
+    def part_paths(self, segments, base=True):
+        paths = [self.base_path(self.base)] if base and self.base else []
+        paths.extend(self.segment_path(s) for s in segments)
+        return paths
+
+    def read_vectors(self, segments, dim: int, base=True):
+        """
+        Full-precision vectors of the base (optional) followed by `segments`.
+        """
+        arrays = [np.load(os.path.join(p, "vectors.npy"), mmap_mode="r")
+                  for p in self.part_paths(segments, base=base)]
+        if not arrays:
+            return np.zeros((0, dim), dtype="float32")
+        return np.ascontiguousarray(np.concatenate(arrays), dtype="float32")
+
+    def _write_vectors(self, f, files, dim, keeps):
+        arrays = [np.load(p, mmap_mode="r") for p in files]
+        arrays = [a if keep is None else a[keep] for a, keep in zip(arrays, keeps)]
+        rows = sum(len(a) for a in arrays)
+        header = {"descr": np.lib.format.dtype_to_descr(np.dtype("float32")),
+                  "fortran_order": False, "shape": (rows, dim)}
+        np.lib.format.write_array_header_1_0(f, header)
+        for a in arrays:
+            f.write(np.ascontiguousarray(a, dtype="float32").tobytes())
+
+    def write_base(self, index_bytes, bm25_state: bytes, merged_segments, dim: int, keeps=None) -> str:
+        """
+        Write the current base plus `merged_segments` as a new base directory
+        (not yet referenced by the manifest, see commit_base).
+        `index_bytes`/`bm25_state` are a snapshot covering exactly the kept rows;
+        vectors and chunk columns are merged from the immutable files on disk,
+        `keeps` optionally masks the rows of each part (None = keep all).
+        """
+        name = self._reserve_name("base")
+        part_paths = self.part_paths(merged_segments)
+        keeps = keeps or [None] * len(part_paths)
+
+        def fill(path):
+            write_file(os.path.join(path, "faiss.index"), lambda f: f.write(index_bytes))
+            write_file(os.path.join(path, "bm25.pkl"), lambda f: f.write(bm25_state))
+            write_file(os.path.join(path, "vectors.npy"), lambda f: self._write_vectors(
+                f, [os.path.join(p, "vectors.npy") for p in part_paths], dim, keeps))
+            merge_chunk_stores(path, [ChunkStore(p) for p in part_paths], keeps)
+
+        self._publish_dir(self.base_path(name), fill)
+        return name
+
+    def commit_base(self, name: str, merged_segments, tombstones: dict):
+        """
+        Make `name` the base in place of the old base and `merged_segments`.
+        Segments appended meanwhile stay in the manifest. The replaced files
+        are left on disk for searches still reading them: drop() them once
+        the in-memory state no longer points at them. Returns the old base.
+        """
+        old_base = self.base
+        merged = set(merged_segments)
+
+        def update(manifest):
+            manifest["base"] = name
+            manifest["segments"] = [s for s in manifest["segments"] if s not in merged]
+            manifest["tombstones"] = tombstones
+            return manifest
+
+        self._commit(update)
+        return old_base
+
+    def drop(self, base, segments):
+        """
+        Delete the files of a replaced `base` (None: none) and of `segments`,
+        no longer referenced by the manifest (see commit_base).
+        """
+        if base:
+            shutil.rmtree(self.base_path(base), ignore_errors=True)
+        for s in segments:
+            shutil.rmtree(self.segment_path(s), ignore_errors=True)
+
+    def reset(self):
+        with self._lock:
+            if os.path.exists(self.manifest_path):
+                os.remove(self.manifest_path)
+            if self.manifest["base"]:
+                shutil.rmtree(self.base_path(self.manifest["base"]), ignore_errors=True)
+            shutil.rmtree(self.segments_dir, ignore_errors=True)
+            os.makedirs(self.segments_dir, exist_ok=True)
+            self.manifest = self._empty_manifest()
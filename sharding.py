@@ -0,0 +1,409 @@
+"""
+Sharded VectorStore: documents are hash-partitioned across N shards and
+every search is scattered to the shards in parallel, then gathered into
+one global top-k.
+
+A shard is a plain VectorStore, either in this process (LocalShard) or
+served by another process / host (RemoteShard <-> `python sharding.py`).
+Remote calls go over multiprocessing.connection (pickled, HMAC-authenticated
+with SHARD_AUTHKEY).
+
+    # one shard server per host/process
+    SHARD_AUTHKEY=secret python sharding.py --path data/shard_0 --port 7001
+    # the app then searches all of them
+    SHARD_AUTHKEY=secret VECTOR_SHARDS=host-a:7001,host-b:7001 uvicorn app:app
+    # or N in-process shards under data/shards
+    VECTOR_SHARDS=4 uvicorn app:app
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from bm25_index import BM25Index, tokenize
+from vectordb import VectorStore, record_legs, select_sources, timed_call
+
+logger = logging.getLogger(__name__)
+
+
+SHARD_ROOT = "data/shards"
+
+# per-shard calls; the dense and BM25 legs of a hybrid search wait on these
+# from their own pool so a busy gather never starves the shard calls it waits for
+_shard_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="shard-call")
+_gather_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="shard-gather")
+
+
+def _authkey() -> bytes:
+    key = os.getenv("SHARD_AUTHKEY")
+    if not key:
+        raise RuntimeError("SHARD_AUTHKEY must be set to talk to remote shards")
+    return key.encode("utf-8")
+
+
+class ShardService:
+    """
+    What one shard does for ShardedVectorStore, on top of its VectorStore.
+    Called directly in-process (LocalShard) or by a shard server.
+    """
+
+    METHODS = ("version", "documents", "document_hash", "write", "delete_source", "save", "reset",
+               "search_dense_batch", "bm25_stats", "search_bm25_batch")
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+
+    def version(self) -> str:
+        return self.store.version
+
+    def documents(self) -> dict:
+        return self.store.documents
+
+    def document_hash(self, source: str):
+        return self.store.document_hash(source)
+
+    def write(self, embeddings, metadatas, replace=(), documents=None):
+        self.store.write(embeddings, metadatas, replace=replace, documents=documents)
+
+    def delete_source(self, source: str) -> int:
+        return self.store.delete_source(source)
+
+    def save(self):
+        self.store.save()
+
+    def reset(self):
+        self.store.reset()
+
+    def search_dense_batch(self, query_embeddings, top_k, ef_search=None, nprobe=None, filters=None):
+        return self.store.search_dense_batch(query_embeddings, top_k, ef_search=ef_search, nprobe=nprobe,
+                                             filters=filters)
+
+    def bm25_stats(self, terms) -> dict:
+        return self.store.bm25_stats(terms)
+
+    def search_bm25_batch(self, queries, top_k, filters=None, stats=None):
+        return [self.store.search_bm25(q, top_k, filters=filters, stats=stats) for q in queries]
+
+
+class LocalShard(ShardService):
+    """
+    In-process shard (its own VectorStore, index files and locks).
+    """
+
+    def __init__(self, store: VectorStore, name=None):
+        super().__init__(store)
+        self.name = name or os.path.dirname(store.index_path)
+
+
+class RemoteShard:
+    """
+    Client of a shard server at (host, port). Calls are pickled over
+    authenticated connections; one connection per concurrent call,
+    kept open for reuse.
+    """
+
+    def __init__(self, address, authkey=None):
+        self.address = tuple(address)
+        self.name = f"{address[0]}:{address[1]}"
+        self._authkey = authkey or _authkey()
+        self._idle = queue.SimpleQueue()
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = Client(self.address, authkey=self._authkey)
+        try:
+            conn.send((method, args, kwargs))
+            ok, value = conn.recv()
+        except BaseException:
+            conn.close()
+            raise
+        self._idle.put(conn)
+        if not ok:
+            raise RuntimeError(f"shard {self.name}: {value}")
+        return value
+
+    def __getattr__(self, name):
+        if name not in ShardService.METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+
+
+def _serve_connection(service: ShardService, conn):
+    with conn:
+        while True:
+            try:
+                method, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            if method not in ShardService.METHODS:
+                conn.send((False, f"unknown method {method!r}"))
+                continue
+            try:
+                conn.send((True, getattr(service, method)(*args, **kwargs)))
+            except Exception as e:
+                conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+def serve(store: VectorStore, address, authkey=None):
+    """
+    Serve `store` as a shard at (host, port), one thread per client connection.
+    """
+    service = ShardService(store)
+    with Listener(tuple(address), authkey=authkey or _authkey()) as listener:
+        logger.info("shard %s serving on %s:%s", store.index_path, address[0], address[1])
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception:
+                # failed handshake (wrong authkey, port scan): keep serving
+                continue
+            threading.Thread(target=_serve_connection, args=(service, conn), daemon=True).start()
+
+
+class ShardedVectorStore:
+    """
+    VectorStore interface over several shards.
+
+    Chunks are placed by a hash of their source, so every document lives
+    on exactly one shard: replacing or deleting it stays a single-shard
+    (atomic) write, and a filter on sources only visits their shards.
+
+    Searches scatter to the shards in parallel and gather the global top-k
+    by score. Dense scores are cosine similarities and compare as they are;
+    for BM25, the term statistics of all shards are summed first and every
+    shard scores with them, so scores (and the ranking) match a single
+    index over the whole corpus. Hybrid search merges the two global
+    lists exactly like VectorStore.hybrid_search.
+    """
+
+    def __init__(self, shards):
+        if not shards:
+            raise ValueError("ShardedVectorStore needs at least one shard")
+        self.shards = list(shards)
+
+    # ---------------- routing ---------------- #
+    def shard_of(self, source: str) -> int:
+        return zlib.crc32(source.encode("utf-8")) % len(self.shards)
+
+    def _scatter(self, shard_ids, method, *args, **kwargs):
+        """
+        Call `method` on the given shards in parallel; results in shard order.
+        """
+        futures = [_shard_pool.submit(getattr(self.shards[i], method), *args, **kwargs) for i in shard_ids]
+        return [f.result() for f in futures]
+
+    def _all(self):
+        return range(len(self.shards))
+
+    def _targets(self, filters):
+        # shards that can hold matching chunks
+        if filters and filters.get("sources"):
+            return sorted({self.shard_of(source) for source in filters["sources"]})
+        return self._all()
+
+    # ---------------- documents ---------------- #
+    @property
+    def version(self) -> str:
+        return "|".join(self._scatter(self._all(), "version"))
+
+    @property
+    def documents(self) -> dict:
+        documents = {}
+        for docs in self._scatter(self._all(), "documents"):
+            documents.update(docs)
+        return documents
+
+    def document_hash(self, source: str):
+        return self.shards[self.shard_of(source)].document_hash(source)
+
+    def filter_sources(self, filters) -> list:
+        return select_sources(self.documents, filters)
+
+    # ---------------- writes ---------------- #
+    def add(self, embeddings, metadatas):
+        self.write(embeddings, metadatas)
+
+    def add_document(self, source: str, content_hash: str, embeddings, metadatas, tags=None):
+        self.add_document_batches(source, content_hash, [(embeddings, metadatas)], tags=tags)
+
+    def add_document_batches(self, source: str, content_hash: str, batches, tags=None):
+        """
+        Same semantics as VectorStore.add_document_batches, on the shard owning `source`.
+        """
+        tags = list(tags or [])
+        total = 0
+        for embeddings, metadatas in batches:
+            first = total == 0
+            total += len(metadatas)
+            self.write(embeddings, metadatas, replace=[source] if first else (),
+                       documents={source: {"hash": None, "chunks": total, "tags": tags}})
+
+        self.write([], [], replace=() if total else [source],
+                   documents={source: {"hash": content_hash, "chunks": total, "tags": tags}})
+
+    def write(self, embeddings, metadatas, replace=(), documents=None):
+        """
+        VectorStore.write split by shard: every shard gets its own rows,
+        replaced sources and document entries, and the shards write in parallel.
+        """
+        embeddings = np.asarray(embeddings, dtype="float32")
+        owner = np.array([self.shard_of(md["source"]) for md in metadatas], dtype=np.int64)
+
+        calls = {}
+        for i in self._all():
+            rows = np.flatnonzero(owner == i)
+            shard_replace = [s for s in replace if self.shard_of(s) == i]
+            shard_documents = {s: d for s, d in (documents or {}).items() if self.shard_of(s) == i}
+            if len(rows) or shard_replace or shard_documents:
+                calls[i] = (embeddings[rows] if len(rows) else [], [metadatas[r] for r in rows],
+                            shard_replace, shard_documents or None)
+
+        futures = [_shard_pool.submit(self.shards[i].write, *args) for i, args in calls.items()]
+        for f in futures:
+            f.result()
+
+    def delete_source(self, source: str) -> int:
+        return self.shards[self.shard_of(source)].delete_source(source)
+
+    def save(self):
+        self._scatter(self._all(), "save")
+
+    def reset(self):
+        self._scatter(self._all(), "reset")
+
+    # ---------------- search ---------------- #
+    @staticmethod
+    def _gather(per_shard, top_k):
+        """
+        Per-shard hit lists (shard -> query -> hits) to the global top_k per query.
+        """
+        gathered = []
+        for hits in zip(*per_shard):
+            merged = sorted(itertools.chain.from_iterable(hits), key=lambda h: h["score"], reverse=True)
+            gathered.append(merged[:top_k])
+        return gathered
+
+    def search_dense(self, query_embedding, top_k=10, ef_search=None, nprobe=None, filters=None):
+        return self.search_dense_batch([query_embedding], top_k, ef_search=ef_search, nprobe=nprobe,
+                                       filters=filters)[0]
+
+    def search_dense_batch(self, query_embeddings, top_k=10, ef_search=None, nprobe=None, filters=None):
+        query_embeddings = np.asarray(query_embeddings, dtype="float32")
+        per_shard = self._scatter(self._targets(filters), "search_dense_batch", query_embeddings, top_k,
+                                  ef_search=ef_search, nprobe=nprobe, filters=filters)
+        return self._gather(per_shard, top_k)
+
+    def search_bm25(self, query, top_k=10, filters=None):
+        return self.search_bm25_batch([query], top_k, filters=filters)[0]
+
+    def search_bm25_batch(self, queries, top_k=10, filters=None):
+        """
+        Two rounds: the corpus statistics of the query terms from every
+        shard (idf is corpus-wide, even under a filter), then scoring on
+        the target shards with the summed statistics.
+        """
+        terms = sorted({tok for q in queries for tok in tokenize(q)})
+        stats = BM25Index.merge_stats(self._scatter(self._all(), "bm25_stats", terms))
+        if not stats["n"]:
+            return [[] for _ in queries]
+        per_shard = self._scatter(self._targets(filters), "search_bm25_batch", list(queries), top_k,
+                                  filters=filters, stats=stats)
+        return self._gather(per_shard, top_k)
+
+    def hybrid_search(self, query_embedding, query_text, top_k=10, timeout=None, ef_search=None, nprobe=None,
+                      filters=None):
+        return self.hybrid_search_batch([query_embedding], [query_text], top_k=top_k, timeout=timeout,
+                                        ef_search=ef_search, nprobe=nprobe, filters=filters)[0]
+
+    def hybrid_search_batch(self, query_embeddings, query_texts, top_k=10, timeout=None,
+                            ef_search=None, nprobe=None, filters=None, timings=None):
+        """
+        Both legs scattered at once under one deadline; a leg that misses
+        it contributes no hits (as in VectorStore.hybrid_search_batch).
+        `timings` receives the wall time of each gathered leg.
+        """
+        if not len(query_texts):
+            return []
+        dense_future = _gather_pool.submit(timed_call, self.search_dense_batch, query_embeddings, top_k,
+                                           ef_search=ef_search, nprobe=nprobe, filters=filters)
+        bm25_future = _gather_pool.submit(timed_call, self.search_bm25_batch, query_texts, top_k, filters=filters)
+        wait([dense_future, bm25_future], timeout=timeout)
+
+        empty = [[] for _ in query_texts]
+        dense_all, dense_s = dense_future.result() if dense_future.done() else (empty, None)
+        bm25_all, bm25_s = bm25_future.result() if bm25_future.done() else (empty, None)
+        if timings is not None:
+            record_legs(timings, dense_s, [bm25_s])
+        return [VectorStore._merge_hits(d, b, top_k) for d, b in zip(dense_all, bm25_all)]
+
+
+def _local_shards(n: int, root: str, dim: int, **options):
+    # documents are placed by hash % n: the shard count of a root can't change
+    layout = os.path.join(root, "shards.json")
+    os.makedirs(root, exist_ok=True)
+    if os.path.exists(layout):
+        with open(layout, "r", encoding="utf-8") as f:
+            existing = json.load(f)["shards"]
+        if existing != n:
+            raise ValueError(f"{root} holds {existing} shards, not {n} (resharding is not supported)")
+    else:
+        with open(layout, "w", encoding="utf-8") as f:
+            json.dump({"shards": n}, f)
+
+    shards = []
+    for i in range(n):
+        path = os.path.join(root, f"shard_{i:03d}")
+        store = VectorStore(dim, index_path=os.path.join(path, "faiss.index"),
+                            meta_path=os.path.join(path, "meta.pkl"), **options)
+        shards.append(LocalShard(store, name=path))
+    return shards
+
+
+def open_store(dim: int, shards="", root=SHARD_ROOT, **options):
+    """
+    The app's vector store: a single VectorStore (shards empty), N in-process
+    shards under `root` (shards="4"), or remote shard servers
+    (shards="host-a:7001,host-b:7001"). `options` go to every local VectorStore.
+    """
+    shards = (shards or "").strip()
+    if not shards:
+        return VectorStore(dim=dim, **options)
+    if shards.isdigit():
+        return ShardedVectorStore(_local_shards(int(shards), root, dim, **options))
+
+    remote = []
+    for address in shards.split(","):
+        host, port = address.strip().rsplit(":", 1)
+        remote.append(RemoteShard((host, int(port))))
+    return ShardedVectorStore(remote)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve one VectorStore shard (see module docstring).")
+    parser.add_argument("--path", required=True, help="directory of this shard's index")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7001)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--index-type", default=os.getenv("VECTOR_INDEX_TYPE", "flat"))
+    parser.add_argument("--compression", default=os.getenv("VECTOR_COMPRESSION", "none"))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    store = VectorStore(args.dim, index_path=os.path.join(args.path, "faiss.index"),
+                        meta_path=os.path.join(args.path, "meta.pkl"),
+                        index_type=args.index_type, compression=args.compression)
+    serve(store, (args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
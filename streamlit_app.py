@@ -1,8 +1,10 @@
 import os
 import streamlit as st
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from vectordb import VectorStore
-from rag_pipeline import build_index, answer_multiple_questions
+from concurrent.futures import FIRST_COMPLETED, wait
+from itertools import chain
+from sharding import open_store
+from ingest import IngestEngine
+from rag_pipeline import stream_multiple_questions
 
 # ===================== CONFIG ===================== #
 st.set_page_config(
@@ -196,10 +198,19 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # Initialize VectorStore in session state
 @st.cache_resource
 def get_vectordb():
-    return VectorStore(dim=384)
+    return open_store(dim=384, shards=os.getenv("VECTOR_SHARDS", ""),
+                      index_type=os.getenv("VECTOR_INDEX_TYPE", "flat"),
+                      compression=os.getenv("VECTOR_COMPRESSION", "none"))
 
 vectordb = get_vectordb()
 
+# parsing/embedding in worker processes, one writer into the shared VectorStore
+@st.cache_resource
+def get_ingest_engine():
+    return IngestEngine(get_vectordb())
+
+ingest_engine = get_ingest_engine()
+
 # Initialize chat history
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
@@ -227,6 +238,8 @@ with st.sidebar:
         help="Supported formats: TXT, PDF, DOCX, PPTX, Images (OCR)",
         accept_multiple_files=True  # Enable multiple file selection
     )
+    upload_tags = st.text_input("Tags (comma-separated)", placeholder="contracts, 2024",
+                                help="Lets questions be scoped to documents with these tags")
     
     if uploaded_files:
         st.info(f"📁 {len(uploaded_files)} file(s) selected")
@@ -248,35 +261,38 @@ with st.sidebar:
             successful = []
             failed = []
             
-            def process_single_file(file_info):
-                """Process a single file and return result"""
-                file_path, file_name = file_info
-                try:
-                    result = build_index(file_path, vectordb)
-                    return {"status": "success", "name": file_name, "result": result}
-                except Exception as e:
-                    return {"status": "error", "name": file_name, "error": str(e)}
-            
-            # Process all files simultaneously (cap at 10 workers for safety)
-            max_workers = min(len(file_paths), 10)
-            
-            # Use ThreadPoolExecutor for parallel processing
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {executor.submit(process_single_file, fp): fp for fp in file_paths}
-                completed = 0
-                
-                for future in as_completed(futures):
+            # pages/chunks indexed so far per file, filled in by the ingest writer
+            file_progress = {}
+
+            def report(file_name):
+                def progress(pages, chunks):
+                    file_progress[file_name] = (pages, chunks)
+                return progress
+
+            # Files are processed in parallel by the ingest engine's worker processes
+            tags = [t.strip() for t in upload_tags.split(",") if t.strip()]
+            futures = {ingest_engine.submit(file_path, progress=report(file_name), tags=tags): file_name
+                       for file_path, file_name in file_paths}
+            pending = set(futures)
+            completed = 0
+
+            while pending:
+                # wake up regularly to show per-file progress of large documents
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
                     completed += 1
                     progress_bar.progress(completed / len(file_paths))
-                    
-                    result = future.result()
-                    if result["status"] == "success":
-                        successful.append(result)
-                        st.session_state.uploaded_files.append(result["name"])
-                    else:
-                        failed.append(result)
-                    
-                    status_container.text(f"⏳ Processed {completed}/{len(file_paths)} files...")
+
+                    file_name = futures[future]
+                    try:
+                        successful.append({"status": "success", "name": file_name, "result": future.result()})
+                        if file_name not in st.session_state.uploaded_files:
+                            st.session_state.uploaded_files.append(file_name)
+                    except Exception as e:
+                        failed.append({"status": "error", "name": file_name, "error": str(e)})
+
+                chunks = sum(c for _, c in list(file_progress.values()))
+                status_container.text(f"⏳ Processed {completed}/{len(file_paths)} files ({chunks} chunks indexed)...")
             
             # Show final results
             status_container.empty()
@@ -287,7 +303,10 @@ with st.sidebar:
                     st.success(f"✅ Successfully indexed {len(successful)} document(s)!")
                     with st.expander("📋 View Details", expanded=False):
                         for s in successful:
-                            st.markdown(f"**{s['name']}**: {s['result']['chunks_added']} chunks")
+                            if s['result'].get('skipped'):
+                                st.markdown(f"**{s['name']}**: unchanged, skipped")
+                            else:
+                                st.markdown(f"**{s['name']}**: {s['result']['chunks_added']} chunks")
                 
                 if failed:
                     st.error(f"❌ Failed to index {len(failed)} document(s)")
@@ -296,7 +315,17 @@ with st.sidebar:
                             st.markdown(f"**{f['name']}**: {f['error']}")
     
     st.markdown("---")
-    
+
+    # Delete a single document
+    if vectordb.documents:
+        doc_to_delete = st.selectbox("Indexed documents", sorted(vectordb.documents))
+        if st.button("🗑️ Delete Document", use_container_width=True):
+            removed = vectordb.delete_source(doc_to_delete)
+            if doc_to_delete in st.session_state.uploaded_files:
+                st.session_state.uploaded_files.remove(doc_to_delete)
+            st.success(f"✅ Deleted {doc_to_delete} ({removed} chunks)")
+            st.rerun()
+
     # Reset Database Button
     if st.button("⚠️ Reset Database", use_container_width=True, type="secondary"):
         if "confirm_reset" not in st.session_state:
@@ -348,6 +377,19 @@ question = st.text_input(
     label_visibility="collapsed"
 )
 
+# Restrict retrieval to some documents (applied before scoring)
+filters = {}
+documents = vectordb.documents
+if documents:
+    with st.expander("🔎 Search only in", expanded=False):
+        selected_sources = st.multiselect("Documents", sorted(documents), placeholder="All documents")
+        all_tags = sorted({tag for doc in documents.values() for tag in doc.get("tags", [])})
+        selected_tags = st.multiselect("Tags", all_tags, placeholder="Any tag") if all_tags else []
+    if selected_sources:
+        filters["sources"] = selected_sources
+    if selected_tags:
+        filters["tags"] = selected_tags
+
 # ===================== CURRENT ANSWER DISPLAY (Below Question Box) ===================== #
 if st.session_state.current_qa:
     # current_qa now contains a list of answers
@@ -401,28 +443,51 @@ if ask_button:
             else:
                 st.session_state.chat_history.append(st.session_state.current_qa)
         
-        with st.spinner("🧠 Thinking..."):
-            try:
-                result = answer_multiple_questions(question, vectordb)
-                
-                # Store ALL answers as current Q&A (not in history yet)
-                if result.get("answers"):
-                    # Store all answers as a list
-                    st.session_state.current_qa = [
-                        {
-                            "question": ans.get("question", question),
-                            "summary": ans.get("summary", ""),
-                            "answer_raw": ans.get("answer_raw", ""),
-                            "points": ans.get("points", []),
-                            "sources": ans.get("sources", []),
-                        }
-                        for ans in result["answers"]
-                    ]
-                
-                st.rerun()
-                
-            except Exception as e:
-                st.error(f"❌ Error: {str(e)}")
+        try:
+            # retrieval runs before the first event; tokens are rendered as they arrive
+            with st.spinner("🧠 Thinking..."):
+                events = stream_multiple_questions(question, vectordb, filters=filters or None)
+                first_event = next(events)
+
+            answers = []
+            placeholders = {}
+            partial = {}
+            for event in chain([first_event], events):
+                data = event["data"]
+                if event["event"] == "question":
+                    st.markdown(f'<div class="question-bubble">❓ {data["question"]}</div>', unsafe_allow_html=True)
+                    placeholders[data["index"]] = st.empty()
+                    partial[data["index"]] = ""
+                elif event["event"] == "token":
+                    partial[data["index"]] += data["text"]
+                    placeholders[data["index"]].markdown(
+                        f'<div class="answer-bubble">{partial[data["index"]]}▌</div>', unsafe_allow_html=True
+                    )
+                elif event["event"] == "reset":
+                    # provider failed mid-answer: the fallback starts over
+                    partial[data["index"]] = ""
+                    placeholders[data["index"]].info(f"🔁 Switching to {data['provider']}...")
+                elif event["event"] == "answer":
+                    answers.append(data)
+            
+            # Store ALL answers as current Q&A (not in history yet)
+            if answers:
+                # Store all answers as a list
+                st.session_state.current_qa = [
+                    {
+                        "question": ans.get("question", question),
+                        "summary": ans.get("summary", ""),
+                        "answer_raw": ans.get("answer_raw", ""),
+                        "points": ans.get("points", []),
+                        "sources": ans.get("sources", []),
+                    }
+                    for ans in answers
+                ]
+            
+            st.rerun()
+            
+        except Exception as e:
+            st.error(f"❌ Error: {str(e)}")
 
 # ===================== CHAT HISTORY DISPLAY ===================== #
 st.markdown("---")
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import tiktoken
+
+# the LLM SDK clients need a key to be constructed; tests never reach the network
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+
+# offline providers and embeddings, no caches under data/; read by the modules
+# at import, so set before any test imports them
+os.environ.update(
+    LLM_PROVIDERS="fake-flaky,fake",
+    FAKE_LLM_TOKEN_DELAY="0",
+    FAKE_LLM_FAIL_AFTER="5",
+    FAKE_LLM_SLOW_DELAY="2",
+    FAKE_LLM_SLOW_RATE="1",
+    EMBED_BACKEND="fake",
+    EMBED_CACHE="0",
+    ANSWER_CACHE="0",
+    WARM_UP="0",
+    SLOW_QUERY_LOG="",
+)
+
+# tiktoken downloads cl100k_base on first use; the tests chunk with a byte-level
+# encoding instead (one token per UTF-8 byte), so they run offline
+_BYTES = tiktoken.Encoding(name="bytes", pat_str=r"\s+|\S+",
+                           mergeable_ranks={bytes([b]): b for b in range(256)}, special_tokens={})
+tiktoken.get_encoding = lambda name: _BYTES
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
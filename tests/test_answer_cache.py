@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+from answer_cache import AnswerCache
+
+DIM = 8
+
+
+def _unit(*values):
+    v = np.zeros(DIM, dtype="float32")
+    v[:len(values)] = values
+    return v / np.linalg.norm(v)
+
+
+ANSWER = {"answer": "Alpha.", "sources": ["a.txt"]}
+
+
+def test_similar_question_hits_and_dissimilar_misses():
+    cache = AnswerCache(path=None, threshold=0.95)
+    cache.store(_unit(1, 0), "v1", ANSWER, latency=2.0)
+
+    # cosine ~0.995 with the stored question
+    assert cache.lookup(_unit(1, 0.1), "v1") == ANSWER
+    # cosine ~0.71
+    assert cache.lookup(_unit(1, 1), "v1") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+    assert stats["latency_saved_s"] == 2.0
+
+
+def test_new_index_version_invalidates_entries():
+    cache = AnswerCache(path=None)
+    cache.store(_unit(1, 0), "v1", ANSWER, latency=1.0)
+
+    assert cache.lookup(_unit(1, 0), "v2") is None
+    assert cache.stats()["entries"] == 0
+    # dropped for good, not just hidden
+    assert cache.lookup(_unit(1, 0), "v1") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(path=None, max_entries=2)
+    cache.store(_unit(1), "v1", {"answer": "x"}, latency=1.0)
+    cache.store(_unit(0, 1), "v1", {"answer": "y"}, latency=1.0)
+    assert cache.lookup(_unit(1), "v1") == {"answer": "x"}
+
+    cache.store(_unit(0, 0, 1), "v1", {"answer": "z"}, latency=1.0)
+
+    assert cache.lookup(_unit(0, 1), "v1") is None
+    assert cache.lookup(_unit(1), "v1") == {"answer": "x"}
+    assert cache.lookup(_unit(0, 0, 1), "v1") == {"answer": "z"}
+
+
+def test_expired_entry_misses():
+    cache = AnswerCache(path=None, ttl=-1)
+    cache.store(_unit(1), "v1", ANSWER, latency=1.0)
+    assert cache.lookup(_unit(1), "v1") is None
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache" / "answers.pkl")
+    cache = AnswerCache(path=path, flush_interval=60)
+    cache.store(_unit(1), "v1", ANSWER, latency=1.0)
+    # stores only mark the cache dirty; the file is written by flush/close
+    assert not os.path.exists(path)
+    cache.close()
+
+    reopened = AnswerCache(path=path, flush_interval=60)
+    assert reopened.lookup(_unit(1), "v1") == ANSWER
+    # new keys do not overwrite the loaded ones
+    reopened.store(_unit(0, 1), "v1", {"answer": "y"}, latency=1.0)
+    assert reopened.stats()["entries"] == 2
+
+
+def test_answers_are_scoped_by_filters():
+    cache = AnswerCache(path=None)
+    cache.store(_unit(1), "v1", ANSWER, latency=1.0, scope="sources=a.txt")
+
+    assert cache.lookup(_unit(1), "v1") is None
+    assert cache.lookup(_unit(1), "v1", scope="sources=b.txt") is None
+    assert cache.lookup(_unit(1), "v1", scope="sources=a.txt") == ANSWER
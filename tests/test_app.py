@@ -0,0 +1,123 @@
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import rag_pipeline
+from jobs import QueueFull
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    # the app opens its store and upload folder under data/ of the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    try:
+        import app
+        yield app
+    finally:
+        os.chdir(cwd)
+
+
+class _Store:
+    """Stands in for a sharded store, where reading the document list is a call per shard"""
+
+    def __init__(self):
+        self.loop_running = None
+
+    @property
+    def documents(self):
+        try:
+            asyncio.get_running_loop()
+            self.loop_running = True
+        except RuntimeError:
+            self.loop_running = False
+        return {"a.txt": {"hash": "h", "chunks": 3}}
+
+
+def test_document_list_is_read_off_the_event_loop(app, monkeypatch):
+    store = _Store()
+    monkeypatch.setattr(app, "vectordb", store)
+
+    response = TestClient(app.app).get("/documents")
+    assert response.status_code == 200
+    assert response.json() == {"documents": {"a.txt": {"hash": "h", "chunks": 3}}}
+    assert store.loop_running is False
+
+
+def test_naive_filter_datetimes_are_utc(app, monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        filters = app.SearchFilters(sources=["a.txt"], since="2024-01-01T00:00:00",
+                                    until="2024-01-01T02:00:00+02:00").to_dict()
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert filters == {"sources": ["a.txt"], "since": 1704067200.0, "until": 1704067200.0}
+    assert app.SearchFilters().to_dict() is None
+
+
+class _SyncStore:
+    def __init__(self, documents):
+        self.documents = documents
+        self.deleted = []
+
+    def delete_source(self, source):
+        self.deleted.append(source)
+
+
+def test_sync_indexes_the_upload_folder(app, monkeypatch, tmp_path):
+    store = _SyncStore({"a.txt": {"hash": "h", "chunks": 3, "tags": ["x"]}, "gone.txt": {"hash": "g", "chunks": 1}})
+    indexed = []
+
+    def build_index(path, vectordb, tags=None):
+        source = os.path.basename(path)
+        indexed.append((source, tags))
+        if source == "a.txt":
+            return {"chunks_added": 0, "source": source, "skipped": True}
+        return {"chunks_added": 2, "source": source}
+
+    for name in ("a.txt", "b.txt"):
+        (tmp_path / name).write_text(name)
+    monkeypatch.setattr(app, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(app, "vectordb", store)
+    monkeypatch.setattr(rag_pipeline, "build_index", build_index)
+    client = TestClient(app.app)
+
+    response = client.post("/documents/sync")
+    assert response.status_code == 200
+    assert response.json() == {"status": "success", "indexed": [{"chunks_added": 2, "source": "b.txt"}],
+                               "unchanged": ["a.txt"], "deleted": ["gone.txt"]}
+    # a known file keeps its upload tags
+    assert indexed == [("a.txt", ["x"]), ("b.txt", None)]
+    assert store.deleted == ["gone.txt"]
+
+    assert client.post("/documents/sync", params={"delete_missing": "false"}).json()["deleted"] == []
+    assert store.deleted == ["gone.txt"]
+
+
+class _FullQueue:
+    def __init__(self, full):
+        self._full = full
+
+    def full(self):
+        return self._full
+
+    def submit(self, files, tags=None):
+        # another upload took the last slot after the check
+        raise QueueFull("Ingestion queue is full (1 jobs waiting)")
+
+
+@pytest.mark.parametrize("checked", [True, False], ids=["before-upload", "on-submit"])
+def test_full_queue_answers_429(app, monkeypatch, tmp_path, checked):
+    monkeypatch.setattr(app, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(app, "jobs", _FullQueue(full=checked))
+
+    response = TestClient(app.app).post("/upload", files={"file": ("a.txt", b"alpha")})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "30"
+    # an already full queue is refused before anything is written
+    assert os.listdir(tmp_path) == ([] if checked else ["a.txt"])
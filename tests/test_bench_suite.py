@@ -0,0 +1,24 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUITE = os.path.join(ROOT, "benchmarks", "bench_suite.py")
+# the components that need no tiktoken download
+ARGS = ["--chunks", "300", "--batch-rows", "100", "--queries", "5",
+        "--only", "add", "save", "load", "search_dense", "search_bm25", "hybrid_search"]
+
+
+def test_suite_runs_offline_and_compares_runs(tmp_path):
+    first, second = str(tmp_path / "first.json"), str(tmp_path / "second.json")
+    subprocess.run([sys.executable, SUITE, *ARGS, "--json", first], cwd=tmp_path, check=True,
+                   capture_output=True)
+    out = subprocess.run([sys.executable, SUITE, *ARGS, "--json", second, "--compare", first], cwd=tmp_path,
+                         check=True, capture_output=True, text=True).stdout
+
+    with open(second, encoding="utf-8") as f:
+        results = json.load(f)["results"]
+    assert list(results) == ["add", "save", "load", "search_dense", "search_bm25", "hybrid_search"]
+    assert all(r["p50_ms"] >= 0 for r in results.values())
+    assert "hybrid_search" in out
@@ -0,0 +1,158 @@
+import math
+
+import numpy as np
+import pytest
+
+from bm25_index import BM25Index, term_counts, tokenize
+
+DOCS = [
+    "the quick brown fox jumps over the lazy dog",
+    "a quick brown dog outpaces a quick fox",
+    "the lazy cat sleeps all day",
+    "foxes and dogs are not cats",
+    "brown is the colour of the fox and the dog",
+]
+
+
+def _reference_scores(docs, query, k1=1.5, b=0.75):
+    # textbook Okapi BM25 over the whole corpus (non-negative idf)
+    tokenized = [tokenize(d) for d in docs]
+    avgdl = sum(len(t) for t in tokenized) / len(tokenized)
+    scores = []
+    for tokens in tokenized:
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in t for t in tokenized)
+            if not df:
+                continue
+            tf = tokens.count(term)
+            idf = math.log((len(tokenized) - df + 0.5) / (df + 0.5) + 1.0)
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(tokens) / avgdl))
+        scores.append(score)
+    return np.array(scores, dtype="float32")
+
+
+@pytest.mark.parametrize("query", ["quick fox", "lazy dog", "the", "cats", "unknown words"])
+def test_scores_match_okapi_bm25(query):
+    index = BM25Index()
+    index.add(tokenize(d) for d in DOCS)
+
+    assert np.allclose(index.get_scores(tokenize(query)), _reference_scores(DOCS, query), atol=1e-5)
+
+
+def test_incremental_adds_equal_one_build():
+    whole = BM25Index()
+    whole.add(tokenize(d) for d in DOCS)
+
+    incremental = BM25Index()
+    for doc in DOCS:
+        incremental.add([tokenize(doc)])
+
+    assert len(incremental) == len(DOCS)
+    assert incremental.avgdl == pytest.approx(whole.avgdl)
+    for query in ("quick brown fox", "lazy cat", "dog"):
+        assert np.allclose(incremental.get_scores(tokenize(query)), whole.get_scores(tokenize(query)))
+
+
+def test_empty_index_scores_nothing():
+    assert len(BM25Index().get_scores(["fox"])) == 0
+
+
+def test_serialized_round_trip():
+    index = BM25Index(k1=1.2, b=0.5)
+    index.add(tokenize(d) for d in DOCS)
+
+    loaded = BM25Index.from_bytes(index.to_bytes())
+    assert (loaded.k1, loaded.b, len(loaded)) == (1.2, 0.5, len(DOCS))
+    assert np.array_equal(loaded.get_scores(tokenize("brown dog")), index.get_scores(tokenize("brown dog")))
+    # and keeps growing after the reload
+    loaded.add([tokenize("a brown fox")])
+    assert len(loaded) == len(DOCS) + 1
+
+
+def test_add_counts_equals_add():
+    by_tokens, by_counts = BM25Index(), BM25Index()
+    by_tokens.add(tokenize(d) for d in DOCS)
+    by_counts.add_counts(term_counts(tokenize(d)) for d in DOCS)
+    assert np.array_equal(by_counts.get_scores(tokenize("the fox")), by_tokens.get_scores(tokenize("the fox")))
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, 10])
+def test_top_k_matches_full_ranking(k):
+    index = BM25Index()
+    index.add(tokenize(d) for d in DOCS)
+    query = tokenize("quick brown lazy fox")
+
+    doc_ids, scores = index.top_k(query, k)
+    full = index.get_scores(query)
+    matching = np.flatnonzero(full)
+    expected = matching[np.argsort(-full[matching], kind="stable")][:k]
+
+    assert list(doc_ids) == list(expected)
+    assert np.allclose(scores, full[expected])
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_top_k_only_returns_matching_documents():
+    index = BM25Index()
+    index.add(tokenize(d) for d in DOCS)
+
+    doc_ids, _ = index.top_k(tokenize("cat"), 10)
+    assert list(doc_ids) == [2]
+    assert len(index.top_k(tokenize("unknown"), 10)[0]) == 0
+    assert len(index.top_k(tokenize("fox"), 0)[0]) == 0
+
+
+def test_excluded_documents_never_match():
+    index = BM25Index()
+    index.add(tokenize(d) for d in DOCS)
+    query = tokenize("brown fox")
+
+    doc_ids, _ = index.top_k(query, 10, exclude=np.array([0]))
+    assert 0 not in doc_ids
+    assert set(doc_ids) == set(index.top_k(query, 10)[0]) - {0}
+
+
+def test_compacted_equals_index_of_kept_documents():
+    index = BM25Index()
+    index.add(tokenize(d) for d in DOCS)
+    keep = np.array([i % 2 == 0 for i in range(len(DOCS))])
+
+    rebuilt = BM25Index()
+    rebuilt.add(tokenize(d) for d, k in zip(DOCS, keep) if k)
+    compacted = index.compacted(keep)
+
+    assert len(compacted) == len(rebuilt)
+    for query in ("brown fox", "the dog", "cat"):
+        assert np.allclose(compacted.get_scores(tokenize(query)), rebuilt.get_scores(tokenize(query)))
+
+
+def test_top_k_over_a_subset_of_documents():
+    index = BM25Index()
+    index.add(tokenize(d) for d in DOCS)
+    query = tokenize("brown fox dog")
+    full = index.get_scores(query)
+
+    doc_ids, scores = index.top_k(query, 10, only=np.array([1, 3]))
+    assert set(doc_ids) <= {1, 3}
+    assert np.allclose(scores, full[doc_ids])
+    assert len(index.top_k(query, 10, only=np.array([], dtype=np.int64))[0]) == 0
+
+
+def test_partitions_scored_with_merged_stats_equal_one_index():
+    whole = BM25Index()
+    whole.add(tokenize(d) for d in DOCS)
+    parts = [BM25Index(), BM25Index()]
+    parts[0].add(tokenize(d) for d in DOCS[:2])
+    parts[1].add(tokenize(d) for d in DOCS[2:])
+    query = tokenize("quick brown dog cat")
+
+    stats = BM25Index.merge_stats(p.term_stats(query) for p in parts)
+    assert stats == whole.term_stats(query)
+
+    scores = {}
+    for offset, part in zip((0, 2), parts):
+        doc_ids, part_scores = part.top_k(query, 10, stats=stats)
+        scores.update(zip((doc_ids + offset).tolist(), part_scores.tolist()))
+    doc_ids, expected = whole.top_k(query, 10)
+    assert scores == pytest.approx(dict(zip(doc_ids.tolist(), expected.tolist())))
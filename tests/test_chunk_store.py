@@ -0,0 +1,87 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from chunk_store import ChunkStore, ChunkTable, merge_chunk_stores, write_chunk_store
+
+
+def _chunks(source, n, start=0):
+    return [{"chunk_id": f"{source}_{i}", "source": source, "text": f"text {i} of {source} · ünïcode",
+             "page": i // 2} for i in range(start, start + n)]
+
+
+def _write(path, metadatas):
+    os.makedirs(path)
+    write_chunk_store(path, metadatas)
+    return ChunkStore(path)
+
+
+def test_round_trip_keeps_every_field(tmp_path):
+    metadatas = _chunks("a.pdf", 3) + _chunks("b.pdf", 2) + [{"chunk_id": "c_0", "source": "c", "text": ""}]
+    store = _write(str(tmp_path / "s"), metadatas)
+
+    assert len(store) == len(metadatas)
+    assert [store[i] for i in range(len(store))] == metadatas
+    assert store.sources == ["a.pdf", "b.pdf", "c"]
+    assert store.source(4) == "b.pdf"
+
+
+def test_empty_store(tmp_path):
+    store = _write(str(tmp_path / "s"), [])
+    assert len(store) == 0
+
+
+def test_merge_concatenates_and_reinterns_sources(tmp_path):
+    first = _write(str(tmp_path / "1"), _chunks("a", 2) + _chunks("b", 1))
+    second = _write(str(tmp_path / "2"), _chunks("b", 2, start=1) + _chunks("c", 1))
+
+    os.makedirs(tmp_path / "m")
+    merge_chunk_stores(str(tmp_path / "m"), [first, second])
+    merged = ChunkStore(str(tmp_path / "m"))
+
+    assert list(merged[i] for i in range(len(merged))) == \
+        [first[i] for i in range(len(first))] + [second[i] for i in range(len(second))]
+    assert merged.sources == ["a", "b", "c"]
+
+
+def test_table_addresses_rows_across_parts(tmp_path):
+    parts = [_write(str(tmp_path / str(i)), _chunks(f"doc{i}", n)) for i, n in enumerate((2, 3, 1))]
+    table = ChunkTable(parts)
+
+    assert len(table) == 6
+    assert [md["chunk_id"] for md in table] == ["doc0_0", "doc0_1", "doc1_0", "doc1_1", "doc1_2", "doc2_0"]
+    assert table[2]["chunk_id"] == "doc1_0"
+    assert table[-1]["chunk_id"] == "doc2_0"
+    assert table.source(4) == "doc1"
+    with pytest.raises(IndexError):
+        table[6]
+
+
+def test_replace_prefix_keeps_row_order(tmp_path):
+    parts = [_write(str(tmp_path / str(i)), _chunks(f"doc{i}", 2)) for i in range(3)]
+    table = ChunkTable(parts)
+    before = list(table)
+
+    os.makedirs(tmp_path / "m")
+    merge_chunk_stores(str(tmp_path / "m"), parts[:2])
+    table.replace_prefix(2, ChunkStore(str(tmp_path / "m")))
+
+    assert len(table.parts) == 2
+    assert list(table) == before
+
+
+def test_rows_stay_readable_after_the_files_are_deleted(tmp_path):
+    # compaction deletes merged parts while searches may still hold them
+    path = str(tmp_path / "s")
+    metadatas = _chunks("a.pdf", 3)
+    vectors = np.random.default_rng(0).random((3, 4), dtype=np.float32)
+    os.makedirs(path)
+    write_chunk_store(path, metadatas)
+    np.save(os.path.join(path, "vectors.npy"), vectors)
+    store = ChunkStore(path)
+
+    shutil.rmtree(path)
+    assert np.array_equal(store.vectors, vectors)
+    assert [store[i] for i in range(3)] == metadatas
@@ -0,0 +1,55 @@
+import pytest
+
+from chunker import chunk_pages, chunk_text, chunk_texts
+
+TEXT = "".join(f"Sentence number {i} is here. " for i in range(40))
+
+
+def _texts(chunks):
+    return [c["text"] for c in chunks]
+
+
+def test_windows_overlap_and_cover_the_text():
+    chunks = chunk_text(TEXT, chunk_size=100, overlap=20)
+
+    # the test encoding has one token per byte
+    assert all(len(c["text"]) == 100 for c in chunks[:-1])
+    assert chunks[0]["text"] == TEXT[:100]
+    assert (chunks[1]["start_token"], chunks[1]["end_token"]) == (80, 180)
+    assert "".join(c["text"][:80] for c in chunks) == TEXT
+
+
+@pytest.mark.parametrize("text", [TEXT, "Ünïcödé wörds → ✓ and ascii. " * 30])
+def test_offsets_point_into_the_document(text):
+    for sentence_aware in (False, True):
+        for c in chunk_text(text, chunk_size=64, overlap=16, sentence_aware=sentence_aware):
+            assert text[c["start_char"]:c["end_char"]] == c["text"]
+
+
+@pytest.mark.parametrize("page_size", [1, 7, 100, 333, len(TEXT)])
+@pytest.mark.parametrize("sentence_aware", [False, True])
+def test_pages_chunk_like_the_joined_text(page_size, sentence_aware):
+    pages = (TEXT[i:i + page_size] for i in range(0, len(TEXT), page_size))
+    assert (list(chunk_pages(pages, chunk_size=100, overlap=20, sentence_aware=sentence_aware))
+            == chunk_text(TEXT, chunk_size=100, overlap=20, sentence_aware=sentence_aware))
+
+
+def test_sentence_aware_cuts_end_on_a_sentence():
+    chunks = chunk_text(TEXT, chunk_size=100, overlap=20, sentence_aware=True)
+
+    for c in chunks[:-1]:
+        assert c["text"].rstrip().endswith(".")
+        assert 50 <= len(c["text"]) <= 100
+    # the next window starts `overlap` tokens before the cut
+    assert chunks[1]["start_token"] == chunks[0]["end_token"] - 20
+    assert chunks[-1]["end_char"] == len(TEXT)
+
+
+def test_batch_api_equals_one_text_at_a_time():
+    texts = [TEXT, "", "short text", TEXT[::-1]]
+    assert chunk_texts(texts, chunk_size=100, overlap=20) == [chunk_text(t, 100, 20) for t in texts]
+
+
+def test_empty_text_has_no_chunks():
+    assert chunk_text("") == []
+    assert list(chunk_pages([])) == []
@@ -0,0 +1,70 @@
+import context_builder
+from context_builder import build_context
+
+# the test encoding has one token per byte (see conftest)
+DOC = "".join(f"Line {i:03d} of the annual report. " for i in range(40))
+
+
+def _hit(start, end, source="report.txt"):
+    return {"source": source, "text": DOC[start:end], "start_char": start, "end_char": end}
+
+
+def test_overlapping_and_adjacent_chunks_are_sent_once():
+    hits = [
+        _hit(80, 180),
+        {"source": "notes.txt", "text": "No offsets here."},
+        _hit(0, 100),
+        _hit(300, 400),
+        {"source": "notes.txt", "text": "No offsets here."},
+        _hit(400, 450),
+    ]
+
+    text, stats = build_context(hits, max_tokens=10000)
+
+    # spans rank as their best hit
+    assert text.split("\n\n") == [
+        "[Source: report.txt] " + DOC[0:180],
+        "[Source: notes.txt] No offsets here.",
+        "[Source: report.txt] " + DOC[300:450],
+    ]
+    assert (stats["chunks"], stats["spans"], stats["truncated"], stats["tokens_dropped"]) == (5, 3, 0, 0)
+    assert stats["tokens"] == len(text.encode("utf-8")) - 2
+    naive = sum(len(("[Source: %s] " % h["source"] + h["text"]).encode("utf-8")) for h in hits) + len(hits) - 1
+    assert stats["tokens_saved"] == naive - stats["tokens"]
+
+
+def test_spans_are_cut_to_fit_the_budget():
+    hits = [_hit(0, 200), _hit(500, 700), _hit(1000, 1020)]
+    header = "[Source: report.txt] "
+
+    text, stats = build_context(hits, max_tokens=300)
+
+    # what is left of the budget goes to the second span, cut at a token;
+    # nothing is left for the third
+    assert text == header + DOC[0:200] + "\n\n" + (header + DOC[500:700])[:78]
+    assert (stats["spans"], stats["truncated"], stats["tokens"]) == (2, 1, 300)
+    merged = 2 * (len(header) + 200) + len(header) + 20 + 2
+    assert stats["tokens_dropped"] == merged - 300
+
+
+def test_smaller_later_span_fills_the_budget():
+    hits = [_hit(0, 200), _hit(500, 700), _hit(1000, 1020)]
+    header = "[Source: report.txt] "
+
+    # too little room to cut the second span to MIN_SPAN_TOKENS, enough for the third
+    text, stats = build_context(hits, max_tokens=len(header) + 200 + 1 + 45)
+
+    assert text == header + DOC[0:200] + "\n\n" + header + DOC[1000:1020]
+    assert (stats["chunks"], stats["truncated"]) == (2, 0)
+
+
+def test_totals_accumulate_over_contexts(monkeypatch):
+    monkeypatch.setattr(context_builder, "totals", dict.fromkeys(context_builder.totals, 0))
+
+    build_context([_hit(0, 100), _hit(50, 150)], max_tokens=1000)
+    build_context([], max_tokens=1000)
+
+    stats = context_builder.context_stats()
+    assert (stats["contexts"], stats["chunks"]) == (2, 2)
+    assert stats["tokens_saved"] > 0
+    assert stats["avg_tokens_saved"] == stats["tokens_saved"] / 2
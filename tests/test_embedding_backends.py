@@ -0,0 +1,90 @@
+import numpy as np
+import onnx
+import pytest
+from onnx import TensorProto, helper, numpy_helper
+from tokenizers import Tokenizer, models, pre_tokenizers
+
+from embedding_backends import OnnxBackend, make_backend
+
+WORDS = ["[PAD]", "[UNK]", "[CLS]"] + [f"w{i}" for i in range(20)]
+DIM = 8
+
+
+@pytest.fixture
+def onnx_path(tmp_path):
+    """
+    A tiny exported model in the layout of export_onnx: the hidden state of
+    a token is its embedding plus the sum over the unmasked tokens, so
+    padding leaks into the output unless the attention mask covers it.
+    """
+    tokenizer = Tokenizer(models.WordLevel({w: i for i, w in enumerate(WORDS)}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    tokenizer.save(str(tmp_path / "tokenizer.json"))
+
+    table = np.random.default_rng(0).normal(size=(len(WORDS), DIM)).astype(np.float32)
+    nodes = [
+        helper.make_node("Gather", ["table", "input_ids"], ["tokens"]),
+        helper.make_node("Cast", ["attention_mask"], ["mask"], to=TensorProto.FLOAT),
+        helper.make_node("Unsqueeze", ["mask", "last_axis"], ["mask3"]),
+        helper.make_node("Mul", ["tokens", "mask3"], ["masked"]),
+        helper.make_node("ReduceSum", ["masked", "token_axis"], ["total"], keepdims=1),
+        helper.make_node("Add", ["tokens", "total"], ["last_hidden_state"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "tiny",
+        [helper.make_tensor_value_info(name, TensorProto.INT64, ["batch", "tokens"])
+         for name in ("input_ids", "attention_mask")],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "tokens", DIM])],
+        [numpy_helper.from_array(table, "table"), numpy_helper.from_array(np.array([2]), "last_axis"),
+         numpy_helper.from_array(np.array([1]), "token_axis")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    onnx.save(model, str(tmp_path / "model_int8.onnx"))
+    return str(tmp_path)
+
+
+TEXTS = ["[CLS] w1", "[CLS] w2 w3 w4 w5 w6", "[CLS] w7 w8", "[CLS]", "[CLS] w9 w10 w11 w12", "[CLS] w1 w2 w3"]
+
+
+def test_length_sorted_batches_equal_one_text_at_a_time(onnx_path):
+    backend = OnnxBackend("tiny", path=onnx_path, batch_size=2)
+
+    vectors = backend.encode(TEXTS)
+
+    assert vectors.shape == (len(TEXTS), DIM) and vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    alone = np.vstack([backend.encode([t]) for t in TEXTS])
+    assert np.allclose(vectors, alone, atol=1e-6)
+    unsorted = OnnxBackend("tiny", path=onnx_path, batch_size=2, sort_by_length=False)
+    assert np.allclose(unsorted.encode(TEXTS), vectors, atol=1e-6)
+
+
+def test_empty_input(onnx_path):
+    assert len(OnnxBackend("tiny", path=onnx_path).encode([])) == 0
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown embedding backend"):
+        make_backend("tensorflow", "model")
+
+
+def test_fake_backend_is_deterministic_and_normalized():
+    backend = make_backend("fake", "any-model", dim=64)
+
+    vectors = backend.encode(["alpha beta", "alpha beta", "beta alpha gamma", "delta", ""])
+
+    assert vectors.shape == (5, 64) and vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:4], axis=1), 1.0)
+    assert not vectors[4].any()
+    np.testing.assert_array_equal(vectors[0], vectors[1])
+    # texts sharing words are similar
+    assert vectors[0] @ vectors[2] > vectors[0] @ vectors[3]
+
+
+def test_queries_embed_like_texts():
+    import embeddings
+
+    texts = ["what is alpha", "beta and gamma"]
+    assert embeddings.embed_queries(texts) == embeddings.embed_texts(texts)
+    assert len(embeddings.embed_texts(texts)[0]) == 384
@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, text_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).random(4, dtype=np.float32)
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = EmbeddingCache("model", path=None, max_entries=2)
+    a, b, c = (text_key(t) for t in ("a", "b", "c"))
+    cache.put_many([(a, _vector(0)), (b, _vector(1))])
+    assert cache.get_many([a]).keys() == {a}
+
+    cache.put_many([(c, _vector(2))])
+
+    assert cache.get_many([a, b, c]).keys() == {a, c}
+
+
+def test_vectors_round_trip_through_disk(tmp_path):
+    path = str(tmp_path / "cache" / "embeddings.sqlite")
+    keys = [text_key(f"text {i}") for i in range(3)]
+    EmbeddingCache("model", path=path).put_many((k, _vector(i)) for i, k in enumerate(keys))
+
+    reopened = EmbeddingCache("model", path=path)
+    found = reopened.get_many(keys + [text_key("never seen")])
+
+    assert found.keys() == set(keys)
+    for i, k in enumerate(keys):
+        assert found[k].dtype == np.float32
+        np.testing.assert_array_equal(found[k], _vector(i))
+    # other models never see these vectors
+    assert EmbeddingCache("other-model", path=path).get_many(keys) == {}
+
+
+def test_more_misses_than_one_sqlite_query_binds(tmp_path):
+    cache = EmbeddingCache("model", path=str(tmp_path / "embeddings.sqlite"), max_entries=10)
+    keys = [text_key(str(i)) for i in range(1200)]
+    cache.put_many((k, _vector(0)) for k in keys)
+
+    # most keys were evicted from memory and are read back from disk
+    assert len(cache.get_many(keys)) == len(keys)
+
+
+def test_cache_file_is_opened_on_first_embed(tmp_path):
+    code = (f"import os, sys; sys.path.insert(0, {ROOT!r}); import embeddings; "
+            "print(os.path.exists('data')); embeddings.embed_texts(['alpha']); "
+            "print(os.path.exists('data/cache/embeddings.sqlite'))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env={**os.environ, "EMBED_CACHE": "1"},
+                         capture_output=True, text=True, check=True).stdout
+    assert out.split() == ["False", "True"]
+
+
+def test_queries_skip_the_disk_cache(monkeypatch):
+    import embeddings
+
+    class NoDisk:
+        def get(self):
+            raise AssertionError("the query path opened the disk cache")
+
+    monkeypatch.setattr(embeddings, "cache", NoDisk())
+    monkeypatch.setattr(embeddings, "query_cache", EmbeddingCache("model", path=None, max_entries=8))
+    model = embeddings.model.get()
+    encode, encoded = model.encode, []
+    monkeypatch.setattr(model, "encode", lambda texts: encoded.append(list(texts)) or encode(texts))
+
+    first = embeddings.embed_queries(["what is alpha", "what is alpha", "beta"])
+    # a recent question comes from memory
+    assert embeddings.embed_queries(["beta"]) == [first[2]]
+    assert encoded == [["what is alpha", "beta"]]
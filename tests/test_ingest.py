@@ -0,0 +1,112 @@
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import ingest
+from vectordb import VectorStore
+
+DIM = 32
+
+
+def _embed(texts):
+    # hashed bag of words, like the vector store tests
+    out = np.zeros((len(texts), DIM), dtype="float32")
+    for i, text in enumerate(texts):
+        for tok in text.lower().split():
+            out[i, zlib.crc32(tok.encode("utf-8")) % DIM] += 1.0
+    return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return VectorStore(DIM, index_path=str(tmp_path / "index" / "faiss.index"),
+                       meta_path=str(tmp_path / "index" / "meta.pkl"), purge_ratio=1.0)
+
+
+@pytest.fixture
+def engine(store, monkeypatch):
+    monkeypatch.setattr(ingest, "embed_texts", _embed)
+    monkeypatch.setattr(ingest, "EMBED_BATCH_SIZE", 4)
+    engine = ingest.IngestEngine(store, workers=3, batch_rows=64)
+    # worker threads instead of processes, speaking the same protocol over the results queue
+    pool = ThreadPoolExecutor(3)
+    monkeypatch.setattr(engine, "_get_pool", lambda: pool)
+    monkeypatch.setattr(ingest, "_results", engine._results)
+    yield engine
+    pool.shutdown()
+
+
+def _file(tmp_path, name, topic, words=600):
+    path = tmp_path / name
+    path.write_text(" ".join(f"{topic} word{i % 50}." for i in range(words)), encoding="utf-8")
+    return str(path)
+
+
+def test_files_are_ingested_through_one_writer(engine, store, tmp_path, monkeypatch):
+    writers = set()
+    write = store.write
+
+    def recording_write(*args, **kwargs):
+        writers.add(threading.current_thread().name)
+        return write(*args, **kwargs)
+
+    monkeypatch.setattr(store, "write", recording_write)
+    paths = [_file(tmp_path, f"doc{d}.txt", f"topic{d}") for d in range(5)]
+
+    results = [f.result(timeout=30) for f in [engine.submit(p) for p in paths]]
+
+    assert writers == {"ingest-writer"}
+    for d, (path, result) in enumerate(zip(paths, results)):
+        source = f"doc{d}.txt"
+        assert result["source"] == source and result["chunks_added"] > 4
+        assert store.document_hash(source) == ingest.file_hash(path)
+        assert store.documents[source]["chunks"] == result["chunks_added"]
+        assert len(store.metadata.rows_of(source)) == result["chunks_added"]
+        assert {h["source"] for h in store.search_bm25(f"topic{d}", 10)} == {source}
+
+    # unchanged files are skipped
+    assert engine.submit(paths[0]).result(timeout=30)["skipped"]
+
+
+def test_tags_are_recorded_on_the_document(engine, store, tmp_path):
+    engine.submit(_file(tmp_path, "a.txt", "alpha"), tags=["hr", "2024"]).result(timeout=30)
+    engine.submit(_file(tmp_path, "b.txt", "beta")).result(timeout=30)
+
+    assert store.documents["a.txt"]["tags"] == ["hr", "2024"]
+    assert store.filter_sources({"tags": ["hr"]}) == ["a.txt"]
+
+
+def test_changed_file_replaces_its_chunks(engine, store, tmp_path):
+    path = _file(tmp_path, "doc.txt", "old")
+    engine.submit(path).result(timeout=30)
+
+    _file(tmp_path, "doc.txt", "new", words=100)
+    result = engine.submit(path).result(timeout=30)
+
+    assert store.search_bm25("old", 10) == []
+    assert len(store.search_bm25("new", 100)) == result["chunks_added"] == store.documents["doc.txt"]["chunks"]
+
+
+def test_failed_file_is_reported_and_not_recorded(engine, store, tmp_path, monkeypatch):
+    iter_document = ingest.iter_document
+
+    def failing(file_path):
+        pages = iter_document(file_path)
+        yield next(pages)
+        if "bad" in file_path:
+            raise ValueError("unreadable page")
+        yield from pages
+
+    monkeypatch.setattr(ingest, "iter_document", failing)
+    bad = engine.submit(_file(tmp_path, "bad.txt", "broken"))
+    good = engine.submit(_file(tmp_path, "good.txt", "fine"))
+
+    with pytest.raises(ValueError, match="unreadable page"):
+        bad.result(timeout=30)
+    assert good.result(timeout=30)["chunks_added"] > 0
+    # retried on the next upload
+    assert store.document_hash("bad.txt") is None
+    assert store.document_hash("good.txt") is not None
@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from jobs import JobQueue, QueueFull
+
+
+class _Engine:
+    """
+    Stands in for IngestEngine: files finish when the test releases them,
+    paths containing "bad" fail.
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.submitted = []
+        self.tags = {}
+
+    def submit(self, file_path, progress=None, tags=None):
+        self.submitted.append(file_path)
+        self.tags[file_path] = tags
+        future = Future()
+
+        def finish():
+            self.release.wait()
+            if progress:
+                progress(1, 3)
+            if "bad" in file_path:
+                future.set_exception(ValueError(f"Failed to load document: {file_path}"))
+            else:
+                future.set_result({"chunks_added": 3, "source": file_path, "pages": 1})
+
+        threading.Thread(target=finish, daemon=True).start()
+        return future
+
+
+def _wait(jobs, job_id, status, timeout=5.0):
+    deadline = time.time() + timeout
+    while jobs.get(job_id)["status"] != status:
+        assert time.time() < deadline, jobs.get(job_id)
+        time.sleep(0.01)
+    return jobs.get(job_id)
+
+
+def test_full_queue_refuses_new_jobs(tmp_path):
+    engine = _Engine()
+    jobs = JobQueue(engine, path=str(tmp_path / "jobs.json"), workers=1, max_queued=2)
+
+    running = jobs.submit([("a.txt", "a.txt")])
+    _wait(jobs, running["id"], "running")
+    queued = [jobs.submit([(f"{n}.txt", f"{n}.txt")]) for n in "bc"]
+
+    # the endpoints check this before writing any file, and answer 429 on QueueFull
+    assert jobs.full()
+    with pytest.raises(QueueFull):
+        jobs.submit([("d.txt", "d.txt")])
+    assert jobs.stats()["queued"] == 2
+
+    engine.release.set()
+    for job in [running, *queued]:
+        _wait(jobs, job["id"], "completed")
+    assert not jobs.full()
+    assert engine.submitted == ["a.txt", "b.txt", "c.txt"]
+
+
+def test_job_reports_every_file(tmp_path):
+    engine = _Engine()
+    engine.release.set()
+    jobs = JobQueue(engine, path=str(tmp_path / "jobs.json"), workers=1)
+
+    job = jobs.submit([("good.txt", "/up/good.txt"), ("bad.txt", "/up/bad.txt")], tags=["hr"])
+    job = _wait(jobs, job["id"], "completed")
+
+    good, bad = job["files"]
+    assert (good["status"], good["chunks"], good["pages"], good["error"]) == ("done", 3, 1, None)
+    assert bad["status"] == "failed" and "bad.txt" in bad["error"]
+    # server-side paths are not reported
+    assert "path" not in good
+    assert job["tags"] == ["hr"]
+    assert engine.tags == {"/up/good.txt": ["hr"], "/up/bad.txt": ["hr"]}
+
+    job = _wait(jobs, jobs.submit([("bad.txt", "/up/bad.txt")])["id"], "failed")
+    assert job["finished"] >= job["started"] >= job["created"]
+
+
+def test_interrupted_job_is_resumed_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.json")
+    engine = _Engine()
+    job = JobQueue(engine, path=path, workers=1).submit([("a.txt", "a.txt")])
+    time.sleep(0.1)
+
+    # a file recorded as done before the restart is not run again
+    with open(path, encoding="utf-8") as f:
+        records = json.load(f)
+    records[0]["files"].append({**records[0]["files"][0], "filename": "b.txt", "path": "b.txt", "status": "done"})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records, f)
+
+    resumed = _Engine()
+    resumed.release.set()
+    jobs = JobQueue(resumed, path=path, workers=1)
+
+    assert [f["status"] for f in _wait(jobs, job["id"], "completed")["files"]] == ["done", "done"]
+    assert resumed.submitted == ["a.txt"]
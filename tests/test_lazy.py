@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import lazy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    # the module-level state is shared with the real models and clients
+    monkeypatch.setattr(lazy, "registry", {})
+    monkeypatch.setattr(lazy, "load_times", {})
+    monkeypatch.setattr(lazy, "errors", {})
+
+
+def test_concurrent_first_callers_share_one_load():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.1)
+        return object()
+
+    holder = lazy.Lazy("model", factory)
+    assert not holder.loaded
+    values = []
+    threads = [threading.Thread(target=lambda: values.append(holder.get())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len({id(v) for v in values}) == 1
+    assert holder.loaded and lazy.load_times["model"] >= 0.1
+
+
+def test_failed_warm_up_is_reported_and_retried_on_first_use():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("model download failed")
+        return "model"
+
+    holder = lazy.Lazy("model", flaky)
+    lazy.Lazy("tokenizer", lambda: "tokenizer")
+
+    status = lazy.warm_up()
+    assert status["loaded"] == ["tokenizer"]
+    assert status["pending"] == ["model"]
+    assert status["errors"] == {"model": "OSError: model download failed"}
+    assert not lazy.ready()
+    assert lazy.ready(["tokenizer"])
+
+    # loaded on first use: the error is cleared and the registry is ready
+    assert holder.get() == "model"
+    assert lazy.status()["errors"] == {}
+    assert lazy.ready()
+
+
+def test_warm_up_retries_failed_loads_with_backoff(monkeypatch):
+    attempts = []
+    delays = []
+    monkeypatch.setattr(lazy.time, "sleep", delays.append)
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 4:
+            raise OSError("model download failed")
+        return "model"
+
+    lazy.Lazy("model", flaky)
+
+    status = lazy.warm_up(retry=True, max_delay=3.0)
+    assert status["loaded"] == ["model"]
+    assert status["errors"] == {}
+    assert len(attempts) == 4
+    assert delays == [1.0, 2.0, 3.0]
+
+
+def test_warm_up_of_selected_names():
+    lazy.Lazy("a", lambda: 1)
+    lazy.Lazy("b", lambda: 2)
+
+    assert lazy.warm_up(["a"])["pending"] == ["b"]
+
+
+def test_importing_the_app_loads_no_model_or_sdk(tmp_path):
+    heavy = ["torch", "sentence_transformers", "google.genai", "groq", "unstructured", "fitz"]
+    code = (f"import sys; sys.path.insert(0, {ROOT!r}); import app; "
+            f"print([m for m in {heavy!r} if m in sys.modules])")
+    # the app creates its data folders in the working directory
+    out = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env={**os.environ, "WARM_UP": "0"},
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
@@ -0,0 +1,270 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import llm_api
+import llm_fake
+import llm_groq
+import llm_router
+import metrics
+import prompts
+
+QUESTION = "What are alpha and beta?"
+CONTEXT = "Alpha is the first letter of the Greek alphabet.\n\nBeta is the second one."
+ANSWER = llm_fake.generate_answer_fake(QUESTION, CONTEXT)
+
+
+@pytest.fixture
+def router(monkeypatch):
+    """
+    Configures the router as LLM_PROVIDERS/LLM_TIMEOUT/LLM_HEDGE would at
+    import, with fresh provider health (small breaker threshold and cooldown).
+    """
+    def configure(providers, timeout=30.0, hedge=False, failures=2, cooldown=0.2):
+        chain = providers.split(",")
+        monkeypatch.setenv("LLM_PROVIDERS", providers)
+        monkeypatch.setattr(llm_router, "PROVIDER_CHAIN", chain)
+        monkeypatch.setattr(llm_router, "LLM_TIMEOUT", timeout)
+        monkeypatch.setattr(llm_router, "LLM_HEDGE", hedge)
+        monkeypatch.setattr(llm_router, "_health", {
+            name: llm_router.ProviderHealth(name, failures=failures, cooldown=cooldown) for name in chain})
+        return llm_router
+    return configure
+
+
+def _count(metric, **labels):
+    return metric._values.get(metric._key(labels), 0)
+
+
+def _outcomes(route):
+    return [(a["provider"], a["outcome"]) for a in route["attempts"]]
+
+
+async def _collect(stream):
+    return [event async for event in stream]
+
+
+def test_providers_share_one_prompt():
+    assert llm_api.build_prompt is llm_groq.build_prompt is prompts.build_prompt
+    prompt = prompts.build_prompt(QUESTION, CONTEXT)
+    assert prompt.index(CONTEXT) < prompt.index(QUESTION)
+
+
+# ---------------- mid-stream fallback ---------------- #
+def test_stream_resets_when_provider_fails_mid_answer(router, caplog):
+    r = router("fake-flaky,fake")
+    fallbacks = _count(metrics.LLM_FALLBACKS, provider="fake-flaky", to="fake")
+
+    route = {}
+    events = list(r.stream_answer_with_fallback(QUESTION, CONTEXT, route))
+
+    reset = events.index(("reset", "fake"))
+    assert reset == llm_fake.FLAKY_FAIL_AFTER
+    assert all(kind == "token" for kind, _ in events[:reset])
+    assert "".join(text for _, text in events[reset + 1:]) == ANSWER
+    assert route["provider"] == "fake"
+    assert _outcomes(route) == [("fake-flaky", "error"), ("fake", "ok")]
+    assert _count(metrics.LLM_FALLBACKS, provider="fake-flaky", to="fake") == fallbacks + 1
+    assert "fake-flaky failed, switching to fake fallback" in caplog.messages
+
+
+def test_astream_resets_when_provider_fails_mid_answer(router):
+    r = router("fake-flaky,fake")
+
+    route = {}
+    events = asyncio.run(_collect(r.astream_answer_with_fallback(QUESTION, CONTEXT, route)))
+
+    reset = events.index(("reset", "fake"))
+    assert reset == llm_fake.FLAKY_FAIL_AFTER
+    assert "".join(text for _, text in events[reset + 1:]) == ANSWER
+    assert _outcomes(route) == [("fake-flaky", "error"), ("fake", "ok")]
+
+
+def test_stream_without_tokens_falls_back_without_reset(router):
+    r = router("fake-slow,fake", timeout=0.2)
+
+    route = {}
+    events = list(r.stream_answer_with_fallback(QUESTION, CONTEXT, route))
+
+    assert all(kind == "token" for kind, _ in events)
+    assert "".join(text for _, text in events) == ANSWER
+    assert _outcomes(route) == [("fake-slow", "timeout"), ("fake", "ok")]
+
+
+# ---------------- circuit breaker ---------------- #
+def test_circuit_opens_after_failures_in_a_row(router):
+    r = router("fake-flaky,fake", failures=2, cooldown=60)
+    skips = _count(metrics.LLM_SKIPS, provider="fake-flaky")
+
+    for _ in range(2):
+        assert r.generate_answer_with_fallback(QUESTION, CONTEXT) == ANSWER
+    assert r.health("fake-flaky").state == "open"
+    assert _count(metrics.LLM_CIRCUIT, provider="fake-flaky") == 2
+
+    route = {}
+    assert r.generate_answer_with_fallback(QUESTION, CONTEXT, route) == ANSWER
+    assert route["skipped"] == ["fake-flaky"]
+    assert _outcomes(route) == [("fake", "ok")]
+    assert _count(metrics.LLM_SKIPS, provider="fake-flaky") == skips + 1
+
+
+def test_half_open_trial_failure_reopens_circuit(router):
+    r = router("fake-flaky,fake", failures=1, cooldown=0.2)
+
+    r.generate_answer_with_fallback(QUESTION, CONTEXT)
+    assert r.health("fake-flaky").state == "open"
+
+    time.sleep(0.25)
+    route = {}
+    assert r.generate_answer_with_fallback(QUESTION, CONTEXT, route) == ANSWER
+    assert _outcomes(route) == [("fake-flaky", "error"), ("fake", "ok")]
+    assert r.health("fake-flaky").state == "open"
+
+
+def test_half_open_trial_success_closes_circuit(router, monkeypatch):
+    r = router("fake-flaky,fake", failures=1, cooldown=0.2)
+
+    r.generate_answer_with_fallback(QUESTION, CONTEXT)
+    assert r.health("fake-flaky").state == "open"
+
+    # the provider recovers; its state is observed during the trial call
+    seen = []
+
+    def recovered(question, context, **kwargs):
+        seen.append(r.health("fake-flaky").state)
+        return llm_fake.generate_answer_fake(question, context, **kwargs)
+
+    monkeypatch.setitem(r.PROVIDERS, "fake-flaky", {**r.PROVIDERS["fake-flaky"], "generate": recovered})
+    time.sleep(0.25)
+    route = {}
+    assert r.generate_answer_with_fallback(QUESTION, CONTEXT, route) == ANSWER
+
+    assert seen == ["half-open"]
+    assert route["provider"] == "fake-flaky"
+    assert r.health("fake-flaky").state == "closed"
+    assert _count(metrics.LLM_CIRCUIT, provider="fake-flaky") == 0
+
+
+def test_every_circuit_open_still_calls_the_chain(router):
+    r = router("fake-flaky", failures=1, cooldown=60)
+
+    with pytest.raises(RuntimeError):
+        r.generate_answer_with_fallback(QUESTION, CONTEXT)
+    route = {}
+    with pytest.raises(RuntimeError):
+        r.generate_answer_with_fallback(QUESTION, CONTEXT, route)
+    assert route["skipped"] == []
+    assert _outcomes(route) == [("fake-flaky", "error")]
+
+
+# ---------------- deadlines ---------------- #
+def test_deadline_hands_over_to_fallback(router):
+    r = router("fake-slow,fake", timeout=0.2)
+
+    route = {}
+    start = time.perf_counter()
+    assert r.generate_answer_with_fallback(QUESTION, CONTEXT, route) == ANSWER
+    assert time.perf_counter() - start < llm_fake.SLOW_DELAY
+    assert _outcomes(route) == [("fake-slow", "timeout"), ("fake", "ok")]
+    assert route["provider"] == "fake"
+
+
+def test_async_deadline_hands_over_to_fallback(router):
+    r = router("fake-slow,fake", timeout=0.2)
+
+    route = {}
+    start = time.perf_counter()
+    assert asyncio.run(r.agenerate_answer_with_fallback(QUESTION, CONTEXT, route)) == ANSWER
+    assert time.perf_counter() - start < llm_fake.SLOW_DELAY
+    assert _outcomes(route) == [("fake-slow", "timeout"), ("fake", "ok")]
+
+
+def test_deadline_is_reported_when_no_fallback_answers(router):
+    r = router("fake-slow", timeout=0.2)
+
+    with pytest.raises(TimeoutError):
+        r.generate_answer_with_fallback(QUESTION, CONTEXT)
+
+
+def test_fake_client_timeout_cuts_the_stall_short():
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        llm_fake.generate_answer_fake(QUESTION, CONTEXT, delay=llm_fake.SLOW_DELAY, timeout=0.1)
+    assert time.perf_counter() - start < llm_fake.SLOW_DELAY
+
+
+# ---------------- isolation ---------------- #
+def test_hung_provider_only_ties_up_its_own_threads(router):
+    r = router("fake-slow,fake", timeout=0.2)
+    release = threading.Event()
+    hung = [r._pool("fake-slow").submit(release.wait) for _ in range(r._limit("fake-slow"))]
+    try:
+        route = {}
+        start = time.perf_counter()
+        assert r.generate_answer_with_fallback(QUESTION, CONTEXT, route) == ANSWER
+        assert time.perf_counter() - start < llm_fake.SLOW_DELAY
+        assert _outcomes(route) == [("fake-slow", "timeout"), ("fake", "ok")]
+    finally:
+        release.set()
+    for call in hung:
+        call.result()
+
+
+def test_concurrency_slots_work_on_every_event_loop(router):
+    r = router("fake")
+
+    async def burst():
+        # more calls than slots: callers wait on the semaphore
+        calls = [r.agenerate_answer_with_fallback(QUESTION, CONTEXT) for _ in range(r._limit("fake") + 4)]
+        return await asyncio.gather(*calls)
+
+    # a second loop (another asyncio.run) gets its own semaphores
+    for _ in range(2):
+        assert asyncio.run(burst()) == [ANSWER] * (r._limit("fake") + 4)
+
+
+# ---------------- hedging ---------------- #
+def _warm_latencies(r, name, seconds):
+    for _ in range(llm_router.HEDGE_MIN_SAMPLES):
+        r.health(name).record("ok", seconds)
+
+
+def test_slow_call_is_hedged_with_next_provider(router):
+    r = router("fake-slow,fake", timeout=30, hedge=True)
+    _warm_latencies(r, "fake-slow", 0.05)
+    won = _count(metrics.LLM_HEDGES, provider="fake", result="won")
+
+    route = {}
+    start = time.perf_counter()
+    assert asyncio.run(r.agenerate_answer_with_fallback(QUESTION, CONTEXT, route)) == ANSWER
+    assert time.perf_counter() - start < llm_fake.SLOW_DELAY
+
+    assert route["hedged"] == "fake"
+    assert route["provider"] == "fake"
+    assert sorted(_outcomes(route)) == [("fake", "ok"), ("fake-slow", "cancelled")]
+    assert _count(metrics.LLM_HEDGES, provider="fake", result="won") == won + 1
+    # a lost race says nothing about the provider: its circuit stays closed
+    assert r.health("fake-slow").state == "closed"
+
+
+def test_sync_slow_call_is_hedged_with_next_provider(router):
+    r = router("fake-slow,fake", timeout=30, hedge=True)
+    _warm_latencies(r, "fake-slow", 0.05)
+
+    route = {}
+    start = time.perf_counter()
+    assert r.generate_answer_with_fallback(QUESTION, CONTEXT, route) == ANSWER
+    assert time.perf_counter() - start < llm_fake.SLOW_DELAY
+    assert route["hedged"] == "fake"
+    assert route["provider"] == "fake"
+
+
+def test_no_hedge_before_enough_samples(router):
+    r = router("fake,fake-flaky", hedge=True)
+
+    route = {}
+    assert r.generate_answer_with_fallback(QUESTION, CONTEXT, route) == ANSWER
+    assert route["hedged"] is None
+    assert _outcomes(route) == [("fake", "ok")]
@@ -0,0 +1,108 @@
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import llm_router
+import metrics
+
+QUESTION = "What are alpha and beta?"
+CONTEXT = "Alpha is the first letter of the Greek alphabet.\n\nBeta is the second one."
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # the app opens its store and upload folder under data/ of the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    try:
+        import app
+        yield TestClient(app.app)
+    finally:
+        os.chdir(cwd)
+
+
+def _scrape(client) -> dict:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_render_exposition_format():
+    counter = metrics.Counter("test_events_total", "Test events", ["kind"])
+    histogram = metrics.Histogram("test_seconds", "Test durations", buckets=(0.1, 1.0))
+    counter.inc(kind='a "quoted"\nvalue')
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    text = metrics.render()
+    assert "# TYPE test_events_total counter" in text
+    assert 'test_events_total{kind="a \\"quoted\\"\\nvalue"} 1' in text
+    assert 'test_seconds_bucket{le="0.1"} 0' in text
+    assert 'test_seconds_bucket{le="1.0"} 1' in text
+    assert 'test_seconds_bucket{le="+Inf"} 2' in text
+    assert "test_seconds_sum 5.5" in text
+    assert "test_seconds_count 2" in text
+
+
+def test_metrics_count_fallback_events(client, monkeypatch):
+    monkeypatch.setattr(llm_router, "PROVIDER_CHAIN", ["fake-flaky", "fake"])
+    monkeypatch.setattr(llm_router, "_health", {
+        name: llm_router.ProviderHealth(name, failures=1, cooldown=60) for name in ("fake-flaky", "fake")})
+    before = _scrape(client)
+
+    events = list(llm_router.stream_answer_with_fallback(QUESTION, CONTEXT))
+    assert ("reset", "fake") in events
+    # the circuit of fake-flaky is now open: skipped
+    llm_router.generate_answer_with_fallback(QUESTION, CONTEXT)
+
+    after = _scrape(client)
+
+    def delta(sample):
+        return after.get(sample, 0) - before.get(sample, 0)
+
+    assert delta('llm_fallbacks_total{provider="fake-flaky",to="fake"}') == 1
+    assert delta('llm_answers_total{provider="fake"}') == 2
+    assert delta('llm_circuit_skips_total{provider="fake-flaky"}') == 1
+    assert delta('llm_request_seconds_count{provider="fake-flaky",outcome="error"}') == 1
+    assert delta('llm_request_seconds_count{provider="fake",outcome="ok"}') == 2
+    assert after['llm_circuit_state{provider="fake-flaky"}'] == 2
+    assert after["rag_index_documents"] == 0
+
+
+def test_slow_requests_are_logged(client, monkeypatch, tmp_path, caplog):
+    log = str(tmp_path / "logs" / "slow.jsonl")
+    monkeypatch.setattr(metrics, "SLOW_QUERY_SECONDS", 0.0)
+    monkeypatch.setattr(metrics, "SLOW_QUERY_LOG", log)
+    before = _scrape(client)
+
+    trace = metrics.Trace("ask", question=QUESTION)
+    with trace.stage("retrieve"):
+        pass
+    with trace.stage("retrieve"):
+        pass
+    trace.finish(provider="fake")
+
+    after = _scrape(client)
+    assert after['rag_slow_queries_total{kind="ask"}'] - before.get('rag_slow_queries_total{kind="ask"}', 0) == 1
+    assert after['rag_request_seconds_count{kind="ask"}'] - before.get('rag_request_seconds_count{kind="ask"}', 0) == 1
+    assert (after['rag_stage_seconds_count{stage="retrieve"}']
+            - before.get('rag_stage_seconds_count{stage="retrieve"}', 0)) == 2
+
+    slow = client.get("/metrics/slow").json()
+    entry = slow["queries"][-1]
+    assert slow["threshold_s"] == 0.0
+    assert entry["kind"] == "ask"
+    assert entry["question"] == QUESTION
+    assert entry["provider"] == "fake"
+    assert set(entry["stages"]) == {"retrieve"}
+    with open(log, encoding="utf-8") as f:
+        assert json.loads(f.readlines()[-1])["question"] == QUESTION
+    assert any(r.name == "metrics" and r.getMessage().startswith("slow ask") for r in caplog.records)
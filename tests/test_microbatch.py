@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from microbatch import MicroBatcher
+
+
+def _batcher(fn=None, **options):
+    batches = []
+
+    def run(items):
+        batches.append(list(items))
+        return fn(items) if fn else [item * 10 for item in items]
+
+    return MicroBatcher(run, **options), batches
+
+
+def _concurrently(batcher, calls):
+    results = [None] * len(calls)
+    barrier = threading.Barrier(len(calls))
+
+    def call(i):
+        barrier.wait()
+        results[i] = batcher(calls[i])
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(calls))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_calls_share_a_batch_and_get_their_own_results():
+    batcher, batches = _batcher(max_batch=100, max_wait=0.2)
+    calls = [[i, i + 100] for i in range(8)]
+
+    results = _concurrently(batcher, calls)
+
+    assert results == [[i * 10, (i + 100) * 10] for i in range(8)]
+    assert len(batches) < len(calls)
+    stats = batcher.stats()
+    assert (stats["calls"], stats["items"]) == (8, 16)
+    assert stats["batches"] == len(batches)
+
+
+def test_full_batch_runs_before_the_window_closes():
+    batcher, batches = _batcher(max_batch=4, max_wait=5.0)
+
+    start = time.perf_counter()
+    results = _concurrently(batcher, [[i, i] for i in range(4)])
+
+    assert time.perf_counter() - start < 5.0
+    assert results == [[i * 10, i * 10] for i in range(4)]
+    assert all(len(batch) <= 5 for batch in batches)
+
+
+def test_batch_error_reaches_every_caller_and_the_batcher_recovers():
+    def fail_on_negative(items):
+        if any(item < 0 for item in items):
+            raise ValueError("bad item")
+        return items
+
+    batcher, batches = _batcher(fail_on_negative, max_batch=100, max_wait=0.2)
+    errors = []
+    barrier = threading.Barrier(3)
+
+    def call(item):
+        barrier.wait()
+        try:
+            batcher([item])
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(item,)) for item in (1, -1, 2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # one batch: every caller in it gets the error
+    assert len(batches) == 1
+    assert len(errors) == 3
+    assert batcher([3, 4]) == [3, 4]
+
+
+def test_empty_call_skips_the_batcher():
+    batcher, batches = _batcher()
+    assert batcher([]) == []
+    assert batches == []
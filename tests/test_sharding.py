@@ -0,0 +1,143 @@
+import socket
+import threading
+import zlib
+
+import numpy as np
+import pytest
+
+import sharding
+from vectordb import VectorStore
+
+DIM = 32
+DOCS = 12
+
+
+def _embed(texts):
+    # hashed bag of words, like the vector store tests
+    out = np.zeros((len(texts), DIM), dtype="float32")
+    for i, text in enumerate(texts):
+        for tok in text.lower().split():
+            out[i, zlib.crc32(tok.encode("utf-8")) % DIM] += 1.0
+    return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+
+
+def _document(d):
+    # documents of different lengths and term frequencies, sharing "common"
+    texts = [f"topic{d} " * (1 + i % 3) + f"common part{i} " + "filler " * d for i in range(5 + d)]
+    return _embed(texts), [{"chunk_id": f"doc{d}_{i}", "source": f"doc{d}", "text": t} for i, t in enumerate(texts)]
+
+
+def _fill(store):
+    for d in range(DOCS):
+        store.add_document(f"doc{d}", f"hash{d}", *_document(d), tags=["even" if d % 2 == 0 else "odd"])
+    return store
+
+
+@pytest.fixture
+def single(tmp_path):
+    return _fill(VectorStore(DIM, index_path=str(tmp_path / "single" / "faiss.index"),
+                             meta_path=str(tmp_path / "single" / "meta.pkl")))
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    store = sharding.open_store(DIM, shards="3", root=str(tmp_path / "shards"))
+    assert len({store.shard_of(f"doc{d}") for d in range(DOCS)}) == 3
+    return _fill(store)
+
+
+def _scores(hits):
+    return {h["chunk_id"]: h["score"] for h in hits}
+
+
+QUERIES = ["common", "topic3 common", "part2 filler", "topic7 topic7 part1", "nothing"]
+
+
+def test_bm25_scores_equal_one_index_over_everything(single, sharded):
+    for query in QUERIES:
+        expected = _scores(single.search_bm25(query, 500))
+        got = _scores(sharded.search_bm25(query, 500))
+        assert got.keys() == expected.keys()
+        for chunk_id, score in expected.items():
+            assert got[chunk_id] == pytest.approx(score, rel=1e-5)
+
+        top = sharded.search_bm25(query, 5)
+        assert [h["score"] for h in top] == pytest.approx(sorted(expected.values(), reverse=True)[:5], rel=1e-5)
+
+
+def test_dense_and_hybrid_top_k_equal_one_index(single, sharded):
+    queries = _embed(QUERIES)
+    for got, expected in zip(sharded.search_dense_batch(queries, 7), single.search_dense_batch(queries, 7)):
+        assert [h["score"] for h in got] == pytest.approx([h["score"] for h in expected], abs=1e-6)
+
+    # the global lists of both legs, merged like a single store merges its own
+    hybrid = sharded.hybrid_search_batch(queries, QUERIES, top_k=7)
+    for q, text in enumerate(QUERIES):
+        dense, bm25 = sharded.search_dense(queries[q], 7), sharded.search_bm25(text, 7)
+        assert hybrid[q] == VectorStore._merge_hits(dense, bm25, 7)
+
+
+def test_filters_and_deletes_go_to_the_owning_shard(sharded, monkeypatch):
+    owner = sharded.shards[sharded.shard_of("doc4")]
+    called = []
+    for shard in sharded.shards:
+        monkeypatch.setattr(shard, "search_dense_batch",
+                            lambda *args, _shard=shard, _search=shard.search_dense_batch, **kwargs:
+                            called.append(_shard) or _search(*args, **kwargs))
+
+    hits = sharded.search_dense(_embed(["common"])[0], 50, filters={"sources": ["doc4"]})
+    assert {h["source"] for h in hits} == {"doc4"}
+    assert called == [owner]
+    assert sorted(sharded.filter_sources({"tags": ["odd"]})) == sorted(f"doc{d}" for d in range(1, DOCS, 2))
+
+    assert sharded.delete_source("doc4") == 9
+    assert "doc4" not in sharded.documents
+    assert "doc4" not in owner.documents()
+    assert sharded.search_bm25("topic4", 10) == []
+
+
+def test_changed_document_is_replaced_on_its_shard(sharded):
+    vectors, metadatas = _document(4)
+    sharded.add_document("doc4", "v2", vectors[:2], metadatas[:2])
+
+    assert sharded.document_hash("doc4") == "v2"
+    assert len(sharded.search_bm25("topic4", 50)) == 2
+    assert sharded.documents["doc4"]["chunks"] == 2
+    assert [h["source"] for h in sharded.search_bm25("common", 500)].count("doc4") == 2
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_remote_shards_answer_like_local_ones(tmp_path, single):
+    address = ("127.0.0.1", _free_port())
+    store = VectorStore(DIM, index_path=str(tmp_path / "remote" / "faiss.index"),
+                        meta_path=str(tmp_path / "remote" / "meta.pkl"))
+    threading.Thread(target=sharding.serve, args=(store, address, b"secret"), daemon=True).start()
+
+    remote = sharding.RemoteShard(address, authkey=b"secret")
+    for _ in range(100):
+        try:
+            remote.version()
+            break
+        except ConnectionRefusedError:
+            threading.Event().wait(0.05)
+    sharded = _fill(sharding.ShardedVectorStore([remote]))
+
+    assert _scores(sharded.search_bm25("topic3 common", 20)) == pytest.approx(
+        _scores(single.search_bm25("topic3 common", 20)), rel=1e-5)
+    assert sharded.documents.keys() == single.documents.keys()
+    with pytest.raises(RuntimeError, match="shard 127.0.0.1"):
+        # wrong query dimension: the shard's error comes back to the caller
+        remote.search_dense_batch(np.zeros((1, DIM + 1), dtype="float32"), 5)
+    with pytest.raises(AttributeError):
+        remote.compact
+
+
+def test_shard_count_of_a_root_is_fixed(tmp_path):
+    sharding.open_store(DIM, shards="2", root=str(tmp_path))
+    with pytest.raises(ValueError, match="resharding"):
+        sharding.open_store(DIM, shards="3", root=str(tmp_path))
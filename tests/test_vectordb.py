@@ -0,0 +1,537 @@
+import os
+import pickle
+import threading
+import time
+import zlib
+
+import faiss
+import numpy as np
+import pytest
+
+import ann_index
+from vectordb import VectorStore
+
+DIM = 64
+
+
+def _embed(texts):
+    # hashed bag of words: texts sharing words are similar
+    out = np.zeros((len(texts), DIM), dtype="float32")
+    for i, text in enumerate(texts):
+        for tok in text.lower().split():
+            h = zlib.crc32(tok.encode("utf-8"))
+            out[i, h % DIM] += 1.0 if h & 0x10000 else -1.0
+    return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+
+
+def _chunks(source, texts):
+    return [{"chunk_id": f"{source}_{i}", "source": source, "text": t} for i, t in enumerate(texts)]
+
+
+def _open(path, index_type="flat", **options):
+    # IVF trains on small test corpora
+    params = {"ivf_train_min": 100, **options.pop("index_params", {})}
+    return VectorStore(DIM, index_path=os.path.join(path, "faiss.index"), meta_path=os.path.join(path, "meta.pkl"),
+                       index_type=index_type, index_params=params, **options)
+
+
+@pytest.fixture(params=ann_index.INDEX_TYPES)
+def index_type(request):
+    return request.param
+
+
+def _corpus(n, start=0):
+    texts = [f"word{i} topic{i % 4}" for i in range(start, start + n)]
+    return _embed(texts), [{"chunk_id": f"c{i}", "source": f"doc{i}", "text": t}
+                           for i, t in zip(range(start, start + n), texts)]
+
+
+def _ids(store, query, top_k=50):
+    return [h["chunk_id"] for h in store.search_dense(_embed([query])[0], top_k)]
+
+
+TEXTS = ["alpha beta gamma", "delta epsilon zeta", "eta theta iota", "kappa lambda mu", "alpha delta eta"]
+
+
+def test_hybrid_merges_both_legs(tmp_path):
+    store = _open(tmp_path)
+    store.add(_embed(TEXTS), _chunks("doc", TEXTS))
+
+    hits = store.hybrid_search(_embed(["alpha beta"])[0], "alpha beta", top_k=3)
+    ids = [h["chunk_id"] for h in hits]
+    assert len(ids) == len(set(ids)) <= 3
+    assert ids[0] == "doc_0"
+    assert {"dense_score", "bm25_score"} <= hits[0].keys()
+
+
+def test_slow_leg_misses_the_deadline(tmp_path, monkeypatch):
+    store = _open(tmp_path)
+    store.add(_embed(TEXTS), _chunks("doc", TEXTS))
+    search_bm25 = store.search_bm25
+
+    def slow_bm25(*args, **kwargs):
+        time.sleep(0.5)
+        return search_bm25(*args, **kwargs)
+
+    monkeypatch.setattr(store, "search_bm25", slow_bm25)
+    start = time.perf_counter()
+    hits = store.hybrid_search(_embed(["alpha beta"])[0], "alpha beta", top_k=3, timeout=0.1)
+
+    assert time.perf_counter() - start < 0.4
+    assert hits and all("bm25_score" not in h for h in hits)
+
+
+def test_reopen_replays_segments(tmp_path):
+    store = _open(tmp_path)
+    for i, text in enumerate(TEXTS):
+        store.add(_embed([text]), _chunks(f"doc{i}", [text]))
+    assert len(store.store.segments) == len(TEXTS)
+    assert store.store.base is None
+
+    reopened = _open(tmp_path)
+    assert len(reopened.metadata) == len(TEXTS)
+    assert _ids(reopened, "alpha beta") == _ids(store, "alpha beta")
+    assert [h["chunk_id"] for h in reopened.search_bm25("theta", 5)] == ["doc2_0"]
+
+
+def test_compact_then_reload(tmp_path):
+    store = _open(tmp_path)
+    store.add(_embed(TEXTS[:3]), _chunks("a", TEXTS[:3]))
+    store.add(_embed(TEXTS[3:]), _chunks("b", TEXTS[3:]))
+    store.save()
+    assert store.store.base is not None
+    assert store.store.segments == []
+
+    # a segment written after the compaction is replayed on top of the base
+    store.add(_embed(["omega psi"]), _chunks("c", ["omega psi"]))
+
+    reopened = _open(tmp_path)
+    assert len(reopened.metadata) == len(TEXTS) + 1
+    assert reopened.store.segments == store.store.segments
+    assert _ids(reopened, "alpha delta eta") == _ids(store, "alpha delta eta")
+    assert _ids(reopened, "omega psi", top_k=1) == ["c_0"]
+    # compacted segment directories are gone from disk
+    assert sorted(os.listdir(tmp_path / "segments")) == store.store.segments
+
+
+def test_background_compaction_keeps_every_row(tmp_path):
+    store = _open(tmp_path, compact_min_rows=2, compact_ratio=0.5)
+    for i in range(40):
+        text = f"word{i} common"
+        store.add(_embed([text]), _chunks(f"doc{i}", [text]))
+    # waits for a running background compaction, then merges the rest
+    store.save()
+
+    reopened = _open(tmp_path)
+    assert len(reopened.metadata) == 40
+    assert [h["chunk_id"] for h in reopened.search_bm25("word17", 3)] == ["doc17_0"]
+    assert len(reopened.search_bm25("common", 100)) == 40
+
+
+def test_unreferenced_directories_are_removed_on_open(tmp_path):
+    store = _open(tmp_path)
+    store.add(_embed(TEXTS), _chunks("doc", TEXTS))
+    # leftover of a crash between writing a segment and committing the manifest
+    os.makedirs(tmp_path / "segments" / "seg_999999")
+
+    reopened = _open(tmp_path)
+    assert not os.path.exists(tmp_path / "segments" / "seg_999999")
+    assert len(reopened.metadata) == len(TEXTS)
+
+
+def test_legacy_single_file_layout_is_migrated(tmp_path):
+    index = faiss.IndexFlatL2(DIM)
+    index.add(_embed(TEXTS))
+    faiss.write_index(index, str(tmp_path / "faiss.index"))
+    with open(tmp_path / "meta.pkl", "wb") as f:
+        pickle.dump(_chunks("old", TEXTS), f)
+
+    store = _open(tmp_path)
+    assert store.store.base is not None
+    assert not os.path.exists(tmp_path / "meta.pkl")
+    assert len(store.metadata) == len(TEXTS)
+    assert [h["chunk_id"] for h in store.search_bm25("kappa", 1)] == ["old_3"]
+    # the L2 index is rebuilt as inner product
+    assert ann_index.index_kind(store.index) == "flat"
+    assert store.search_dense(_embed([TEXTS[1]])[0], 1)[0]["score"] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_search_by_index_type(tmp_path, index_type):
+    store = _open(tmp_path, index_type)
+    vectors, metadatas = _corpus(160)
+    store.add(vectors, metadatas)
+    store.save()
+    assert ann_index.index_kind(store.index) == index_type
+
+    for i in (0, 57, 159):
+        top = store.search_dense(vectors[i], 3)
+        # inner product of normalized vectors: cosine similarity
+        assert top[0]["chunk_id"] == f"c{i}"
+        assert top[0]["score"] == pytest.approx(1.0, abs=1e-4)
+    assert _ids(_open(tmp_path, index_type), "word57 topic1", top_k=1) == ["c57"]
+
+
+def test_ivf_is_trained_once_enough_vectors(tmp_path):
+    store = _open(tmp_path, "ivf")
+    store.add(*_corpus(60))
+    store.save()
+    # exact search until ivf_train_min vectors exist
+    assert ann_index.index_kind(store.index) == "flat"
+
+    store.add(*_corpus(60, start=60))
+    store.save()
+    assert ann_index.index_kind(store.index) == "ivf"
+    assert len(store.metadata) == store.index.ntotal == 120
+    assert _ids(store, "word90 topic2", top_k=1) == ["c90"]
+
+
+def test_changed_index_type_is_rebuilt_on_open(tmp_path):
+    store = _open(tmp_path, "flat")
+    store.add(*_corpus(120))
+    store.save()
+
+    reopened = _open(tmp_path, "hnsw")
+    assert ann_index.index_kind(reopened.index) == "hnsw"
+    assert _ids(reopened, "word33 topic1", top_k=1) == ["c33"]
+
+
+def test_batch_search_equals_one_query_at_a_time(tmp_path, index_type):
+    store = _open(tmp_path, index_type)
+    store.add(*_corpus(160))
+    store.save()
+    queries = ["word3 topic3", "word120 topic0", "topic2", "nothing matches"]
+    embedded = _embed(queries)
+
+    dense = store.search_dense_batch(embedded, 5)
+    hybrid = store.hybrid_search_batch(embedded, queries, top_k=5)
+    assert len(dense) == len(hybrid) == len(queries)
+    for q, text in enumerate(queries):
+        assert dense[q] == store.search_dense(embedded[q], 5)
+        assert hybrid[q] == store.hybrid_search(embedded[q], text, top_k=5)
+    assert store.hybrid_search_batch(embedded[:0], [], top_k=5) == []
+
+
+def test_searches_run_while_documents_are_added(tmp_path):
+    store = _open(tmp_path, compact_min_rows=20, compact_ratio=0.5)
+    store.add(*_corpus(20))
+    errors, stop = [], threading.Event()
+
+    def search():
+        while not stop.is_set():
+            try:
+                hits = store.hybrid_search(_embed(["word5 topic1"])[0], "word5 topic1", top_k=5)
+                assert "c5" in [h["chunk_id"] for h in hits]
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=search) for _ in range(4)]
+    for t in readers:
+        t.start()
+    for start in range(20, 200, 10):
+        store.add(*_corpus(10, start=start))
+    stop.set()
+    for t in readers:
+        t.join()
+
+    assert errors == []
+    store.save()
+    assert len(store.metadata) == store.index.ntotal == 200
+
+
+def test_searches_run_while_compacting(tmp_path, monkeypatch):
+    options = {"compression": "sq8", "index_params": {**COMPRESSED, "filter_scan_max": 20000},
+               "compact_min_rows": 100000}
+    store = _open(tmp_path, **options)
+    vectors = np.random.default_rng(0).normal(size=(5, 40, DIM)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=2, keepdims=True)
+    for d in range(5):
+        store.add_document(f"doc{d}", f"hash{d}", vectors[d], _chunks(f"doc{d}", [f"text{i}" for i in range(40)]))
+        if d == 2:
+            store.save()
+    assert ann_index.index_compression(store.index) == "sq8"
+
+    # nothing read yet: every part is opened fresh from disk
+    store = _open(tmp_path, **options)
+    old = [store.store.base_path(store.store.base)] + [store.store.segment_path(s) for s in store.store.segments]
+    commit_base = store.store.commit_base
+    seen = []
+
+    def search():
+        try:
+            seen.append(all(os.path.exists(path) for path in old))
+            # compressed codes re-ranked from the base's vectors, filtered scan of a segment's vectors
+            seen.append(store.search_dense(vectors[0][7], 3)[0]["chunk_id"])
+            seen.append(store.search_dense(vectors[4][7], 3, filters={"sources": ["doc4"]})[0]["chunk_id"])
+        except Exception as e:
+            seen.append(e)
+
+    def committed(*args):
+        old_base = commit_base(*args)
+        # the manifest points at the new base, the searches still at the old parts
+        reader = threading.Thread(target=search)
+        reader.start()
+        reader.join()
+        return old_base
+
+    monkeypatch.setattr(store.store, "commit_base", committed)
+    store.compact(background=True)
+    # waits for the background compaction
+    store.save()
+
+    assert seen == [True, "doc0_7", "doc4_7"]
+    assert not any(os.path.exists(path) for path in old)
+    assert store.search_dense(vectors[4][7], 3, filters={"sources": ["doc4"]})[0]["chunk_id"] == "doc4_7"
+
+
+def _document(source, topic, n=30):
+    texts = [f"{topic}a {topic}b chunk{i}" for i in range(n)]
+    return _embed(texts), _chunks(source, texts)
+
+
+def _sources(hits):
+    return {h["source"] for h in hits}
+
+
+def _dense_sources(store, topic, top_k=50):
+    return _sources(store.search_dense(_embed([f"{topic}a {topic}b"])[0], top_k))
+
+
+def test_deleted_document_is_not_returned(tmp_path, index_type):
+    store = _open(tmp_path, index_type, purge_ratio=1.0)
+    for d in range(4):
+        store.add_document(f"doc{d}", f"hash{d}", *_document(f"doc{d}", f"topic{d}"))
+    store.save()
+
+    assert store.delete_source("doc1") == 30
+    assert store.delete_source("doc1") == 0
+    assert "doc1" not in store.documents
+
+    for s in (store, _open(tmp_path, index_type, purge_ratio=1.0)):
+        assert "doc1" not in _dense_sources(s, "topic1")
+        assert s.search_bm25("topic1a", 10) == []
+        assert "doc1" not in _sources(s.hybrid_search(_embed(["topic1a"])[0], "topic1a", top_k=50))
+        assert _sources(s.search_bm25("topic2a", 10)) == {"doc2"}
+
+
+def test_reupload_replaces_the_old_chunks(tmp_path):
+    store = _open(tmp_path, purge_ratio=1.0)
+    store.add_document("doc0", "v1", *_document("doc0", "old"))
+    store.add_document("doc1", "v1", *_document("doc1", "other"))
+    assert store.document_hash("doc0") == "v1"
+
+    store.add_document("doc0", "v2", *_document("doc0", "new", n=10))
+
+    for s in (store, _open(tmp_path, purge_ratio=1.0)):
+        assert (s.document_hash("doc0"), s.documents["doc0"]["chunks"]) == ("v2", 10)
+        assert s.search_bm25("olda", 50) == []
+        assert len(s.search_bm25("newa", 50)) == 10
+        assert _sources(s.search_bm25("othera", 50)) == {"doc1"}
+
+
+def test_purge_drops_deleted_rows(tmp_path, index_type):
+    store = _open(tmp_path, index_type, purge_ratio=0.1)
+    for d in range(4):
+        store.add_document(f"doc{d}", f"hash{d}", *_document(f"doc{d}", f"topic{d}"))
+    store.delete_source("doc1")
+    # waits for the background compaction the delete started, then compacts again
+    store.compact()
+
+    assert len(store.metadata) == store.index.ntotal == 90
+    reopened = _open(tmp_path, index_type)
+    assert len(reopened.metadata) == 90
+    assert reopened.documents.keys() == {"doc0", "doc2", "doc3"}
+    assert reopened.search_bm25("topic1a", 10) == []
+    for d in (0, 2, 3):
+        assert _dense_sources(reopened, f"topic{d}", top_k=10) == {f"doc{d}"}
+        assert _sources(reopened.search_bm25(f"topic{d}a", 10)) == {f"doc{d}"}
+
+
+def _batches(source, topic, n=30, size=10):
+    vectors, metadatas = _document(source, topic, n)
+    return ((vectors[i:i + size], metadatas[i:i + size]) for i in range(0, n, size))
+
+
+def test_document_batches_replace_the_old_chunks(tmp_path):
+    store = _open(tmp_path, purge_ratio=1.0)
+    store.add_document("doc0", "v1", *_document("doc0", "old"))
+
+    store.add_document_batches("doc0", "v2", _batches("doc0", "new", n=25))
+
+    assert len(store.store.segments) == 1 + 3
+    for s in (store, _open(tmp_path, purge_ratio=1.0)):
+        assert (s.document_hash("doc0"), s.documents["doc0"]["chunks"]) == ("v2", 25)
+        assert s.search_bm25("olda", 50) == []
+        assert len(s.search_bm25("newa", 50)) == 25
+
+
+def test_interrupted_ingest_is_not_recorded_as_done(tmp_path):
+    store = _open(tmp_path, purge_ratio=1.0)
+    store.add_document("doc0", "v1", *_document("doc0", "old"))
+
+    def failing():
+        batches = _batches("doc0", "new")
+        yield next(batches)
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        store.add_document_batches("doc0", "v2", failing())
+
+    # the next upload of either version is ingested again
+    assert store.document_hash("doc0") is None
+    assert _open(tmp_path, purge_ratio=1.0).document_hash("doc0") is None
+    assert store.search_bm25("olda", 50) == []
+
+
+COMPRESSED = {"compress_train_min": 100, "pq_m": 8, "pq_nbits": 4}
+
+
+@pytest.mark.parametrize("compression", ["fp16", "sq8", "pq", "binary"])
+def test_compressed_search_reranks_with_exact_vectors(tmp_path, compression):
+    store = _open(tmp_path, compression=compression, index_params=COMPRESSED)
+    # dense vectors: the sparse bag-of-words ones share most of their sign bits
+    vectors = np.random.default_rng(0).normal(size=(160, DIM)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    store.add(vectors, _corpus(160)[1])
+    store.save()
+    assert ann_index.index_compression(store.index) == compression
+
+    for i in (0, 57, 159):
+        top = store.search_dense(vectors[i], 3)
+        assert top[0]["chunk_id"] == f"c{i}"
+        # re-scored with the float32 vectors from disk, not the codes
+        assert top[0]["score"] == pytest.approx(1.0, abs=1e-6)
+        assert [h["score"] for h in top] == sorted((h["score"] for h in top), reverse=True)
+
+    store.delete_source("doc57")
+    assert "c57" not in [h["chunk_id"] for h in store.search_dense(vectors[57], 3)]
+    reopened = _open(tmp_path, compression=compression, index_params=COMPRESSED)
+    assert ann_index.index_compression(reopened.index) == compression
+    assert reopened.search_dense(vectors[90], 1)[0]["chunk_id"] == "c90"
+
+
+def test_compression_waits_for_enough_vectors_to_train(tmp_path):
+    store = _open(tmp_path, compression="sq8", index_params=COMPRESSED)
+    store.add(*_corpus(60))
+    store.save()
+    assert ann_index.index_compression(store.index) == "none"
+
+    store.add(*_corpus(60, start=60))
+    store.save()
+    assert ann_index.index_compression(store.index) == "sq8"
+    assert len(store.metadata) == store.index.ntotal == 120
+
+
+def test_changed_compression_is_rebuilt_on_open(tmp_path):
+    store = _open(tmp_path)
+    store.add(*_corpus(120))
+    store.save()
+
+    reopened = _open(tmp_path, compression="fp16")
+    assert ann_index.index_compression(reopened.index) == "fp16"
+    assert _ids(reopened, "word33 topic1", top_k=1) == ["c33"]
+
+
+def test_full_vectors_are_read_across_parts(tmp_path):
+    store = _open(tmp_path)
+    vectors, metadatas = _corpus(30)
+    store.add(vectors[:10], metadatas[:10])
+    store.save()
+    store.add(vectors[10:], metadatas[10:])
+    assert len(store.metadata.parts) == 2
+
+    rows = [29, 0, 12, 9, 10]
+    np.testing.assert_array_equal(store.metadata.vectors(rows), vectors[rows])
+    assert store.metadata.vectors([]).shape == (0, DIM)
+
+
+@pytest.mark.parametrize("index_type, compression", [("hnsw", "pq"), ("ivf", "binary"), ("flat", "zstd")])
+def test_unsupported_compression_is_rejected(tmp_path, index_type, compression):
+    with pytest.raises(ValueError):
+        _open(tmp_path, index_type, compression=compression)
+
+
+def _tagged_store(tmp_path, index_type, **options):
+    store = _open(tmp_path, index_type, purge_ratio=1.0, **options)
+    for d in range(4):
+        store.add_document(f"doc{d}", f"hash{d}", *_document(f"doc{d}", f"topic{d}"),
+                           tags=["even" if d % 2 == 0 else "odd"])
+    store.save()
+    return store
+
+
+def _query(topic):
+    return _embed([f"{topic}a {topic}b"])[0]
+
+
+@pytest.mark.parametrize("filter_scan_max", [20000, 0], ids=["scan", "bitmap"])
+def test_filtered_search(tmp_path, index_type, filter_scan_max):
+    # filter_scan_max=0: every filtered search goes through the index with a bitmap selector
+    store = _tagged_store(tmp_path, index_type, index_params={"filter_scan_max": filter_scan_max})
+
+    only_3 = {"sources": ["doc3"]}
+    hits = store.search_dense(_query("topic2"), 5, filters=only_3)
+    assert len(hits) == 5 and _sources(hits) == {"doc3"}
+    assert _sources(store.hybrid_search(_query("topic3"), "topic3a", top_k=10, filters=only_3)) == {"doc3"}
+    assert store.search_bm25("topic2a", 10, filters=only_3) == []
+
+    odd = {"tags": ["odd"]}
+    assert _sources(store.search_dense(_query("topic0"), 50, filters=odd)) <= {"doc1", "doc3"}
+    assert _sources(store.search_dense(_query("topic1"), 10, filters=odd)) == {"doc1"}
+    assert _sources(store.search_bm25("topic1a topic2a", 100, filters=odd)) == {"doc1"}
+
+    # the cached subset is rebuilt once rows are deleted
+    store.delete_source("doc3")
+    assert store.search_dense(_query("topic3"), 10, filters=only_3) == []
+    assert _sources(store.search_dense(_query("topic3"), 50, filters=odd)) == {"doc1"}
+
+
+@pytest.mark.parametrize("filter_scan_max", [20000, 0], ids=["scan", "bitmap"])
+def test_filtered_search_during_compaction(tmp_path, monkeypatch, filter_scan_max):
+    store = _tagged_store(tmp_path, "flat", index_params={"filter_scan_max": filter_scan_max})
+    odd = {"tags": ["odd"]}
+    assert _sources(store.search_dense(_query("topic1"), 50, filters=odd)) == {"doc1", "doc3"}
+
+    # the compaction purges doc1: the rows after it are renumbered
+    store.delete_source("doc1")
+    store.purge_ratio = 0.1
+    commit_base = store.store.commit_base
+    seen = []
+
+    def search():
+        try:
+            seen.append(_sources(store.search_dense(_query("topic3"), 50, filters=odd)))
+            seen.append(_sources(store.search_bm25("topic3a", 50, filters={"sources": ["doc3"]})))
+        except Exception as e:
+            seen.append(e)
+
+    def committed(*args):
+        # between the manifest commit and the in-memory swap
+        old_base = commit_base(*args)
+        reader = threading.Thread(target=search)
+        reader.start()
+        reader.join()
+        return old_base
+
+    monkeypatch.setattr(store.store, "commit_base", committed)
+    store.compact(background=True)
+    store.save()
+    search()
+
+    assert seen == [{"doc3"}, {"doc3"}] * 2
+    assert len(store.metadata) == 3 * 30
+    assert _sources(store.search_dense(_query("topic0"), 50, filters={"tags": ["even"]})) == {"doc0", "doc2"}
+
+
+def test_filter_by_indexing_time(tmp_path):
+    store = _tagged_store(tmp_path, "flat")
+    cutoff = store.documents["doc3"]["indexed_at"]
+    time.sleep(0.01)
+    store.add_document("doc4", "hash4", *_document("doc4", "topic4"))
+
+    assert store.filter_sources({"since": cutoff + 0.001}) == ["doc4"]
+    assert sorted(store.filter_sources({"until": cutoff})) == ["doc0", "doc1", "doc2", "doc3"]
+    assert store.filter_sources({"tags": ["even"], "sources": ["doc0", "doc1"]}) == ["doc0"]
+    assert _sources(store.search_bm25("chunk1", 100, filters={"since": cutoff + 0.001})) == {"doc4"}
+    # an empty filter filters nothing
+    assert len(store.search_bm25("chunk1", 100, filters={"sources": [], "tags": None})) == 5
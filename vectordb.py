@@ -1,102 +1,668 @@
 import os
 import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
 import numpy as np
 import faiss
-from rank_bm25 import BM25Okapi
+import ann_index
+from bm25_index import BM25Index, term_counts, tokenize
+from chunk_store import ChunkStore, ChunkTable
+from segment_store import SegmentStore
+
+
+# dense (FAISS releases the GIL) and sparse legs of hybrid search run side by side
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-search")
+
+
+def timed_call(fn, *args, **kwargs):
+    """
+    (fn(*args, **kwargs), seconds it took)
+    """
+    start = time.perf_counter()
+    return fn(*args, **kwargs), time.perf_counter() - start
+
+
+def record_legs(timings: dict, dense_s, bm25_s):
+    # legs that missed the deadline (None) are left out
+    if dense_s is not None:
+        timings["dense"] = timings.get("dense", 0.0) + dense_s
+    bm25_s = [s for s in bm25_s if s is not None]
+    if bm25_s:
+        timings["bm25"] = timings.get("bm25", 0.0) + sum(bm25_s)
+
+
+class _ReadWriteLock:
+    """
+    Many concurrent searches, or one writer mutating the FAISS index /
+    BM25 postings (which can't be resized while a search reads them).
+    Waiting writers block new readers so ingest can't starve.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+def filter_key(filters):
+    """
+    Hashable form of a filter dict ({"sources", "tags", "since", "until"},
+    any of them; since/until are unix timestamps), None when it filters nothing.
+    """
+    if not filters:
+        return None
+    sources, tags = filters.get("sources"), filters.get("tags")
+    key = (tuple(sorted(set(sources))) if sources else None,
+           tuple(sorted(set(tags))) if tags else None,
+           filters.get("since"), filters.get("until"))
+    return None if key == (None, None, None, None) else key
+
+
+def select_sources(documents: dict, filters) -> list:
+    """
+    Sources of `documents` selected by `filters`: the listed sources (all
+    documents if none are listed) that carry any of the tags and were
+    indexed between since and until.
+    """
+    sources, tags, since, until = filter_key(filters) or (None, None, None, None)
+    if tags is None and since is None and until is None:
+        return list(sources) if sources is not None else list(documents)
+
+    selected = []
+    for source in documents if sources is None else sources:
+        doc = documents.get(source)
+        if doc is None or (tags and not set(tags) & set(doc.get("tags", ()))):
+            continue
+        indexed_at = doc.get("indexed_at", 0)
+        if (since is not None and indexed_at < since) or (until is not None and indexed_at > until):
+            continue
+        selected.append(source)
+    return selected
 
 
 class VectorStore:
-    def __init__(self, dim: int, index_path="data/index/faiss.index", meta_path="data/index/meta.pkl"):
+    def __init__(self, dim: int, index_path="data/index/faiss.index", meta_path="data/index/meta.pkl",
+                 compact_ratio=0.25, compact_min_rows=5000, index_type="flat", index_params=None,
+                 purge_ratio=0.1, compression="none"):
         self.dim = dim
         self.index_path = index_path
         self.meta_path = meta_path
+        # single-file layout of older versions, migrated into segments on open
+        self.bm25_path = os.path.join(os.path.dirname(index_path), "bm25.pkl")
+        # merge segments into a new base once they hold this share of the base rows,
+        # so every row is rewritten O(log N) times instead of on every add
+        self.compact_ratio = compact_ratio
+        self.compact_min_rows = compact_min_rows
+        self._base_rows = 0
+        # deleted chunks stay in place as tombstones (filtered out of every search)
+        # until they make up this share of the rows, then compaction drops them
+        self.purge_ratio = purge_ratio
+        # "flat" (exact), "hnsw" or "ivf"; all inner product over normalized embeddings
+        self.index_type = index_type
+        self.index_params = {**ann_index.DEFAULT_PARAMS, **(index_params or {})}
+        # in-memory vector encoding ("none", "fp16", "sq8", "pq", "binary"); compressed
+        # searches re-rank their shortlist with the full vectors memory-mapped from disk
+        self.compression = compression
+        ann_index.check_config(index_type, compression, dim, self.index_params)
 
         os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
 
-        self.index = faiss.IndexFlatL2(dim)
-        self.metadata = []
-        self.bm25 = None
-        self.bm25_corpus = []
+        self.index = self._new_index()
+        # chunk metadata/text stays on disk (memory-mapped), rows are read on demand
+        self.metadata = ChunkTable()
+        self.bm25 = BM25Index()
+        self._set_deleted([])
 
-        if os.path.exists(self.index_path) and os.path.exists(self.meta_path):
+        self.store = SegmentStore(os.path.dirname(self.index_path))
+        self._lock = threading.RLock()
+        # searches vs in-memory index mutation
+        self._rw = _ReadWriteLock()
+        # one compaction at a time; always taken before self._lock
+        self._compact_lock = threading.Lock()
+        # resolved metadata filters: filter key -> allowed rows (+ bitmap selector)
+        self._filter_lock = threading.Lock()
+        self._filter_cache = {}
+        self._filter_state = None
+
+        if self.store.exists():
             self.load()
+        elif os.path.exists(self.index_path) and os.path.exists(self.meta_path):
+            self._migrate_legacy()
+
+    @property
+    def version(self) -> str:
+        """
+        Identifies the current contents; changes on every add/delete/reset
+        (used to invalidate cached answers).
+        """
+        return self.store.content_version
+
+    @property
+    def documents(self) -> dict:
+        """
+        {source: {"hash", "chunks", "indexed_at", "tags"}} of the documents
+        added with add_document.
+        """
+        return self.store.documents
+
+    def document_hash(self, source: str):
+        return self.store.documents.get(source, {}).get("hash")
+
+    # ---------------- tombstones ---------------- #
+    def _set_deleted(self, rows):
+        # sorted global row numbers of deleted chunks + the FAISS selector excluding them
+        self._deleted = np.unique(np.asarray(rows, dtype=np.int64))
+        self._deleted_sel = None
+        if len(self._deleted):
+            batch = faiss.IDSelectorBatch(self._deleted)
+            # keep the wrapped selector referenced alongside IDSelectorNot
+            self._deleted_sel = (faiss.IDSelectorNot(batch), batch)
+
+    @staticmethod
+    def _tombstones_by_part(deleted, spans):
+        tombstones = {}
+        for part, start in spans:
+            rows = deleted[(deleted >= start) & (deleted < start + len(part))] - start
+            if len(rows):
+                tombstones[os.path.basename(part.path)] = rows.tolist()
+        return tombstones
+
+    def _tombstones_from_manifest(self):
+        stored = self.store.tombstones
+        rows = [np.asarray(stored.get(os.path.basename(part.path), []), dtype=np.int64) + start
+                for part, start in self.metadata.spans()]
+        return np.concatenate(rows) if rows else []
+
+    def _new_index(self, vectors=None):
+        if vectors is None:
+            vectors = np.zeros((0, self.dim), dtype="float32")
+        return ann_index.build_index(self.index_type, self.dim, vectors, self.index_params, self.compression)
 
     def add(self, embeddings, metadatas):
-        embeddings = np.array(embeddings).astype("float32")
-        self.index.add(embeddings)
-        self.metadata.extend(metadatas)
+        self.write(embeddings, metadatas)
 
-        # update BM25 corpus
-        for md in metadatas:
-            self.bm25_corpus.append(md["text"].split())
+    def add_document(self, source: str, content_hash: str, embeddings, metadatas, tags=None):
+        """
+        Add the chunks of `source`, replacing any chunks it had before
+        (re-upload of a changed file). New chunks and the tombstones of the
+        old ones are committed together. `tags` label the document for
+        filtered searches.
+        """
+        self.add_document_batches(source, content_hash, [(embeddings, metadatas)], tags=tags)
 
-        self.bm25 = BM25Okapi(self.bm25_corpus)
-        self.save()
+    def add_document_batches(self, source: str, content_hash: str, batches, tags=None):
+        """
+        add_document for a document streamed as (embeddings, metadatas)
+        batches, each written as its own segment as soon as it arrives.
+        The old chunks are replaced together with the first batch; the
+        content hash is only recorded after the last one, so an interrupted
+        ingest is redone in full on the next upload.
+        """
+        tags = list(tags or [])
+        total = 0
+        for embeddings, metadatas in batches:
+            first = total == 0
+            total += len(metadatas)
+            self.write(embeddings, metadatas, replace=[source] if first else (),
+                       documents={source: {"hash": None, "chunks": total, "tags": tags}})
+
+        self.write([], [], replace=() if total else [source],
+                   documents={source: {"hash": content_hash, "chunks": total, "tags": tags}})
+
+    def delete_source(self, source: str) -> int:
+        """
+        Delete every chunk of `source`; returns the number of chunks removed.
+        """
+        with self._lock:
+            rows = np.setdiff1d(self.metadata.rows_of(source), self._deleted)
+            documents = self.store.documents
+            known = documents.pop(source, None) is not None
+            if not len(rows) and not known:
+                return 0
+
+            deleted = np.union1d(self._deleted, rows)
+            self.store.delete(self._tombstones_by_part(deleted, self.metadata.spans()), documents)
+            with self._rw.write():
+                self._set_deleted(deleted)
+            self._maybe_compact()
+        return len(rows)
+
+    def write(self, embeddings, metadatas, replace=(), documents=None):
+        """
+        One write covering chunks of any number of documents. Every existing
+        chunk of the sources in `replace` is tombstoned and `documents`
+        ({source: {"hash", "chunks", "tags"}}) is merged into the document
+        manifest, stamped with `indexed_at`, in the same commit as the new rows.
+        """
+        embeddings = np.array(embeddings).astype("float32").reshape(-1, self.dim)
+        # only the new chunks are tokenized
+        counts = [term_counts(tokenize(md["text"])) for md in metadatas]
+
+        with self._lock:
+            deleted, tombstones = self._deleted, None
+            if replace:
+                for source in replace:
+                    deleted = np.union1d(deleted, self.metadata.rows_of(source))
+                tombstones = self._tombstones_by_part(deleted, self.metadata.spans())
+            if documents:
+                now = time.time()
+                documents = {**self.store.documents,
+                             **{src: {**doc, "indexed_at": now} for src, doc in documents.items()}}
+
+            segment = None
+            if len(metadatas):
+                # write-ahead: the segment is durable before memory changes
+                segment = self.store.append(embeddings, metadatas, counts, tombstones=tombstones, documents=documents)
+            elif replace:
+                self.store.delete(tombstones, documents or self.store.documents)
+            elif documents:
+                self.store.update_documents(documents)
+
+            with self._rw.write():
+                if segment:
+                    ann_index.add_vectors(self.index, embeddings)
+                    self.metadata.append(ChunkStore(self.store.segment_path(segment)))
+                    self.bm25.add_counts(counts)
+                if replace:
+                    self._set_deleted(deleted)
+
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        pending = len(self.metadata) - self._base_rows
+        if (pending >= max(self.compact_min_rows, self.compact_ratio * self._base_rows)
+                or self._purge_due(len(self._deleted), len(self.metadata))
+                or self._needs_reindex()):
+            self.compact(background=True)
+
+    def _needs_reindex(self):
+        return ann_index.needs_reindex(self.index, self.index_type, self.index_params, self.compression)
+
+    def _purge_due(self, n_deleted, n_rows):
+        return n_deleted > 0 and n_deleted >= self.purge_ratio * n_rows
 
     def save(self):
-        faiss.write_index(self.index, self.index_path)
-        with open(self.meta_path, "wb") as f:
-            pickle.dump(self.metadata, f)
+        """
+        Force a full snapshot (compact every pending segment into the base).
+        """
+        self.compact(background=False)
 
     def load(self):
-        self.index = faiss.read_index(self.index_path)
+        with self._lock:
+            if self.store.base:
+                self.index, base_chunks, bm25_state = self.store.read_base()
+                if not ann_index.matches(self.index, self.index_type, self.compression, self.index_params):
+                    # index type or compression changed (or an old L2 index): rebuild from the stored vectors
+                    self.index = self._new_index(self.store.read_vectors([], self.dim))
+                self.metadata = ChunkTable([base_chunks])
+                self.bm25 = BM25Index.from_bytes(bm25_state)
+                self._base_rows = len(self.metadata)
+            else:
+                self.index = self._new_index()
+                self.metadata = ChunkTable()
+                self.bm25 = BM25Index()
+                self._base_rows = 0
+
+            # replay segments written since the last compaction
+            for name in self.store.segments:
+                vectors, chunks, counts = self.store.read_segment(name)
+                ann_index.add_vectors(self.index, vectors)
+                self.metadata.append(chunks)
+                self.bm25.add_counts(counts)
+
+            self._set_deleted(self._tombstones_from_manifest())
+
+        if self._needs_reindex():
+            self.compact(background=True)
+
+    def _migrate_legacy(self):
+        # pre-segment layout: one faiss.index + meta.pkl (+ bm25.pkl) rewritten on every add
+        index = faiss.read_index(self.index_path)
         with open(self.meta_path, "rb") as f:
-            self.metadata = pickle.load(f)
-
-        self.bm25_corpus = [m["text"].split() for m in self.metadata]
-        self.bm25 = BM25Okapi(self.bm25_corpus) if self.bm25_corpus else None
-
-    def search_dense(self, query_embedding, top_k=10):
-        query_embedding = np.array([query_embedding]).astype("float32")
-        distances, indices = self.index.search(query_embedding, top_k)
-        results = []
-        for idx in indices[0]:
-            if idx == -1:
-                continue
-            results.append(self.metadata[idx])
-        return results
+            metadata = pickle.load(f)
+
+        vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, self.dim), "float32")
+        counts = [term_counts(tokenize(m["text"])) for m in metadata]
+        self.store.append(vectors, metadata, counts)
+        self.load()
+        self.save()
+
+        for path in (self.index_path, self.meta_path, self.bm25_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def compact(self, background=False):
+        """
+        Merge the base and all current segments into a new base snapshot.
+        The in-memory state is snapshotted under the write lock; the heavy
+        file writes happen outside it so adds keep flowing.
+
+        This is also where the ANN index is rebuilt when it is due (IVF
+        reaching its training size or outgrowing its lists), and where
+        tombstoned rows are dropped once there are enough of them.
+        """
+        if background:
+            if not self._compact_lock.locked():
+                threading.Thread(target=self.compact, daemon=True).start()
+            return
+
+        with self._compact_lock:
+            with self._lock:
+                segments = self.store.segments
+                reindex = self._needs_reindex()
+                n_parts = len(self.metadata.parts)
+                n_rows = len(self.metadata)
+                purge = self._purge_due(len(self._deleted), n_rows)
+                if not segments and not reindex and not purge:
+                    return
+
+                keep = None
+                if purge:
+                    keep = np.ones(n_rows, dtype=bool)
+                    keep[self._deleted] = False
+                index_bytes = None if reindex or purge else ann_index.serialize_index(self.index)
+                bm25_state = self.bm25.to_bytes()
+                spans = self.metadata.spans()
+
+            index = bm25 = None
+            if purge:
+                bm25 = BM25Index.from_bytes(bm25_state).compacted(keep)
+                bm25_state = bm25.to_bytes()
+            if reindex or purge:
+                vectors = self.store.read_vectors(segments, self.dim)
+                index = self._new_index(vectors if keep is None else vectors[keep])
+                index_bytes = ann_index.serialize_index(index)
+
+            keeps = [keep[start:start + len(part)] for part, start in spans] if purge else None
+            base = self.store.write_base(index_bytes, bm25_state, segments, self.dim, keeps)
+
+            with self._lock:
+                # catch up with the segments added while compacting
+                for name in self.store.segments:
+                    if name in segments or (index is None and bm25 is None):
+                        continue
+                    vectors, _, counts = self.store.read_segment(name)
+                    if index is not None:
+                        ann_index.add_vectors(index, vectors)
+                    if bm25 is not None:
+                        bm25.add_counts(counts)
+
+                # renumber the tombstones that survive (rows deleted meanwhile)
+                deleted = self._deleted
+                if purge:
+                    new_rows = np.cumsum(keep) - 1
+                    old = deleted[deleted < n_rows]
+                    later = deleted[deleted >= n_rows] - (n_rows - int(keep.sum()))
+                    deleted = np.concatenate([new_rows[old[keep[old]]], later])
 
-    def search_bm25(self, query, top_k=10):
-        if not self.bm25:
+                # the compacted base holds exactly the snapshotted (kept) rows
+                base_chunks = ChunkStore(self.store.base_path(base))
+                parts = [base_chunks] + self.metadata.parts[n_parts:]
+                old_base = self.store.commit_base(base, segments,
+                                                  self._tombstones_by_part(deleted, ChunkTable(parts).spans()))
+
+                with self._rw.write():
+                    if index is not None:
+                        self.index = index
+                    if bm25 is not None:
+                        self.bm25 = bm25
+                    self.metadata.replace_prefix(n_parts, base_chunks)
+                    self._set_deleted(deleted)
+                self._base_rows = len(base_chunks)
+
+                # searches started before the swap have finished: the merged files can go
+                self.store.drop(old_base, segments)
+
+    # ---------------- filters ---------------- #
+    def filter_sources(self, filters) -> list:
+        """
+        Sources selected by `filters` (see select_sources).
+        """
+        return select_sources(self.store.documents, filters)
+
+    def _filtered(self, filters):
+        """
+        {"rows": sorted live rows matching `filters`} (None = no filter),
+        cached until the next change of rows, tombstones or documents.
+        Called under the read lock.
+        """
+        key = filter_key(filters)
+        if key is None:
+            return None
+
+        state = (self.metadata, len(self.metadata), self._deleted, self.store.manifest)
+        with self._filter_lock:
+            if self._filter_state is None or any(a is not b for a, b in zip(state, self._filter_state)):
+                self._filter_cache = {}
+                self._filter_state = state
+            subset = self._filter_cache.get(key)
+            if subset is None:
+                rows = self.metadata.rows_of_sources(self.filter_sources(filters))
+                rows = np.setdiff1d(rows, self._deleted, assume_unique=True)
+                subset = {"rows": rows, "selector": None}
+                if len(self._filter_cache) >= 64:
+                    self._filter_cache.clear()
+                self._filter_cache[key] = subset
+            return subset
+
+    def _subset_selector(self, subset):
+        # bitmap over every row of the index: set for the allowed (live) rows
+        with self._filter_lock:
+            if subset["selector"] is None:
+                mask = np.zeros(self.index.ntotal, dtype=bool)
+                mask[subset["rows"]] = True
+                subset["selector"] = ann_index.bitmap_selector(mask)
+            return subset["selector"][0]
+
+    def search_dense(self, query_embedding, top_k=10, ef_search=None, nprobe=None, filters=None):
+        """
+        `ef_search` (HNSW) / `nprobe` (IVF) override the configured
+        recall/latency trade-off for this query only.
+        """
+        return self.search_dense_batch([query_embedding], top_k, ef_search=ef_search, nprobe=nprobe,
+                                       filters=filters)[0]
+
+    def search_dense_batch(self, query_embeddings, top_k=10, ef_search=None, nprobe=None, filters=None):
+        """
+        One FAISS call for a matrix of queries; a list of hit lists per query.
+        With a compressed index, top_k * rerank candidates are fetched and
+        re-scored with their full-precision vectors.
+
+        `filters` (see filter_sources) restrict the rows before scoring: a
+        subset of up to filter_scan_max rows is scored exactly from its
+        stored vectors, a larger one is searched through a bitmap selector.
+        """
+        query_embeddings = np.array(query_embeddings).astype("float32").reshape(-1, self.dim)
+        # rows are resolved under the read lock: a compaction may renumber them
+        with self._rw.read():
+            subset = self._filtered(filters)
+            if subset is not None and len(subset["rows"]) <= self.index_params["filter_scan_max"]:
+                distances, indices = self._scan(query_embeddings, subset["rows"], top_k)
+            else:
+                if subset is not None:
+                    sel = self._subset_selector(subset)
+                else:
+                    sel = self._deleted_sel[0] if self._deleted_sel else None
+                params = ann_index.search_params(self.index, self.index_params, ef_search=ef_search,
+                                                 nprobe=nprobe, sel=sel)
+                depth = ann_index.rerank_depth(self.index, top_k, self.index_params)
+                distances, indices = ann_index.search(self.index, query_embeddings, max(top_k, depth),
+                                                      params=params)
+                if depth:
+                    distances, indices = self._rerank(query_embeddings, indices, top_k)
+
+            all_results = []
+            for row_scores, row_ids in zip(distances, indices):
+                results = []
+                for score, idx in zip(row_scores, row_ids):
+                    if idx == -1:
+                        continue
+                    # inner product of normalized embeddings = cosine similarity
+                    results.append({**self.metadata[idx], "score": float(score)})
+                all_results.append(results)
+        return all_results
+
+    def _scan(self, query_embeddings, rows, top_k):
+        """
+        Exact search over `rows` only (inner products with their stored
+        vectors), same shapes as index.search.
+        """
+        distances = np.full((len(query_embeddings), top_k), -np.inf, dtype=np.float32)
+        ranked = np.full((len(query_embeddings), top_k), -1, dtype=np.int64)
+        k = min(top_k, len(rows))
+        if not k:
+            return distances, ranked
+
+        scores = query_embeddings @ self.metadata.vectors(rows).T
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        distances[:, :k] = np.take_along_axis(best_scores, order, axis=1)
+        ranked[:, :k] = rows[np.take_along_axis(best, order, axis=1)]
+        return distances, ranked
+
+    def _rerank(self, query_embeddings, indices, top_k):
+        """
+        Exact inner products of each query with its candidate rows, best
+        `top_k` first (same shapes as index.search, -1 padded).
+        """
+        rows = np.unique(indices[indices >= 0])
+        vectors = self.metadata.vectors(rows)
+
+        distances = np.full((len(indices), top_k), -np.inf, dtype=np.float32)
+        ranked = np.full((len(indices), top_k), -1, dtype=np.int64)
+        for q, candidates in enumerate(indices):
+            candidates = candidates[candidates >= 0]
+            scores = vectors[np.searchsorted(rows, candidates)] @ query_embeddings[q]
+            best = np.argsort(-scores, kind="stable")[:top_k]
+            distances[q, :len(best)] = scores[best]
+            ranked[q, :len(best)] = candidates[best]
+        return distances, ranked
+
+    def bm25_stats(self, terms) -> dict:
+        """
+        BM25 corpus statistics of `terms` (see BM25Index.term_stats).
+        """
+        with self._rw.read():
+            return self.bm25.term_stats(terms)
+
+    def search_bm25(self, query, top_k=10, filters=None, stats=None):
+        """
+        BM25 top_k; with `filters`, only the postings of the matching rows are
+        scored. `stats` are corpus-wide BM25 statistics when this store is a shard.
+        """
+        if not len(self.bm25):
             return []
-        query_tokens = query.split()
-        scores = self.bm25.get_scores(query_tokens)
-        top_indices = np.argsort(scores)[::-1][:top_k]
+        query_tokens = tokenize(query)
+        with self._rw.read():
+            subset = self._filtered(filters)
+            if subset is not None:
+                doc_ids, scores = self.bm25.top_k(query_tokens, top_k, only=subset["rows"], stats=stats)
+            else:
+                doc_ids, scores = self.bm25.top_k(query_tokens, top_k, exclude=self._deleted, stats=stats)
 
-        results = []
-        for idx in top_indices:
-            results.append(self.metadata[idx])
+            results = []
+            for idx, score in zip(doc_ids, scores):
+                results.append({**self.metadata[idx], "score": float(score)})
         return results
 
-    def hybrid_search(self, query_embedding, query_text, top_k=10):
-        dense_results = self.search_dense(query_embedding, top_k=top_k)
-        bm25_results = self.search_bm25(query_text, top_k=top_k)
+    def hybrid_search(self, query_embedding, query_text, top_k=10, timeout=None, ef_search=None, nprobe=None,
+                      filters=None):
+        """
+        Dense and BM25 legs run in parallel under one deadline (`timeout`
+        seconds, None = wait for both). A leg that misses the deadline
+        contributes no hits instead of stalling the query.
+        `filters` ({"sources", "tags", "since", "until"}) scope both legs
+        to the matching documents before scoring.
+        """
+        return self.hybrid_search_batch([query_embedding], [query_text], top_k=top_k, timeout=timeout,
+                                        ef_search=ef_search, nprobe=nprobe, filters=filters)[0]
+
+    def hybrid_search_batch(self, query_embeddings, query_texts, top_k=10, timeout=None,
+                            ef_search=None, nprobe=None, filters=None, timings=None):
+        """
+        hybrid_search for several queries at once: the dense leg is a single
+        matrix search, the BM25 legs run alongside it, all under one deadline.
+        `timings`, if given, receives the seconds spent in each leg
+        ("dense", "bm25": summed over the queries).
+        """
+        if not len(query_texts):
+            return []
+        dense_future = _search_pool.submit(timed_call, self.search_dense_batch, query_embeddings, top_k,
+                                           ef_search=ef_search, nprobe=nprobe, filters=filters)
+        bm25_futures = [_search_pool.submit(timed_call, self.search_bm25, text, top_k, filters=filters)
+                        for text in query_texts]
+        wait([dense_future] + bm25_futures, timeout=timeout)
+
+        dense_all, dense_s = dense_future.result() if dense_future.done() else ([[] for _ in query_texts], None)
+        bm25_all = [f.result() if f.done() else ([], None) for f in bm25_futures]
+        if timings is not None:
+            record_legs(timings, dense_s, [took for _, took in bm25_all])
+        return [
+            self._merge_hits(dense_results, bm25_results, top_k)
+            for dense_results, (bm25_results, _) in zip(dense_all, bm25_all)
+        ]
 
-        # merge unique by chunk id
-        seen = set()
-        merged = []
-        for r in dense_results + bm25_results:
-            cid = r["chunk_id"]
-            if cid not in seen:
-                seen.add(cid)
-                merged.append(r)
+    @staticmethod
+    def _merge_hits(dense_results, bm25_results, top_k):
+        # merge unique by chunk id, keeping the score from each leg
+        merged = {}
+        for key, hits in (("dense_score", dense_results), ("bm25_score", bm25_results)):
+            for r in hits:
+                cid = r["chunk_id"]
+                if cid not in merged:
+                    merged[cid] = {k: v for k, v in r.items() if k != "score"}
+                merged[cid][key] = r["score"]
 
-        return merged[:top_k]
+        return list(merged.values())[:top_k]
     
     def reset(self):
         """
         Reset the vector database by clearing all data and deleting index files.
         This will remove all indexed documents and their embeddings.
         """
-        # Reset in-memory data
-        self.index = faiss.IndexFlatL2(self.dim)
-        self.metadata = []
-        self.bm25 = None
-        self.bm25_corpus = []
-        
-        # Delete index files if they exist
-        if os.path.exists(self.index_path):
-            os.remove(self.index_path)
-        if os.path.exists(self.meta_path):
-            os.remove(self.meta_path)
+        with self._compact_lock, self._lock, self._rw.write():
+            # Reset in-memory data
+            self.index = self._new_index()
+            self.metadata = ChunkTable()
+            self.bm25 = BM25Index()
+            self._set_deleted([])
+            self._base_rows = 0
 
+            # Delete index files if they exist
+            self.store.reset()
+            for path in (self.index_path, self.meta_path, self.bm25_path):
+                if os.path.exists(path):
+                    os.remove(path)